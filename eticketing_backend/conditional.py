@@ -0,0 +1,48 @@
+"""
+Conditional GET for API views.
+
+A view reads the few columns that change its representation (a state row
+such as ``orders.archive.order_state``) and hands them to ``conditional_get``
+together with a function that renders the full response. The ETag hashes that
+state with what else the representation varies by: the path and query string
+(?fields=, ?expand=) and the Accept header. Last-Modified is the newest
+timestamp in the state. A client whose If-None-Match (or, without one,
+If-Modified-Since) still matches gets a 304 and nothing is loaded or
+serialized.
+
+Responses carry ``Cache-Control: private, no-cache``: browsers revalidate
+every time instead of guessing a freshness lifetime from Last-Modified, and
+shared caches keep out of per-user data.
+"""
+import hashlib
+from calendar import timegm
+from datetime import datetime
+
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+
+def validators(request, state):
+    """(ETag, Last-Modified as a timestamp or None) of the representation of ``state``"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr(sorted(state.items())).encode())
+    digest.update(request.get_full_path().encode())
+    digest.update(request.headers.get('Accept', '').encode())
+    times = [value for value in state.values() if isinstance(value, datetime)]
+    return quote_etag(digest.hexdigest()), (timegm(max(times).utctimetuple()) if times else None)
+
+
+def conditional_get(request, state, render):
+    """304 if the client's copy of ``state`` is current, else ``render()``; a None state always renders"""
+    if state is None:
+        return render()
+    etag, last_modified = validators(request, state)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = render()
+    if response.status_code in (200, 304):
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
@@ -0,0 +1,212 @@
+"""
+Sparse fieldsets and expansion controls for API responses.
+
+``?fields=order_id,status,event.title`` keeps only the listed fields; dotted
+names select inside nested objects. ``?expand=event`` renders only the listed
+relations as nested objects and the others as primary keys. Without either
+parameter a response is unchanged. Naming a field the response does not have
+is a 400, so a typo is not mistaken for an empty object.
+
+Views opt in with ``SparseFieldsViewMixin`` (or by putting
+``parse_sparse_params(request.query_params)`` in the serializer context under
+'sparse'), and serializers with ``SparseFieldsMixin`` trim themselves to the
+selection. ``optimize_queryset`` turns the trimmed serializer into ``only()``,
+``select_related()`` and ``Prefetch`` lookups, so fewer fields also means
+fewer columns and joins. Serializer method fields name the model fields they
+read in ``Meta.field_sources``; a field the planner cannot map loads all
+columns of its model.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+
+def parse_selection(value):
+    """'a,b.c,b.d' -> {'a': None, 'b': {'c': None, 'd': None}}; None selects everything below"""
+    tree = {}
+    for path in filter(None, (part.strip() for part in value.split(','))):
+        node = tree
+        names = path.split('.')
+        for name in names[:-1]:
+            if node.get(name, {}) is None:
+                break  # already selected in full
+            node = node.setdefault(name, {})
+        else:
+            node[names[-1]] = None
+    return tree
+
+
+def parse_sparse_params(params):
+    """The (fields, expand) selections of a request, each None when its parameter is absent"""
+    fields = params.get('fields')
+    expand = params.get('expand')
+    return (
+        parse_selection(fields) if fields is not None else None,
+        parse_selection(expand) if expand is not None else None,
+    )
+
+
+def _collapse(field):
+    """The relation as primary keys instead of nested objects"""
+    many = isinstance(field, serializers.ListSerializer)
+    return serializers.PrimaryKeyRelatedField(read_only=True, many=many, source=field.source)
+
+
+class SparseFieldsMixin:
+    """Serializer mixin that keeps only the selected fields and expansions"""
+
+    def _sparse_selection(self):
+        if hasattr(self, '_sparse'):
+            return self._sparse
+        root = self.parent.parent if isinstance(self.parent, serializers.ListSerializer) else self.parent
+        if root is None:
+            return self.context.get('sparse', (None, None))
+        return None, None
+
+    def get_fields(self):
+        fields = super().get_fields()
+        selection, expand = self._sparse_selection()
+        prefix = getattr(self, '_sparse_prefix', '')
+        unknown = sorted(set(selection or ()) - set(fields))
+        if unknown:
+            raise serializers.ValidationError(
+                {'fields': [f"Unknown field(s): {', '.join(prefix + name for name in unknown)}"]}
+            )
+        for name, field in list(fields.items()):
+            if selection is not None and name not in selection:
+                del fields[name]
+                continue
+            nested = field.child if isinstance(field, serializers.ListSerializer) else field
+            if not isinstance(nested, serializers.BaseSerializer):
+                continue
+            if expand is not None and name not in expand:
+                fields[name] = _collapse(field)
+                continue
+            nested._sparse = (
+                selection.get(name) if selection is not None else None,
+                (expand.get(name) or {}) if expand is not None else None,
+            )
+            nested._sparse_prefix = f'{prefix}{name}.'
+        return fields
+
+
+class SparseFieldsViewMixin:
+    """Generic view mixin: pass ?fields= / ?expand= of safe requests to the serializer and trim the queryset to match"""
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.request.method in SAFE_METHODS:
+            context['sparse'] = parse_sparse_params(self.request.query_params)
+        return context
+
+    def optimize_queryset(self, queryset):
+        return optimize_queryset(queryset, self.get_serializer())
+
+
+def _field_paths(model, path):
+    """Validate a model field path ('order__event__title'), returning its relation prefixes"""
+    names = path.split('__')
+    for name in names[:-1]:
+        model = model._meta.get_field(name).related_model
+    model._meta.get_field(names[-1])
+    return ['__'.join(names[:i]) for i in range(1, len(names))]
+
+
+def _columns(model, path):
+    """Names of the concrete fields of the model at the end of a relation path"""
+    for name in filter(None, path.split('__')):
+        model = model._meta.get_field(name).related_model
+    return [field.name for field in model._meta.concrete_fields]
+
+
+def _plan(serializer, model, prefix='', skip_relation=None):
+    """(only paths or None for all columns, select_related paths, Prefetch list) for a serializer"""
+    only, select, prefetch = set(), set(), []
+    restrict = True
+    field_sources = getattr(getattr(serializer, 'Meta', None), 'field_sources', {})
+
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        source = field.source or name
+        if source == '*' or isinstance(field, serializers.SerializerMethodField):
+            if name not in field_sources:
+                restrict = False
+                continue
+            for path in field_sources[name]:
+                if skip_relation and path.split('__')[0] == skip_relation:
+                    continue
+                relations = _field_paths(model, path)
+                select.update(prefix + relation for relation in relations)
+                only.update(prefix + relation for relation in relations)
+                only.add(prefix + path)
+            continue
+
+        path = source.replace('.', '__')
+        try:
+            model_field = model._meta.get_field(path.split('__')[0])
+        except FieldDoesNotExist:
+            restrict = False  # a property or method: it may read anything
+            continue
+
+        nested = field.child if isinstance(field, serializers.ListSerializer) else field
+        many = isinstance(field, (serializers.ListSerializer, serializers.ManyRelatedField))
+        if many:
+            related_model = model_field.related_model
+            back = model_field.field.name if model_field.one_to_many else None
+            if isinstance(nested, serializers.BaseSerializer):
+                child_only, child_select, child_prefetch = _plan(nested, related_model, skip_relation=back)
+            else:
+                child_only, child_select, child_prefetch = {related_model._meta.pk.name}, set(), []
+            queryset = _apply(
+                related_model._default_manager.all(),
+                None if child_only is None else child_only | ({back} if back else set()),
+                child_select, child_prefetch
+            )
+            prefetch.append(Prefetch(prefix + path, queryset=queryset))
+        elif isinstance(nested, serializers.BaseSerializer):
+            select.add(prefix + path)
+            if model_field.concrete:
+                only.add(prefix + path)
+            child_prefix = prefix + path + '__'
+            child_only, child_select, child_prefetch = _plan(nested, model_field.related_model, child_prefix)
+            select.update(child_select)
+            prefetch += child_prefetch
+            if child_only is None:
+                # A nested field we cannot map: load the whole rows it joins
+                for relation in [''] + sorted(child_select):
+                    relation = relation[len(child_prefix):]
+                    only.update(
+                        f'{child_prefix}{relation}{"__" if relation else ""}{column}'
+                        for column in _columns(model_field.related_model, relation)
+                    )
+            else:
+                only.update(child_only)
+        elif model_field.is_relation and not model_field.concrete:
+            restrict = False  # a reverse relation rendered as a key
+        else:
+            relations = _field_paths(model, path)
+            select.update(prefix + relation for relation in relations)
+            only.update(prefix + relation for relation in relations)
+            only.add(prefix + path)
+    return (only if restrict else None), select, prefetch
+
+
+def _apply(queryset, only, select, prefetch):
+    # select_related() without arguments would follow every foreign key
+    if select:
+        queryset = queryset.select_related(*sorted(select))
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    if only is not None:
+        queryset = queryset.only(*sorted(only))
+    return queryset
+
+
+def optimize_queryset(queryset, serializer, also=()):
+    """Load only what the (trimmed) serializer renders, plus the ``also`` fields: columns, joins and prefetches"""
+    if isinstance(serializer, serializers.ListSerializer):
+        serializer = serializer.child
+    only, select, prefetch = _plan(serializer, queryset.model)
+    return _apply(queryset, None if only is None else only | set(also), select, prefetch)
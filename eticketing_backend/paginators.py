@@ -0,0 +1,59 @@
+"""
+Admin paginator for tables with millions of rows.
+
+An exact ``COUNT(*)`` over orders or tickets scans the whole table on every
+changelist page. ``ApproximateCountPaginator`` counts at most
+ADMIN_EXACT_COUNT_LIMIT + 1 rows; past that it asks the database for an
+estimate (planner statistics on PostgreSQL and MySQL, the highest rowid on
+SQLite) and never reports fewer rows than it actually counted. Filtered lists
+with no estimate available page through the first rows counted. Use it with
+``show_full_result_count = False`` so the changelist skips its second count.
+"""
+import json
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+def estimate_count(queryset):
+    """Cheap row estimate for ``queryset`` from database statistics, or None"""
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    unfiltered = not queryset.query.where
+
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            if unfiltered:
+                cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+                row = cursor.fetchone()
+                return row[0] if row and row[0] >= 0 else None
+            plan = json.loads(queryset.order_by().explain(format='json'))
+            return int(plan[0]['Plan']['Plan Rows'])
+        if not unfiltered:
+            return None
+        if connection.vendor == 'mysql':
+            cursor.execute(
+                'SELECT table_rows FROM information_schema.tables '
+                'WHERE table_schema = DATABASE() AND table_name = %s', [table]
+            )
+            row = cursor.fetchone()
+            return row[0] if row else None
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'SELECT MAX(rowid) FROM {connection.ops.quote_name(table)}')
+            return cursor.fetchone()[0]
+    return None
+
+
+class ApproximateCountPaginator(Paginator):
+    """Exact counts up to ADMIN_EXACT_COUNT_LIMIT rows, database estimates past it"""
+
+    @cached_property
+    def count(self):
+        limit = settings.ADMIN_EXACT_COUNT_LIMIT
+        queryset = self.object_list.order_by()
+        counted = queryset[:limit + 1].count()
+        if counted <= limit:
+            return counted
+        return max(estimate_count(queryset) or 0, counted)
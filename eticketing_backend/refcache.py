@@ -0,0 +1,127 @@
+"""
+In-process cache for small, read-mostly reference data (events, payment methods).
+
+Each worker keeps its own LRU of loaded values. Every cache has a version
+number in the shared default cache that is bumped whenever one of its models
+is saved or deleted; a worker compares the version on each lookup and drops
+its entries when it has moved on. A hit costs one cache read instead of a
+database query, and every worker sees a change on its next lookup.
+
+That only holds when the default cache is shared between workers. With the
+per-process locmem default a change is seen by the worker that made it and
+by the others once their entries are REFCACHE_TTL seconds old, and
+``manage.py check --deploy`` warns about it. REFCACHE_TTL=0 turns caching off.
+
+Invalidation rides on post_save/post_delete. Give cached models a
+``ReferenceQuerySet`` manager so ``QuerySet.update()`` and ``bulk_update()``
+invalidate too; anything else that writes them directly must call
+``invalidate()`` itself.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import cache
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_save
+
+# Reference caches by the models they hold, for ReferenceQuerySet
+_caches = {}
+
+
+class ReferenceQuerySet(models.QuerySet):
+    """QuerySet whose bulk writes invalidate the reference caches of its model"""
+
+    def _invalidate_caches(self):
+        for reference_cache in _caches.get(self.model, []):
+            transaction.on_commit(reference_cache.invalidate, using=self.db)
+
+    def update(self, **kwargs):
+        rows = super().update(**kwargs)
+        self._invalidate_caches()
+        return rows
+
+    def bulk_update(self, objs, fields, batch_size=None):
+        rows = super().bulk_update(objs, fields, batch_size=batch_size)
+        self._invalidate_caches()
+        return rows
+
+
+class ReferenceCache:
+    def __init__(self, name, models, maxsize=512):
+        self.name = name
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+        for model in models:
+            _caches.setdefault(model, []).append(self)
+            post_save.connect(self._on_change, sender=model, weak=False)
+            post_delete.connect(self._on_change, sender=model, weak=False)
+
+    @property
+    def version_key(self):
+        return f'refcache-version:{self.name}'
+
+    def _on_change(self, using=None, **kwargs):
+        # After commit, so no worker can reload the old row under the new version
+        transaction.on_commit(self.invalidate, using=using)
+
+    def invalidate(self):
+        """Bump the shared version so every worker reloads"""
+        try:
+            cache.incr(self.version_key)
+        except ValueError:
+            cache.add(self.version_key, 1, timeout=None)
+        with self._lock:
+            self._entries.clear()
+
+    def get_or_load(self, key, loader):
+        """Cached value for ``key``, calling ``loader()`` on a miss; None results are not cached"""
+        ttl = settings.REFCACHE_TTL
+        if ttl <= 0:
+            return loader()
+        version = cache.get(self.version_key, 0)
+        now = time.monotonic()
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+            elif key in self._entries:
+                value, expires = self._entries[key]
+                if expires > now:
+                    self._entries.move_to_end(key)
+                    return value
+                del self._entries[key]
+
+        value = loader()
+        if value is None:
+            return None
+        with self._lock:
+            # Don't store a value loaded under a version that has since moved on
+            if self._version == version:
+                self._entries[key] = (value, now + ttl)
+                if len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._version = None
+
+
+@checks.register(checks.Tags.caches, deploy=True)
+def check_shared_version_cache(app_configs, **kwargs):
+    """Reference cache versions only reach other workers through a shared default cache"""
+    backend = settings.CACHES['default']['BACKEND']
+    if not backend.endswith('LocMemCache') or settings.REFCACHE_TTL <= 0:
+        return []
+    return [checks.Warning(
+        'The default cache is per-process, so event and payment method changes reach other '
+        f'workers only after REFCACHE_TTL ({settings.REFCACHE_TTL}s).',
+        hint='Set CACHE_BACKEND to a shared cache (memcached, redis, file based), or REFCACHE_TTL=0.',
+        id='refcache.W001',
+    )]
@@ -46,6 +46,7 @@ INSTALLED_APPS = [
     'orders',
     'tickets',
     'payment',
+    'notifications',
 
 ]
 
@@ -91,10 +92,131 @@ WSGI_APPLICATION = 'eticketing_backend.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'ENGINE': os.environ.get('DB_ENGINE', 'django.db.backends.sqlite3'),
+        'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
+        'USER': os.environ.get('DB_USER', ''),
+        'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+        'HOST': os.environ.get('DB_HOST', ''),
+        'PORT': os.environ.get('DB_PORT', ''),
+        # Persistent connections: seconds to keep a connection open (0 closes it
+        # after every request). Health checks ping a reused connection before
+        # handing it to a request.
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', '0')),
+        'CONN_HEALTH_CHECKS': os.environ.get('DB_CONN_HEALTH_CHECKS', 'False') == 'True',
     }
 }
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    # A file (not in-memory) test database lets concurrency tests hold several
+    # connections at once on SQLite
+    DATABASES['default']['TEST'] = {'NAME': BASE_DIR / 'test_db.sqlite3'}
+    # Take the write lock at BEGIN so background writers (scan batcher, check-in
+    # flusher) wait for each other instead of failing with "database is locked"
+    DATABASES['default']['OPTIONS'] = {'transaction_mode': 'IMMEDIATE'}
+
+# Read replicas, e.g. DB_REPLICA_NAMES=replica.sqlite3 for a local SQLite copy of
+# the primary. DB_REPLICA_HOSTS optionally gives one host per replica name.
+_replica_names = [name.strip() for name in os.environ.get('DB_REPLICA_NAMES', '').split(',') if name.strip()]
+_replica_hosts = [host.strip() for host in os.environ.get('DB_REPLICA_HOSTS', '').split(',') if host.strip()]
+for _index, _name in enumerate(_replica_names):
+    DATABASES[f'replica_{_index + 1}'] = {
+        **DATABASES['default'],
+        'NAME': _name,
+        'HOST': _replica_hosts[_index] if _index < len(_replica_hosts) else DATABASES['default']['HOST'],
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['eticketing_backend.db_router.PrimaryReplicaRouter']
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+# How long a user keeps reading from the primary after a write, so they see it.
+DATABASE_REPLICA_PIN_SECONDS = int(os.environ.get('DB_REPLICA_PIN_SECONDS', '10'))
+
+# How long an Idempotency-Key replays its stored response
+IDEMPOTENCY_KEY_TTL = timedelta(hours=int(os.environ.get('IDEMPOTENCY_KEY_TTL_HOURS', '24')))
+# How long a request may hold its key without a response before a retry may
+# take the key over; keep it above the longest request time
+IDEMPOTENCY_LEASE = timedelta(seconds=int(os.environ.get('IDEMPOTENCY_LEASE_SECONDS', '120')))
+
+# Pending orders without a payment confirmation expire after this long
+PENDING_ORDER_TTL = timedelta(hours=int(os.environ.get('PENDING_ORDER_TTL_HOURS', '48')))
+
+# Virtual waiting room for events with waiting_room_enabled: how many queued
+# buyers are let in when the queue opens, how many more per minute after that,
+# and how long an admission token stays valid for placing the order.
+WAITING_ROOM_BURST = int(os.environ.get('WAITING_ROOM_BURST', '100'))
+WAITING_ROOM_ADMIT_PER_MINUTE = int(os.environ.get('WAITING_ROOM_ADMIT_PER_MINUTE', '300'))
+WAITING_ROOM_ADMISSION_SECONDS = int(os.environ.get('WAITING_ROOM_ADMISSION_SECONDS', '900'))
+
+# How often each worker writes its in-memory check-in counters to the database
+CHECKIN_FLUSH_SECONDS = int(os.environ.get('CHECKIN_FLUSH_SECONDS', '5'))
+
+# Door scanning: how long warmed ticket index entries live, and how scans are
+# batched into one transaction (at most this many, waiting at most this long)
+TICKET_INDEX_TTL = timedelta(hours=int(os.environ.get('TICKET_INDEX_TTL_HOURS', '48')))
+TICKET_SCAN_BATCH_SIZE = int(os.environ.get('TICKET_SCAN_BATCH_SIZE', '200'))
+TICKET_SCAN_BATCH_WAIT_MS = int(os.environ.get('TICKET_SCAN_BATCH_WAIT_MS', '10'))
+TICKET_SCAN_TIMEOUT_SECONDS = int(os.environ.get('TICKET_SCAN_TIMEOUT_SECONDS', '5'))
+
+# Orders of events that ended more than this many days ago move to the archive
+# tables, this many orders (with their tickets) per transaction
+ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', '365'))
+ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', '500'))
+
+# Processes shared by a worker that render missing QR codes for the QR code
+# ZIP / print sheet exports; 0 renders them in the request thread
+QR_RENDER_WORKERS = int(os.environ.get('QR_RENDER_WORKERS', '2'))
+
+# Admin changelists count rows exactly up to this many, then use database estimates
+ADMIN_EXACT_COUNT_LIMIT = int(os.environ.get('ADMIN_EXACT_COUNT_LIMIT', '10000'))
+
+# Notifications. The console/file email backends and the console SMS backend
+# deliver without any external service.
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+EMAIL_FILE_PATH = os.environ.get('EMAIL_FILE_PATH', BASE_DIR / 'sent_emails')
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'tickets@localhost')
+SMS_BACKEND = os.environ.get('SMS_BACKEND', 'notifications.sms.ConsoleSMSBackend')
+SITE_URL = os.environ.get('SITE_URL', 'http://localhost:8000')
+NOTIFICATION_MAX_ATTEMPTS = int(os.environ.get('NOTIFICATION_MAX_ATTEMPTS', '5'))
+NOTIFICATION_RETRY_SECONDS = int(os.environ.get('NOTIFICATION_RETRY_SECONDS', '60'))
+# A dispatcher that has not recorded a batch's outcome after this long is
+# presumed dead and the batch is sent again
+NOTIFICATION_SEND_LEASE_SECONDS = int(os.environ.get('NOTIFICATION_SEND_LEASE_SECONDS', '300'))
+
+# Seconds a worker may serve an event or payment method from its reference
+# cache without seeing a change made elsewhere; 0 turns the cache off
+REFCACHE_TTL = int(os.environ.get('REFCACHE_TTL', '30'))
+
+# Cache. Use a shared backend (file based, memcached, redis) when running
+# several workers so per-user state such as replica pinning is seen by all.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'eticketing'),
+    },
+    # Throttle buckets, e.g. THROTTLE_CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+    # with THROTTLE_CACHE_LOCATION=redis://127.0.0.1:6379/1 to share them between workers. The
+    # backend needs an atomic add (memcached, redis, database), so not the file-based cache
+    'throttle': {
+        'BACKEND': os.environ.get('THROTTLE_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('THROTTLE_CACHE_LOCATION', 'eticketing-throttle'),
+    },
+    # Waiting room queue counters. Must be a shared backend with atomic incr
+    # (memcached, redis) when several workers serve the queue, and must not
+    # evict entries while an on-sale is running.
+    'waiting_room': {
+        'BACKEND': os.environ.get('WAITING_ROOM_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('WAITING_ROOM_CACHE_LOCATION', 'eticketing-waiting-room'),
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': 1_000_000},
+    },
+    # Pre-warmed ticket index and first-scan claims for door validation. Use a
+    # shared store (memcached, redis) so every worker answers from one index
+    # and warm_ticket_index can fill it; with locmem each worker fills its own.
+    'ticket_index': {
+        'BACKEND': os.environ.get('TICKET_INDEX_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('TICKET_INDEX_CACHE_LOCATION', 'eticketing-ticket-index'),
+        'OPTIONS': {'MAX_ENTRIES': 1_000_000},
+    },
+}
 
 
 # Password validation
@@ -138,6 +260,19 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
          'rest_framework.permissions.AllowAny',
     ),
+    'DEFAULT_THROTTLE_CLASSES': (
+        'eticketing_backend.throttling.AnonTokenBucketThrottle',
+        'eticketing_backend.throttling.UserTokenBucketThrottle',
+    ),
+    # Token buckets: "N/period" allows bursts of N and refills N per period
+    'DEFAULT_THROTTLE_RATES': {
+        'anon': os.environ.get('THROTTLE_ANON', '120/min'),
+        'user': os.environ.get('THROTTLE_USER', '600/min'),
+        'auth': os.environ.get('THROTTLE_AUTH', '10/min'),
+        'order_create': os.environ.get('THROTTLE_ORDER_CREATE', '10/min'),
+        # Per staff account and gate: well above what one scanner lane sustains at the door
+        'ticket_validation': os.environ.get('THROTTLE_TICKET_VALIDATION', '600/min'),
+    },
 }
 
 
@@ -148,8 +283,17 @@ SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
     'ROTATE_REFRESH_TOKENS': True,
+    # Records each rotated refresh token in users.revocation so it cannot be reused
+    'TOKEN_REFRESH_SERIALIZER': 'users.serializers.RevocableTokenRefreshSerializer',
 }
 
+# Refresh-token revocation: Bloom filter size and false-positive rate, how often
+# a worker rereads the table at the latest, and how often it rebuilds the filter
+REVOCATION_BLOOM_CAPACITY = int(os.environ.get('REVOCATION_BLOOM_CAPACITY', '1000000'))
+REVOCATION_BLOOM_ERROR_RATE = float(os.environ.get('REVOCATION_BLOOM_ERROR_RATE', '0.001'))
+REVOCATION_SYNC_SECONDS = int(os.environ.get('REVOCATION_SYNC_SECONDS', '30'))
+REVOCATION_REBUILD_HOURS = int(os.environ.get('REVOCATION_REBUILD_HOURS', '6'))
+
 # CORS settings (for development)
 # CORS settings (for development)
 
@@ -181,7 +325,14 @@ CORS_ALLOW_HEADERS = [
     'user-agent',
     'x-csrftoken',
     'x-requested-with',
+    'idempotency-key',
+    'x-admission-token',
+    'x-queue-token',
+    'if-none-match',
+    'if-modified-since',
 ] # Only for development
+# Let browser clients read the validators of conditional GETs
+CORS_EXPOSE_HEADERS = ['etag', 'last-modified']
 
 # Media files
 MEDIA_URL = '/media/'
@@ -0,0 +1,152 @@
+"""
+Token-bucket throttles for DRF.
+
+Each client (user id when authenticated, otherwise IP address) gets a bucket
+per scope that holds up to N tokens and refills at N per period, using the
+rates in REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'] ("5/min" style). A request
+takes one token, so short bursts up to N are allowed while the long-run rate
+is capped. Buckets live in the 'throttle' cache; point it at a shared backend
+so all workers see the same buckets.
+
+A check reads the bucket, takes a token and writes it back, so concurrent
+requests of one client must not interleave or they all spend the same token.
+With the per-process locmem cache the check runs under a process-wide lock.
+With a shared cache it runs under a short per-bucket lock taken with
+``cache.add``, which is atomic on memcached, redis and the database cache
+(not on the file-based cache). A request that cannot get the lock within
+LOCK_WAIT is throttled: only a client bursting on one bucket contends.
+"""
+import math
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import quote
+
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+DURATIONS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+# Seconds a request waits for a shared bucket's lock, and how long the lock
+# outlives a worker that died holding it
+LOCK_WAIT = 0.05
+LOCK_TIMEOUT = 1
+
+_local_lock = threading.Lock()
+
+
+def parse_rate(rate):
+    """'10/min' -> (capacity, tokens per second)"""
+    count, period = rate.split('/')
+    return int(count), int(count) / DURATIONS[period[0]]
+
+
+class TokenBucketThrottle(BaseThrottle):
+    scope = None
+    cache_alias = 'throttle'
+    timer = time.time
+
+    def __init__(self):
+        rates = api_settings.DEFAULT_THROTTLE_RATES
+        if self.scope not in rates:
+            raise ImproperlyConfigured(f"No throttle rate set for scope '{self.scope}'")
+        self.capacity, self.refill_rate = parse_rate(rates[self.scope])
+        self.cache = caches[self.cache_alias]
+        self.retry_after = None
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = f'user:{request.user.pk}'
+        else:
+            ident = f'ip:{self.get_ident(request)}'
+        return f'throttle:{self.scope}:{ident}'
+
+    @contextmanager
+    def _locked(self, key):
+        """Hold the bucket for a read-modify-write; yields whether the lock was taken"""
+        if isinstance(self.cache, LocMemCache):
+            with _local_lock:
+                yield True
+            return
+
+        lock_key = f'{key}:lock'
+        deadline = time.monotonic() + LOCK_WAIT
+        while not self.cache.add(lock_key, 1, LOCK_TIMEOUT):
+            if time.monotonic() >= deadline:
+                yield False
+                return
+            time.sleep(0.002)
+        try:
+            yield True
+        finally:
+            self.cache.delete(lock_key)
+
+    def allow_request(self, request, view):
+        key = self.get_cache_key(request, view)
+        if key is None:
+            return True
+
+        with self._locked(key) as locked:
+            if not locked:
+                self.retry_after = 1 / self.refill_rate
+                return False
+            return self._take_token(key)
+
+    def _take_token(self, key):
+        now = self.timer()
+        tokens, updated_at = self.cache.get(key, (self.capacity, now))
+        tokens = min(self.capacity, tokens + (now - updated_at) * self.refill_rate)
+
+        # Keep the bucket only until it would be full again
+        expires = int((self.capacity - tokens + 1) / self.refill_rate) + 1
+        if tokens < 1:
+            self.retry_after = (1 - tokens) / self.refill_rate
+            self.cache.set(key, (tokens, now), expires)
+            return False
+        self.cache.set(key, (tokens - 1, now), expires)
+        return True
+
+    def wait(self):
+        # Retry-After is sent in whole seconds
+        return math.ceil(self.retry_after) if self.retry_after is not None else None
+
+
+class AnonTokenBucketThrottle(TokenBucketThrottle):
+    """Default bucket for unauthenticated clients, keyed by IP"""
+    scope = 'anon'
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return None
+        return super().get_cache_key(request, view)
+
+
+class UserTokenBucketThrottle(TokenBucketThrottle):
+    """Default bucket for authenticated users"""
+    scope = 'user'
+
+    def get_cache_key(self, request, view):
+        if not (request.user and request.user.is_authenticated):
+            return None
+        return super().get_cache_key(request, view)
+
+
+class AuthThrottle(TokenBucketThrottle):
+    scope = 'auth'
+
+
+class OrderCreateThrottle(TokenBucketThrottle):
+    scope = 'order_create'
+
+
+class TicketValidationThrottle(TokenBucketThrottle):
+    """One bucket per staff account and gate, so an account scanning at several gates gets the rate at each"""
+    scope = 'ticket_validation'
+
+    def get_cache_key(self, request, view):
+        data = request.data if isinstance(request.data, dict) else {}
+        gate = str(data.get('gate') or '')[:50]
+        return f'{super().get_cache_key(request, view)}:gate:{quote(gate, safe="")}'
@@ -1,12 +1,84 @@
 # events/admin.py
-from django.contrib import admin
-from .models import Event
+import os
+
+from django import forms
+from django.contrib import admin, messages
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
+
+from .models import Event, SeatRow
+
+
+class EventImportForm(forms.Form):
+    file = forms.FileField(help_text='CSV or JSON file of events')
+    image_directory = forms.CharField(help_text='Directory on the server holding the event images')
+
+    def clean_image_directory(self):
+        directory = self.cleaned_data['image_directory']
+        if not os.path.isdir(directory):
+            raise forms.ValidationError('Directory does not exist on the server')
+        return directory
+
+    def clean_file(self):
+        uploaded = self.cleaned_data['file']
+        if os.path.splitext(uploaded.name)[1].lower() not in ('.csv', '.json'):
+            raise forms.ValidationError('Upload a .csv or .json file')
+        return uploaded
+
 
 @admin.register(Event)
 class EventAdmin(admin.ModelAdmin):
     list_display = ('title', 'date', 'price', 'location', 'organizer', 'created_at')
-    list_filter = ('date', 'location', 'organizer')
+    list_filter = ('date', 'location', 'organizer', 'waiting_room_enabled', 'reserved_seating')
     search_fields = ('title', 'description', 'location', 'organizer__username')
     prepopulated_fields = {'title': ('title',)}
     date_hierarchy = 'date'
-    readonly_fields = ('created_at', 'updated_at')
\ No newline at end of file
+    readonly_fields = ('created_at', 'updated_at')
+    change_list_template = 'admin/events/event/change_list.html'
+
+    def get_urls(self):
+        return [
+            path('import/', self.admin_site.admin_view(self.import_view), name='events_event_import'),
+        ] + super().get_urls()
+
+    def import_view(self, request):
+        if not self.has_add_permission(request):
+            return redirect('admin:events_event_changelist')
+
+        form = EventImportForm(request.POST or None, request.FILES or None)
+        result = None
+        if request.method == 'POST' and form.is_valid():
+            uploaded = form.cleaned_data['file']
+            file_format = os.path.splitext(uploaded.name)[1].lstrip('.').lower()
+            # Loaded here so the importer stays out of every worker's startup
+            from .importer import import_events_file
+            try:
+                result = import_events_file(uploaded.file, file_format, form.cleaned_data['image_directory'])
+            except ValueError as e:
+                messages.error(request, f'Could not read {uploaded.name}: {e}')
+            else:
+                level = messages.WARNING if result.errors else messages.SUCCESS
+                messages.add_message(
+                    request, level,
+                    f'Imported {result.created} events, {len(result.errors)} rows with errors'
+                )
+
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Import events',
+            'form': form,
+            'row_errors': sorted(result.errors.items()) if result else [],
+        }
+        return TemplateResponse(request, 'admin/events/event/import_events.html', context)
+
+
+@admin.register(SeatRow)
+class SeatRowAdmin(admin.ModelAdmin):
+    list_display = ('event', 'section', 'row', 'rank', 'seat_count', 'longest_run')
+    list_filter = ('event', 'section')
+    search_fields = ('event__title', 'section', 'row')
+    ordering = ('event', 'rank')
+    # The bitset is only changed by the allocator
+    readonly_fields = ('taken', 'longest_run')
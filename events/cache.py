@@ -0,0 +1,12 @@
+import copy
+
+from eticketing_backend.refcache import ReferenceCache
+from .models import Event
+
+event_cache = ReferenceCache('events', [Event])
+
+
+def get_event(event_id):
+    """Event by id from the reference cache, or None; callers get their own copy"""
+    event = event_cache.get_or_load(event_id, lambda: Event.objects.filter(pk=event_id).first())
+    return copy.copy(event) if event is not None else None
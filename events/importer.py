@@ -0,0 +1,165 @@
+"""
+Bulk event import from CSV or JSON.
+
+All rows are validated first, organizers are resolved with one query, images
+are checked and copied into storage by a thread pool, and the valid events are
+inserted with bulk_create in chunks. Problems are reported per row and never
+abort the rest of the batch.
+"""
+import csv
+import io
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Q
+
+from events.models import Event
+from events.serializers import EventImportSerializer
+from users.models import User
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ImportResult:
+    created: int = 0
+    errors: dict = field(default_factory=dict)  # row number -> list of messages
+
+    def add_error(self, row_number, message):
+        self.errors.setdefault(row_number, []).append(message)
+
+
+def read_rows(stream, file_format):
+    """Read rows from a text stream holding CSV or a JSON list of objects"""
+    if file_format == 'csv':
+        return list(csv.DictReader(stream))
+    if file_format == 'json':
+        rows = json.load(stream)
+        if not isinstance(rows, list):
+            raise ValueError('JSON import must be a list of event objects')
+        return rows
+    raise ValueError(f'Unsupported import format: {file_format}')
+
+
+def _flatten_errors(errors):
+    return [f'{name}: {message}' for name, messages in errors.items() for message in messages]
+
+
+def _resolve_organizers(identifiers):
+    users = User.objects.filter(Q(email__in=identifiers) | Q(username__in=identifiers)).only(
+        'id', 'email', 'username'
+    )
+    lookup = {}
+    for user in users:
+        lookup[user.username] = user.id
+        lookup.setdefault(user.email, user.id)
+    return lookup
+
+
+def _store_image(image_dir, name, store=True):
+    """Check an image from the import directory with Pillow and copy it into storage"""
+    from PIL import Image
+
+    path = os.path.join(image_dir, name)
+    if not os.path.isfile(path):
+        raise ValueError(f'image {name} not found in {image_dir}')
+    with open(path, 'rb') as handle:
+        Image.open(handle).verify()
+        if not store:
+            return name
+        handle.seek(0)
+        return default_storage.save(f'events/{os.path.basename(name)}', File(handle))
+
+
+def import_events(rows, image_dir, batch_size=500, workers=4, dry_run=False):
+    result = ImportResult()
+
+    # 1. Validate every row
+    valid = []
+    for row_number, row in enumerate(rows, start=1):
+        if not isinstance(row, dict):
+            result.add_error(row_number, 'row must be an object')
+            continue
+        # Blank spreadsheet cells count as missing so defaults apply
+        row = {key: value for key, value in row.items() if value not in ('', None)}
+        serializer = EventImportSerializer(data=row)
+        if serializer.is_valid():
+            valid.append((row_number, serializer.validated_data))
+        else:
+            for message in _flatten_errors(serializer.errors):
+                result.add_error(row_number, message)
+
+    # 2. Resolve organizers in a single query
+    organizers = _resolve_organizers({data['organizer'] for _, data in valid})
+    resolved = []
+    for row_number, data in valid:
+        if data['organizer'] not in organizers:
+            result.add_error(row_number, f"organizer: no user with email or username {data['organizer']}")
+        else:
+            resolved.append((row_number, data))
+
+    # 3. Check and store each distinct image once, in parallel
+    image_names = sorted({data['image'] for _, data in resolved})
+    stored_images, image_errors = {}, {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            name: pool.submit(_store_image, image_dir, name, store=not dry_run)
+            for name in image_names
+        }
+        for name, future in futures.items():
+            try:
+                stored_images[name] = future.result()
+            except Exception as e:
+                image_errors[name] = str(e) or e.__class__.__name__
+
+    events = []
+    for row_number, data in resolved:
+        if data['image'] in image_errors:
+            result.add_error(row_number, f"image: {image_errors[data['image']]}")
+            continue
+        events.append((row_number, Event(
+            title=data['title'],
+            description=data['description'],
+            date=data['date'],
+            price=data['price'],
+            location=data['location'],
+            organizer_id=organizers[data['organizer']],
+            image=stored_images[data['image']],
+            is_active=data['is_active'],
+        )))
+
+    if dry_run:
+        result.created = len(events)
+        return result
+
+    # 4. Insert in chunks; a failing chunk is retried row by row
+    for start in range(0, len(events), batch_size):
+        chunk = events[start:start + batch_size]
+        try:
+            with transaction.atomic():
+                Event.objects.bulk_create([event for _, event in chunk])
+            result.created += len(chunk)
+        except Exception:
+            logger.exception('Bulk insert of events failed, retrying row by row')
+            for row_number, event in chunk:
+                try:
+                    with transaction.atomic():
+                        event.save()
+                    result.created += 1
+                except Exception as e:
+                    result.add_error(row_number, f'database: {e}')
+
+    logger.info(f"Imported {result.created} events, {len(result.errors)} rows with errors")
+    return result
+
+
+def import_events_file(uploaded, file_format, image_dir, **kwargs):
+    """Import from a binary file object such as an admin upload"""
+    stream = io.TextIOWrapper(uploaded, encoding='utf-8-sig', newline='')
+    return import_events(read_rows(stream, file_format), image_dir, **kwargs)
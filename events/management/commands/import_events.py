@@ -0,0 +1,44 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from events.importer import import_events, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Bulk import events from a CSV or JSON file, with images from a local directory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSON file of events')
+        parser.add_argument('--images', required=True, help='Directory holding the event images')
+        parser.add_argument('--format', choices=['csv', 'json'], help='Defaults to the file extension')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--workers', type=int, default=4, help='Threads used to process images')
+        parser.add_argument('--dry-run', action='store_true', help='Validate only, write nothing')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or os.path.splitext(path)[1].lstrip('.').lower()
+        if not os.path.isdir(options['images']):
+            raise CommandError(f"Image directory {options['images']} does not exist")
+
+        try:
+            with open(path, encoding='utf-8-sig', newline='') as stream:
+                rows = read_rows(stream, file_format)
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        result = import_events(
+            rows, options['images'],
+            batch_size=options['batch_size'],
+            workers=options['workers'],
+            dry_run=options['dry_run'],
+        )
+
+        for row_number, messages in sorted(result.errors.items()):
+            for message in messages:
+                self.stderr.write(f'Row {row_number}: {message}')
+        verb = 'Validated' if options['dry_run'] else 'Imported'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {result.created} of {len(rows)} events, {len(result.errors)} rows with errors'
+        ))
@@ -0,0 +1,30 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from events.models import Event
+from events.seating import SeatMapError, load_seat_map
+
+
+class Command(BaseCommand):
+    help = "Create an event's reserved seating map (sections, rows, seats) from a JSON file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('event_id', type=int)
+        parser.add_argument('path', help='JSON file: {"sections": [{"name", "rows", "seats", "rank"}, ...]}')
+
+    def handle(self, *args, **options):
+        try:
+            event = Event.objects.get(pk=options['event_id'])
+        except Event.DoesNotExist:
+            raise CommandError(f"Event {options['event_id']} does not exist")
+
+        try:
+            with open(options['path'], encoding='utf-8') as stream:
+                seats = load_seat_map(event, json.load(stream))
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Loaded {seats} seats in {event.seat_rows.count()} rows for {event}'
+        ))
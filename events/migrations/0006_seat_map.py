@@ -0,0 +1,36 @@
+# Generated by Django 5.2.5 on 2026-10-19 19:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0005_event_waiting_room_enabled'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='reserved_seating',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='SeatRow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('section', models.CharField(max_length=50)),
+                ('row', models.CharField(max_length=10)),
+                ('rank', models.PositiveIntegerField()),
+                ('seat_count', models.PositiveSmallIntegerField()),
+                ('taken', models.BinaryField()),
+                ('longest_run', models.PositiveSmallIntegerField()),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='seat_rows', to='events.event')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['event', 'rank'], name='seat_row_event_rank_idx'), models.Index(fields=['event', 'section', 'rank'], name='seat_row_section_rank_idx')],
+                'constraints': [models.UniqueConstraint(fields=('event', 'section', 'row'), name='unique_seat_row')],
+            },
+        ),
+    ]
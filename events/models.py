@@ -1,4 +1,5 @@
 from django.db import models
+from eticketing_backend.refcache import ReferenceQuerySet
 from users.models import User
 
 class Event(models.Model):
@@ -12,6 +13,41 @@ class Event(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True)
+    # High-demand on-sales: buyers must queue for an admission token before ordering
+    waiting_room_enabled = models.BooleanField(default=False)
+    # Orders get specific seats from the event's seat map (see events.seating)
+    reserved_seating = models.BooleanField(default=False)
+
+    # Bulk updates invalidate the reference cache (see eticketing_backend.refcache)
+    objects = ReferenceQuerySet.as_manager()
 
     def __str__(self):
         return self.title
+
+
+class SeatRow(models.Model):
+    """
+    One row of an event's seat map. ``taken`` is a bitset of the row's held
+    and sold seats (bit i is seat i + 1) and ``longest_run`` the longest run
+    of free seats in it; events.seating keeps both in step.
+    """
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='seat_rows')
+    section = models.CharField(max_length=50)
+    row = models.CharField(max_length=10)
+    # Best available tries rows with a lower rank first
+    rank = models.PositiveIntegerField()
+    seat_count = models.PositiveSmallIntegerField()
+    taken = models.BinaryField()
+    longest_run = models.PositiveSmallIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['event', 'section', 'row'], name='unique_seat_row'),
+        ]
+        indexes = [
+            models.Index(fields=['event', 'rank'], name='seat_row_event_rank_idx'),
+            models.Index(fields=['event', 'section', 'rank'], name='seat_row_section_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.event} - {self.section} row {self.row}"
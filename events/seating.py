@@ -0,0 +1,209 @@
+"""
+Reserved seating: seat maps and the best-available allocator.
+
+An event's seat map is a set of SeatRow records. Each keeps its held and sold
+seats as a bitset in ``taken`` and the longest run of free seats in
+``longest_run``. Finding rows that can seat a party of n together is then one
+indexed query: the event's (or section's) rows with longest_run >= n in rank
+order. Within a row the bitset gives every run of n free seats with n shifts
+and ANDs, and the run nearest the middle of the row wins.
+
+Holding seats is a compare-and-swap on that one row, like order transitions:
+``UPDATE ... SET taken = <new> WHERE id = <row> AND taken = <bitset we read>``.
+Nothing is locked beforehand, so allocations in different rows, and so in
+different sections, never wait on each other. Of two buyers racing for the
+same row the loser re-reads it and tries again. Releasing clears the bits
+the same way.
+
+Orders keep what they hold in ``Order.seats``; approved orders' tickets get
+the seats, and rejected, expired or deleted orders release them.
+"""
+import random
+
+from django.db import transaction
+
+from events.models import SeatRow
+
+# Rows fetched per query, and attempts on one row before moving to the next
+CANDIDATE_ROWS = 8
+ROW_ATTEMPTS = 5
+MAX_ROUNDS = 5
+
+
+class SeatsUnavailable(Exception):
+    pass
+
+
+class SeatMapError(ValueError):
+    pass
+
+
+def _empty(seat_count):
+    return bytes((seat_count + 7) // 8)
+
+
+def _mask(taken):
+    return int.from_bytes(taken, 'little')
+
+
+def _free(mask, seat_count):
+    return ~mask & ((1 << seat_count) - 1)
+
+
+def longest_run(free):
+    """Length of the longest run of set bits"""
+    run = 0
+    while free:
+        free &= free >> 1
+        run += 1
+    return run
+
+
+def best_start(mask, seat_count, quantity):
+    """0-based first seat of the free run of ``quantity`` seats nearest the middle of the row, or None"""
+    free = _free(mask, seat_count)
+    starts = free
+    for shift in range(1, quantity):
+        starts &= free >> shift
+    best, middle = None, seat_count - quantity  # distances are doubled to stay in integers
+    while starts:
+        low = starts & -starts
+        start = low.bit_length() - 1
+        if best is None or abs(2 * start - middle) < abs(2 * best - middle):
+            best = start
+        starts ^= low
+    return best
+
+
+def _swap(row_id, seat_count, old, mask):
+    """Write ``mask`` if the row still has the bitset ``old``; whether it did"""
+    return SeatRow.objects.filter(pk=row_id, taken=old).update(
+        taken=mask.to_bytes(len(old), 'little'), longest_run=longest_run(_free(mask, seat_count))
+    ) == 1
+
+
+def _read(row_id):
+    taken = SeatRow.objects.filter(pk=row_id).values_list('taken', flat=True).first()
+    return bytes(taken) if taken is not None else None
+
+
+def hold_seats(event_id, quantity, section=None):
+    """
+    Hold the best available ``quantity`` adjacent seats of the event, in
+    ``section`` if given, and return them as Order.seats entries. Raises
+    SeatsUnavailable if no row has that many free seats together.
+    """
+    rows = SeatRow.objects.filter(event_id=event_id, longest_run__gte=quantity)
+    if section:
+        rows = rows.filter(section=section)
+    for _ in range(MAX_ROUNDS):
+        candidates = list(
+            rows.order_by('rank').values_list('id', 'section', 'row', 'rank', 'seat_count', 'taken')[:CANDIDATE_ROWS]
+        )
+        if not candidates:
+            break
+        # Buyers spread over rows of equal rank instead of all racing for the first
+        candidates.sort(key=lambda candidate: (candidate[3], random.random()))
+        for row_id, row_section, row, _, seat_count, taken in candidates:
+            taken = bytes(taken)
+            for _ in range(ROW_ATTEMPTS):
+                mask = _mask(taken)
+                start = best_start(mask, seat_count, quantity)
+                if start is None:
+                    break
+                if _swap(row_id, seat_count, taken, mask | (((1 << quantity) - 1) << start)):
+                    return [{
+                        'row_id': row_id, 'section': row_section, 'row': row,
+                        'seats': list(range(start + 1, start + quantity + 1)),
+                    }]
+                # Someone else changed the row since we read it
+                taken = _read(row_id)
+                if taken is None:
+                    break
+    where = f' in section {section}' if section else ''
+    raise SeatsUnavailable(f'No {quantity} adjacent seats available{where}; try fewer seats or another section')
+
+
+def release_seats(holds):
+    """Free the seats of Order.seats entries"""
+    for hold in holds:
+        bits = sum(1 << (number - 1) for number in hold['seats'])
+        while True:
+            row = SeatRow.objects.filter(pk=hold['row_id']).values_list('seat_count', 'taken').first()
+            if row is None:
+                break
+            seat_count, taken = row[0], bytes(row[1])
+            if _swap(hold['row_id'], seat_count, taken, _mask(taken) & ~bits):
+                break
+
+
+def seat_assignments(holds, quantity):
+    """(seat_row_id, seat_number) for each of ``quantity`` tickets; (None, None) beyond the held seats"""
+    seats = [(hold['row_id'], number) for hold in holds for number in hold['seats']]
+    return (seats + [(None, None)] * quantity)[:quantity]
+
+
+def _row_labels(rows):
+    if isinstance(rows, int):
+        return [{'row': str(number)} for number in range(1, rows + 1)]
+    return rows
+
+
+def load_seat_map(event, spec):
+    """
+    Create the event's seat map from ``spec`` and turn on reserved seating.
+
+    ``spec`` is {'sections': [...]} with sections best first. A section is
+    {'name', 'rows', 'seats', 'rank'}: ``rows`` is a count (rows '1'..'n' of
+    ``seats`` seats each) or a list of {'row', 'seats', 'rank'}. Rows are
+    ranked in order from the section's ``rank``, by default the next after
+    the previous section's rows; sections sharing a rank interleave, which
+    also spreads concurrent buyers over them. Returns the number of seats.
+    """
+    if event.seat_rows.exists():
+        raise SeatMapError(f'{event} already has a seat map')
+    rows, next_rank = [], 0
+    for section in spec.get('sections', []):
+        name = str(section.get('name', '')).strip()
+        if not name:
+            raise SeatMapError('Every section needs a name')
+        rank = section.get('rank', next_rank)
+        for index, row in enumerate(_row_labels(section.get('rows', []))):
+            seat_count = row.get('seats', section.get('seats'))
+            if not row.get('row'):
+                raise SeatMapError(f'Every row of section {name} needs a label')
+            if not isinstance(seat_count, int) or not 1 <= seat_count <= 1000:
+                raise SeatMapError(f"Row {row['row']} of section {name} needs 1 to 1000 seats")
+            rows.append(SeatRow(
+                event=event, section=name, row=str(row['row']), rank=row.get('rank', rank + index),
+                seat_count=seat_count, taken=_empty(seat_count), longest_run=seat_count,
+            ))
+            next_rank = max(next_rank, rows[-1].rank + 1)
+    if not rows:
+        raise SeatMapError('The seat map has no rows')
+    with transaction.atomic():
+        SeatRow.objects.bulk_create(rows, batch_size=1000)
+        event.reserved_seating = True
+        event.save(update_fields=['reserved_seating', 'updated_at'])
+    return sum(row.seat_count for row in rows)
+
+
+def seat_availability(event_id, section=None):
+    """Free seats per section, and per row with the free seat numbers when ``section`` is given"""
+    rows = SeatRow.objects.filter(event_id=event_id).order_by('rank')
+    if section:
+        rows = rows.filter(section=section)
+    sections = {}
+    for name, row, seat_count, taken, run in rows.values_list('section', 'row', 'seat_count', 'taken', 'longest_run'):
+        free = _free(_mask(bytes(taken)), seat_count)
+        available = bin(free).count('1')
+        summary = sections.setdefault(name, {'section': name, 'seats': 0, 'available': 0, 'longest_run': 0})
+        summary['seats'] += seat_count
+        summary['available'] += available
+        summary['longest_run'] = max(summary['longest_run'], run)
+        if section:
+            summary.setdefault('rows', []).append({
+                'row': row, 'seats': seat_count, 'available': available,
+                'free': [number + 1 for number in range(seat_count) if free >> number & 1],
+            })
+    return list(sections.values())
@@ -1,8 +1,21 @@
 # events/serializers.py
 from rest_framework import serializers
+from eticketing_backend.fieldsets import SparseFieldsMixin
 from .models import Event
 
-class EventSerializer(serializers.ModelSerializer):
+class EventSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Event
         fields = "__all__"
+
+
+class EventImportSerializer(serializers.Serializer):
+    """One row of a bulk event import; organizer is an email or username"""
+    title = serializers.CharField(max_length=200)
+    description = serializers.CharField()
+    date = serializers.DateTimeField()
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0)
+    location = serializers.CharField(max_length=200)
+    organizer = serializers.CharField()
+    image = serializers.CharField()
+    is_active = serializers.BooleanField(default=True)
@@ -1,3 +1,46 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+
+from events.cache import event_cache, get_event
+from events.models import Event
+from users.models import User
+
+
+class EventReferenceCacheTests(TestCase):
+    """Cached events must not outlive a change for longer than REFCACHE_TTL"""
+
+    def setUp(self):
+        event_cache.clear()
+        self.user = User.objects.create_user(
+            username='organizer@example.com', email='organizer@example.com', password='secret', phone='0200000000'
+        )
+        self.event = Event.objects.create(
+            title='Concert', description='Live', date='2030-01-01T20:00:00Z', price=50,
+            image='events/concert.jpg', location='Accra', organizer=self.user
+        )
+
+    def _change_price_elsewhere(self, price):
+        # As another worker would: the row changes but this worker's entries and version don't
+        with mock.patch.object(event_cache, 'invalidate'):
+            Event.objects.filter(pk=self.event.pk).update(price=price)
+
+    def test_entries_expire_after_ttl(self):
+        with mock.patch('eticketing_backend.refcache.time.monotonic', return_value=1000.0):
+            self.assertEqual(get_event(self.event.pk).price, 50)
+            self._change_price_elsewhere(80)
+            self.assertEqual(get_event(self.event.pk).price, 50)
+        with mock.patch('eticketing_backend.refcache.time.monotonic', return_value=1031.0):
+            self.assertEqual(get_event(self.event.pk).price, 80)
+
+    def test_queryset_update_invalidates(self):
+        self.assertEqual(get_event(self.event.pk).price, 50)
+        with self.captureOnCommitCallbacks(execute=True):
+            Event.objects.filter(pk=self.event.pk).update(price=70)
+        self.assertEqual(get_event(self.event.pk).price, 70)
+
+    @override_settings(REFCACHE_TTL=0)
+    def test_zero_ttl_disables_caching(self):
+        self.assertEqual(get_event(self.event.pk).price, 50)
+        self._change_price_elsewhere(90)
+        self.assertEqual(get_event(self.event.pk).price, 90)
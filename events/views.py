@@ -1,9 +1,30 @@
-from rest_framework import viewsets
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
+from rest_framework.permissions import SAFE_METHODS
+from eticketing_backend.db_router import ReplicaReadMixin
+from eticketing_backend.fieldsets import SparseFieldsViewMixin
 from .models import Event
+from .seating import seat_availability
 from .serializers import EventSerializer
 
-class EventViewSet(viewsets.ModelViewSet):
+class EventViewSet(SparseFieldsViewMixin, ReplicaReadMixin, viewsets.ModelViewSet):
+    """Events; reads support ?fields="""
     queryset = Event.objects.all()
     serializer_class = EventSerializer
-    permission_classes = [IsAuthenticatedOrReadOnly]
\ No newline at end of file
+    permission_classes = [IsAuthenticatedOrReadOnly]
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.method in SAFE_METHODS:
+            queryset = self.optimize_queryset(queryset)
+        return queryset
+
+    @action(detail=True, methods=['get'])
+    def seats(self, request, pk=None):
+        """Free seats per section of a reserved seating event; ?section= lists that section's free seats by row"""
+        event = self.get_object()
+        if not event.reserved_seating:
+            return Response({'error': 'This event has no reserved seating'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(seat_availability(event.pk, request.query_params.get('section')))
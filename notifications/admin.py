@@ -0,0 +1,13 @@
+from django.contrib import admin
+from eticketing_backend.paginators import ApproximateCountPaginator
+from .models import Notification
+
+@admin.register(Notification)
+class NotificationAdmin(admin.ModelAdmin):
+    list_display = ('kind', 'channel', 'recipient', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status', 'channel', 'kind')
+    search_fields = ('recipient', 'dedupe_key')
+    raw_id_fields = ('order',)
+    readonly_fields = ('created_at', 'sent_at', 'last_error')
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from notifications.outbox import dispatch_due
+
+
+class Command(BaseCommand):
+    help = 'Send pending email and SMS notifications from the outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument(
+            '--interval', type=int, default=0,
+            help='Keep running and poll the outbox every INTERVAL seconds'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            total_sent = total_failed = 0
+            while True:
+                sent, failed = dispatch_due(batch_size=options['batch_size'])
+                total_sent += sent
+                total_failed += failed
+                if sent + failed < options['batch_size']:
+                    break
+            if total_sent or total_failed or not options['interval']:
+                self.stdout.write(self.style.SUCCESS(
+                    f'Sent {total_sent} notifications, {total_failed} failed'
+                ))
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
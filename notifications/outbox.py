@@ -0,0 +1,172 @@
+"""
+Transactional notification outbox.
+
+``enqueue_orders_approved`` only inserts Notification rows, inside the caller's
+transaction, so approving an order never waits on email or SMS and a rolled
+back approval sends nothing. ``dispatch_due`` (run by the
+``dispatch_notifications`` command) sends due rows in batches and retries
+failures with exponential backoff. The unique dedupe_key means an order is
+announced at most once per channel.
+
+A batch is claimed in a short transaction that marks its rows 'sending' for
+NOTIFICATION_SEND_LEASE_SECONDS, sent with no transaction open (and so no
+row or SQLite write lock held during network calls), and its outcomes are
+recorded in a second short transaction. Rows of a dispatcher that died
+mid-batch are claimed again once their lease runs out, so a message can
+in rare cases be sent twice but is never lost.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from notifications.models import Notification
+from notifications.sms import get_sms_backend
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_orders_approved(orders):
+    notifications = []
+    for order in orders:
+        user = order.user
+        if user.email:
+            notifications.append(Notification(
+                order=order, kind='order_approved', channel='email', recipient=user.email,
+                dedupe_key=f'order_approved:{order.pk}:email'
+            ))
+        if user.phone:
+            notifications.append(Notification(
+                order=order, kind='order_approved', channel='sms', recipient=user.phone,
+                dedupe_key=f'order_approved:{order.pk}:sms'
+            ))
+    Notification.objects.bulk_create(notifications, ignore_conflicts=True)
+
+
+def enqueue_order_approved(order):
+    enqueue_orders_approved([order])
+
+
+def _ticket_lines(order):
+    lines = []
+    for ticket in order.tickets.all():
+        line = f'Ticket {ticket.ticket_id}'
+        if ticket.qr_code:
+            line += f': {settings.SITE_URL}{ticket.qr_code.url}'
+        lines.append(line)
+    return lines
+
+
+def _render_email(notification):
+    order = notification.order
+    body = '\n'.join([
+        f'Hi {order.user.first_name or order.user.email},',
+        '',
+        f'Your payment for {order.event.title} on {timezone.localtime(order.event.date):%d %b %Y %H:%M} '
+        f'at {order.event.location} has been confirmed.',
+        f'Order {order.order_id}, {order.quantity} ticket(s):',
+        '',
+        *_ticket_lines(order),
+    ])
+    return EmailMessage(
+        subject=f'Your tickets for {order.event.title}',
+        body=body,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[notification.recipient],
+    )
+
+
+def _render_sms(notification):
+    order = notification.order
+    ticket_ids = ', '.join(ticket.ticket_id for ticket in order.tickets.all())
+    return (
+        notification.recipient,
+        f'Order {order.order_id} for {order.event.title} is confirmed. Tickets: {ticket_ids}'
+    )
+
+
+def _send_emails(notifications):
+    errors = []
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+        for notification in notifications:
+            try:
+                message = _render_email(notification)
+                message.connection = connection
+                message.send()
+                errors.append(None)
+            except Exception as e:
+                errors.append(str(e) or e.__class__.__name__)
+    except Exception as e:
+        # Could not even connect: every message in the batch failed
+        errors += [str(e) or e.__class__.__name__] * (len(notifications) - len(errors))
+    finally:
+        connection.close()
+    return errors
+
+
+def _send_sms(notifications):
+    try:
+        return get_sms_backend().send_messages([_render_sms(n) for n in notifications])
+    except Exception as e:
+        return [str(e) or e.__class__.__name__] * len(notifications)
+
+
+def _claim(now, batch_size):
+    """Mark a batch of due notifications as being sent by this dispatcher, returning their ids"""
+    with transaction.atomic():
+        ids = list(
+            Notification.objects.select_for_update(skip_locked=True)
+            .filter(status__in=Notification.UNSENT_STATUSES, next_attempt_at__lte=now)
+            .order_by('next_attempt_at').values_list('pk', flat=True)[:batch_size]
+        )
+        Notification.objects.filter(pk__in=ids).update(
+            status='sending', next_attempt_at=now + timedelta(seconds=settings.NOTIFICATION_SEND_LEASE_SECONDS)
+        )
+    return ids
+
+
+def dispatch_due(batch_size=100):
+    """Send one batch of due notifications, returning (sent, failed) counts"""
+    now = timezone.now()
+    sent = failed = 0
+    ids = _claim(now, batch_size)
+    if not ids:
+        return sent, failed
+    due = list(
+        Notification.objects.filter(pk__in=ids)
+        .select_related('order__user', 'order__event')
+        .prefetch_related('order__tickets')
+        .order_by('next_attempt_at')
+    )
+    emails = [n for n in due if n.channel == 'email']
+    texts = [n for n in due if n.channel == 'sms']
+    outcomes = list(zip(emails, _send_emails(emails) if emails else []))
+    outcomes += list(zip(texts, _send_sms(texts) if texts else []))
+
+    with transaction.atomic():
+        for notification, error in outcomes:
+            notification.attempts += 1
+            if error is None:
+                notification.status = 'sent'
+                notification.sent_at = timezone.now()
+                sent += 1
+            else:
+                notification.last_error = error
+                if notification.attempts >= settings.NOTIFICATION_MAX_ATTEMPTS:
+                    notification.status = 'failed'
+                else:
+                    notification.status = 'pending'
+                    delay = settings.NOTIFICATION_RETRY_SECONDS * 2 ** (notification.attempts - 1)
+                    notification.next_attempt_at = now + timedelta(seconds=delay)
+                failed += 1
+                logger.warning(f"Sending {notification} failed (attempt {notification.attempts}): {error}")
+        Notification.objects.bulk_update(
+            [n for n, _ in outcomes],
+            ['status', 'attempts', 'next_attempt_at', 'last_error', 'sent_at']
+        )
+    return sent, failed
@@ -0,0 +1,27 @@
+"""
+Pluggable SMS delivery.
+
+settings.SMS_BACKEND names a class with ``send_messages(messages)``, where
+each message is a (phone number, text) pair and the return value is the list
+of errors (None for each message that was sent). The console backend needs
+no external service.
+"""
+import sys
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class ConsoleSMSBackend:
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+
+    def send_messages(self, messages):
+        for number, text in messages:
+            self.stream.write(f'SMS to {number}: {text}\n')
+        self.stream.flush()
+        return [None] * len(messages)
+
+
+def get_sms_backend():
+    return import_string(settings.SMS_BACKEND)()
@@ -0,0 +1,113 @@
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from django.core import mail
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from events.models import Event
+from notifications.models import Notification
+from notifications.outbox import dispatch_due, enqueue_order_approved
+from orders.models import Order
+from orders.transitions import transition_order
+from users.models import User
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+class FlakySMSBackend:
+    """Fails every message while ``failing`` is set"""
+    failing = False
+
+    def send_messages(self, messages):
+        return ['gateway timeout' if self.failing else None for _ in messages]
+
+
+@override_settings(
+    MEDIA_ROOT=MEDIA_ROOT, SMS_BACKEND='notifications.tests.FlakySMSBackend',
+    NOTIFICATION_RETRY_SECONDS=60, NOTIFICATION_MAX_ATTEMPTS=3, NOTIFICATION_SEND_LEASE_SECONDS=300
+)
+class OutboxTests(TestCase):
+    """Notifications are queued once per order and channel, retried with backoff and never stranded mid-send"""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        user = User.objects.create_user(
+            username='buyer@example.com', email='buyer@example.com', password='secret', phone='0200000000'
+        )
+        event = Event.objects.create(
+            title='Concert', description='Live', date='2030-01-01T20:00:00Z', price=50,
+            image='events/concert.jpg', location='Accra', organizer=user
+        )
+        self.order = transition_order(
+            Order.objects.create(user=user, event=event, quantity=1, payment_method='mobile_money'), 'approved'
+        )
+        self.now = timezone.now()
+        patcher = mock.patch('notifications.outbox.timezone.now', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(setattr, FlakySMSBackend, 'failing', False)
+
+    def _sms(self):
+        return Notification.objects.get(order=self.order, channel='sms')
+
+    def test_approving_twice_queues_one_message_per_channel(self):
+        enqueue_order_approved(self.order)
+        enqueue_order_approved(self.order)
+
+        self.assertEqual(
+            sorted(Notification.objects.filter(order=self.order).values_list('channel', flat=True)), ['email', 'sms']
+        )
+
+    def test_failed_send_is_retried_with_backoff(self):
+        FlakySMSBackend.failing = True
+        with self.assertLogs('notifications.outbox', 'WARNING'):
+            self.assertEqual(dispatch_due(), (1, 1))
+        self.assertEqual(len(mail.outbox), 1)
+        sms = self._sms()
+        self.assertEqual((sms.status, sms.attempts, sms.last_error), ('pending', 1, 'gateway timeout'))
+        self.assertEqual(sms.next_attempt_at, self.now + timedelta(seconds=60))
+
+        # Not due yet
+        self.now += timedelta(seconds=59)
+        self.assertEqual(dispatch_due(), (0, 0))
+
+        self.now += timedelta(seconds=1)
+        attempted_at = self.now
+        with self.assertLogs('notifications.outbox', 'WARNING'):
+            self.assertEqual(dispatch_due(), (0, 1))
+        self.assertEqual(self._sms().next_attempt_at, attempted_at + timedelta(seconds=120))
+
+        self.now += timedelta(seconds=120)
+        FlakySMSBackend.failing = False
+        self.assertEqual(dispatch_due(), (1, 0))
+        sms = self._sms()
+        self.assertEqual((sms.status, sms.attempts), ('sent', 3))
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_gives_up_after_the_last_attempt(self):
+        FlakySMSBackend.failing = True
+        for _ in range(3):
+            with self.assertLogs('notifications.outbox', 'WARNING'):
+                dispatch_due()
+            self.now += timedelta(hours=1)
+
+        self.assertEqual(dispatch_due(), (0, 0))
+        self.assertEqual(self._sms().status, 'failed')
+
+    def test_expired_sending_lease_is_claimed_again(self):
+        # A dispatcher claimed the batch and died before recording anything
+        Notification.objects.update(status='sending', next_attempt_at=self.now + timedelta(seconds=300))
+        self.assertEqual(dispatch_due(), (0, 0))
+
+        self.now += timedelta(seconds=300)
+        self.assertEqual(dispatch_due(), (2, 0))
+        self.assertEqual(
+            set(Notification.objects.values_list('status', 'attempts')), {('sent', 1)}
+        )
@@ -1,22 +1,102 @@
+from django import forms
 from django.contrib import admin
-from .models import Order
+from eticketing_backend.paginators import ApproximateCountPaginator
+from events.models import SeatRow
+from .models import ArchivedOrder, Order
+from .archive import restore_event
+from .exports import ORDER_EXPORT_COLUMNS, stream_export
+from .transitions import TransitionError, transition_order
+
+class OrderAdminForm(forms.ModelForm):
+    def clean(self):
+        cleaned_data = super().clean()
+        event, quantity = cleaned_data.get('event'), cleaned_data.get('quantity')
+        if (
+            self.instance._state.adding and event is not None and quantity and event.reserved_seating
+            and not SeatRow.objects.filter(event=event, longest_run__gte=quantity).exists()
+        ):
+            raise forms.ValidationError(f'{event} has no {quantity} adjacent seats left')
+        return cleaned_data
+
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
+    form = OrderAdminForm
     list_display = ('order_id', 'user', 'event', 'quantity', 'total_amount', 'status', 'created_at')
     list_filter = ('status', 'created_at', 'event')
+    list_select_related = ('user', 'event')
     search_fields = ('order_id', 'user__username', 'event__title')
-    readonly_fields = ('order_id', 'created_at', 'updated_at')
-    actions = ['approve_orders', 'reject_orders']
+    # Status changes go through the approve/reject actions, which use transition_order
+    readonly_fields = ('order_id', 'status', 'seats', 'created_at', 'updated_at')
+    raw_id_fields = ('user',)
+    autocomplete_fields = ('event',)
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
+    actions = ['approve_orders', 'reject_orders', 'export_csv']
+
+    def get_readonly_fields(self, request, obj=None):
+        readonly_fields = super().get_readonly_fields(request, obj)
+        if obj is not None and obj.seats:
+            # The held seats were picked for this event and party size
+            readonly_fields += ('event', 'quantity')
+        return readonly_fields
+
+    def _transition(self, queryset, new_status):
+        changed = 0
+        for order in queryset.filter(status='pending'):
+            try:
+                transition_order(order, new_status)
+                changed += 1
+            except TransitionError:
+                pass
+        return changed
 
     def approve_orders(self, request, queryset):
-        queryset.update(status='approved')
-        self.message_user(request, f"{queryset.count()} orders were successfully approved.")
+        changed = self._transition(queryset, 'approved')
+        self.message_user(request, f"{changed} orders were successfully approved.")
     approve_orders.short_description = "Approve selected orders"
 
     def reject_orders(self, request, queryset):
-        queryset.update(status='rejected')
-        self.message_user(request, f"{queryset.count()} orders were successfully rejected.")
+        changed = self._transition(queryset, 'rejected')
+        self.message_user(request, f"{changed} orders were successfully rejected.")
     reject_orders.short_description = "Reject selected orders"
 
-    
\ No newline at end of file
+    def export_csv(self, request, queryset):
+        return stream_export(queryset, ORDER_EXPORT_COLUMNS, 'csv', 'orders')
+    export_csv.short_description = "Export selected orders as CSV"
+
+
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(admin.ModelAdmin):
+    list_display = ('order_id', 'user', 'event', 'quantity', 'total_amount', 'status', 'created_at', 'archived_at')
+    list_filter = ('status', 'created_at')
+    list_select_related = ('user', 'event')
+    search_fields = ('order_id', 'user__username', 'event__title')
+    raw_id_fields = ('user', 'event')
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
+    actions = ['restore_events', 'export_csv']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def has_restore_permission(self, request):
+        # Restoring writes whole events back into the live tables: needs change rights on live orders
+        return request.user.has_perm('orders.change_order')
+
+    def restore_events(self, request, queryset):
+        event_ids = set(queryset.values_list('event_id', flat=True))
+        restored = sum(restore_event(event_id)['orders'] for event_id in event_ids)
+        self.message_user(request, f"{restored} orders of {len(event_ids)} events were restored.")
+    restore_events.short_description = "Restore all orders of the selected orders' events"
+    restore_events.allowed_permissions = ('restore',)
+
+    def export_csv(self, request, queryset):
+        return stream_export(queryset, ORDER_EXPORT_COLUMNS, 'csv', 'archived-orders')
+    export_csv.short_description = "Export selected orders as CSV"
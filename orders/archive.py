@@ -0,0 +1,218 @@
+"""
+Hot/cold archival of orders for past events.
+
+Orders of events that ended more than ARCHIVE_AFTER_DAYS ago are moved, with
+their tickets and payment confirmations, into ArchivedOrder, ArchivedTicket
+and ArchivedPaymentConfirmation, so the live tables and their indexes only
+grow with current sales. Rows keep their ids and timestamps.
+
+Each batch of ARCHIVE_BATCH_SIZE orders is copied, read back and compared
+with the source, and deleted from the source in one transaction: a batch
+moves intact or not at all. ``restore_event`` moves an event back the same
+way. Orders with notifications still waiting in the outbox are left in place
+until they are sent; sent notifications are dropped with their order.
+
+Sales stats are unaffected by a move, and ``compute_event_stats`` and
+``rebuild_check_in_minutes`` count the archive too. Reads that must see both
+tiers go through ``find_order``, ``user_orders``, ``find_ticket`` and
+``user_tickets``; conditional GETs read their validators with ``order_state``
+and ``ticket_state``.
+"""
+import heapq
+import json
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+
+from events.models import Event
+from notifications.models import Notification
+from orders.models import ArchivedOrder, Order
+from orders.signals import moving_orders
+from payment.models import ArchivedPaymentConfirmation, PaymentConfirmation
+from tickets.models import ArchivedTicket, Ticket
+from users.serializers import UserSerializer
+
+HOT = (Order, Ticket, PaymentConfirmation)
+ARCHIVE = (ArchivedOrder, ArchivedTicket, ArchivedPaymentConfirmation)
+
+
+class ArchiveError(Exception):
+    pass
+
+
+def _fields(model):
+    return [field.attname for field in model._meta.concrete_fields]
+
+
+def _insert(model, fields, rows):
+    """Insert rows as stored, like loaddata: auto_now timestamps are not touched"""
+    objs = [model(**dict(zip(fields, row))) for row in rows]
+    db = router.db_for_write(model)
+    concrete_fields = model._meta.concrete_fields
+    size = connections[db].ops.bulk_batch_size(concrete_fields, objs) or len(objs)
+    for start in range(0, len(objs), size):
+        model._base_manager._insert(objs[start:start + size], fields=concrete_fields, raw=True, using=db)
+
+
+def _comparable(row):
+    """The row with JSON values (Order.seats) made hashable"""
+    return tuple(json.dumps(value, sort_keys=True) if isinstance(value, (list, dict)) else value for value in row)
+
+
+def _move_batch(source, target, event_id, batch_size):
+    """Move up to ``batch_size`` of the event's orders from one tier to the other"""
+    source_order, source_ticket, source_confirmation = source
+    orders = source_order.objects.filter(event_id=event_id)
+    if source_order is Order:
+        orders = orders.exclude(notifications__status__in=Notification.UNSENT_STATUSES)
+
+    moved = {}
+    with transaction.atomic():
+        pks = list(orders.select_for_update().order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return None
+        for hot, source_model, target_model, lookup in zip(
+            HOT, source, target, ('pk__in', 'order_id__in', 'order_id__in')
+        ):
+            fields = _fields(hot)
+            rows = list(source_model.objects.filter(**{lookup: pks}).values_list(*fields))
+            _insert(target_model, fields, rows)
+            copied = set(map(_comparable, target_model.objects.filter(
+                pk__in=[row[0] for row in rows]
+            ).values_list(*fields)))
+            if copied != set(map(_comparable, rows)):
+                raise ArchiveError(
+                    f'{target_model.__name__} copy of event {event_id} does not match its source; rolled back'
+                )
+            moved[hot] = len(rows)
+
+        with moving_orders():
+            _, deleted = source_order.objects.filter(pk__in=pks).delete()
+        for hot, source_model in zip(HOT, source):
+            if deleted.get(source_model._meta.label, 0) != moved[hot]:
+                raise ArchiveError(
+                    f'Deleting {source_model.__name__} rows of event {event_id} did not match the copy; rolled back'
+                )
+    return {hot._meta.verbose_name_plural: count for hot, count in moved.items()}
+
+
+def _move_event(source, target, event_id, batch_size=None, max_batches=None, pause=0):
+    batch_size = batch_size or settings.ARCHIVE_BATCH_SIZE
+    totals = {hot._meta.verbose_name_plural: 0 for hot in HOT}
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        moved = _move_batch(source, target, event_id, batch_size)
+        if moved is None:
+            break
+        for name, count in moved.items():
+            totals[name] += count
+        batches += 1
+        if pause:
+            time.sleep(pause)
+    return totals
+
+
+def archive_event(event_id, batch_size=None, max_batches=None, pause=0):
+    """Move the event's orders, tickets and payment confirmations to the archive, returning row counts"""
+    return _move_event(HOT, ARCHIVE, event_id, batch_size, max_batches, pause)
+
+
+def restore_event(event_id, batch_size=None, max_batches=None, pause=0):
+    """Move the event's archived orders back to the live tables, returning row counts"""
+    return _move_event(ARCHIVE, HOT, event_id, batch_size, max_batches, pause)
+
+
+def archivable_event_ids(now=None):
+    """Events that ended more than ARCHIVE_AFTER_DAYS ago and still have live orders"""
+    cutoff = (now or timezone.now()) - timedelta(days=settings.ARCHIVE_AFTER_DAYS)
+    return list(
+        Event.objects.filter(date__lt=cutoff, orders__isnull=False)
+        .order_by('date').values_list('pk', flat=True).distinct()
+    )
+
+
+def find_order(**lookup):
+    """The live or archived order matching ``lookup``; raises Order.DoesNotExist"""
+    order = Order.objects.filter(**lookup).first()
+    if order is None:
+        order = ArchivedOrder.objects.filter(**lookup).first()
+    if order is None:
+        raise Order.DoesNotExist(f'No live or archived order matches {lookup}')
+    return order
+
+
+def _first(queryset):
+    return next(iter(queryset[:1]), None)
+
+
+def order_state(**lookup):
+    """
+    The columns that change how the live or archived order matching
+    ``lookup`` renders, read in one indexed query; None if there is none.
+
+    Status and review changes bump ``updated_at``, but QR codes are filled in
+    and scans recorded by bulk updates, so the tickets are counted too.
+    """
+    user_fields = ['user__' + name for name in UserSerializer.Meta.fields]
+    has_qr_code = Q(tickets__qr_code__isnull=False) & ~Q(tickets__qr_code='')
+    for model in (Order, ArchivedOrder):
+        state = _first(
+            model.objects.filter(**lookup)
+            .values('pk', 'updated_at', 'event__updated_at', *user_fields)
+            .annotate(
+                tickets_count=Count('tickets'),
+                tickets_created_at=Max('tickets__created_at'),
+                tickets_with_qr_code=Count('tickets', filter=has_qr_code),
+                tickets_used=Count('tickets', filter=Q(tickets__is_used=True)),
+                tickets_used_at=Max('tickets__used_at'),
+            )
+            .order_by()
+        )
+        if state is not None:
+            return state
+    return None
+
+
+def user_orders(user, prepare=None):
+    """The user's live and archived orders, newest first; ``prepare`` adjusts both querysets"""
+    prepare = prepare or (lambda queryset: queryset)
+    return list(heapq.merge(
+        prepare(Order.objects.filter(user=user)), prepare(ArchivedOrder.objects.filter(user=user)),
+        key=lambda order: order.created_at, reverse=True
+    ))
+
+
+def find_ticket(**lookup):
+    """The live or archived ticket matching ``lookup``; raises Ticket.DoesNotExist"""
+    ticket = Ticket.objects.filter(**lookup).first()
+    if ticket is None:
+        ticket = ArchivedTicket.objects.filter(**lookup).first()
+    if ticket is None:
+        raise Ticket.DoesNotExist(f'No live or archived ticket matches {lookup}')
+    return ticket
+
+
+def ticket_state(**lookup):
+    """The columns that change how the live or archived ticket matching ``lookup`` renders; None if there is none"""
+    for model in (Ticket, ArchivedTicket):
+        state = _first(
+            model.objects.filter(**lookup).values(
+                'pk', 'created_at', 'is_used', 'used_at', 'qr_code', 'order__updated_at', 'order__event__updated_at'
+            ).order_by()
+        )
+        if state is not None:
+            return state
+    return None
+
+
+def user_tickets(user, prepare=None):
+    """The user's live tickets followed by their archived ones; ``prepare`` adjusts both querysets"""
+    prepare = prepare or (lambda queryset: queryset)
+    return (
+        list(prepare(Ticket.objects.filter(order__user=user)))
+        + list(prepare(ArchivedTicket.objects.filter(order__user=user)))
+    )
@@ -0,0 +1,55 @@
+"""Expire pending orders that never received a payment confirmation"""
+import logging
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from events.seating import release_seats
+from orders.models import Order
+from orders.stats import record_transition
+
+logger = logging.getLogger(__name__)
+
+
+def expire_pending_orders(batch_size=500, ttl=None):
+    """
+    Mark stale unpaid pending orders as expired, one bounded batch at a time.
+
+    Each batch is a short UPDATE on primary keys picked through the
+    (status, created_at) index, so no lock is held across the whole sweep.
+    Returns the number of orders expired.
+    """
+    cutoff = timezone.now() - (ttl or settings.PENDING_ORDER_TTL)
+    stale = Order.objects.filter(
+        status='pending',
+        created_at__lt=cutoff,
+        payment_confirmation__isnull=True,
+    )
+    expired = 0
+    started = time.monotonic()
+    while True:
+        ids = list(stale.order_by('created_at').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            break
+        with transaction.atomic():
+            # Re-check the conditions so orders paid or reviewed meanwhile are kept
+            batch = list(
+                stale.filter(id__in=ids).select_for_update(of=('self',)).values_list('id', 'event_id', 'seats')
+            )
+            Order.objects.filter(id__in=[order_id for order_id, _, _ in batch]).update(
+                status='expired', seats=[], updated_at=timezone.now()
+            )
+            for event_id, count in Counter(event_id for _, event_id, _ in batch).items():
+                record_transition(event_id, 'pending', 'expired', count=count)
+            release_seats([hold for _, _, seats in batch for hold in seats])
+        expired += len(batch)
+        if len(ids) < batch_size:
+            break
+    logger.info(
+        f"Expired {expired} pending orders older than {cutoff.isoformat()} "
+        f"in {time.monotonic() - started:.2f}s"
+    )
+    return expired
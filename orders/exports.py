@@ -0,0 +1,133 @@
+"""
+Streaming CSV / NDJSON exports.
+
+Rows are read with ``values_list`` (joins instead of related model loads)
+through ``iterator()``, which uses a server-side cursor where the database
+supports one, and are encoded one at a time into a StreamingHttpResponse. The
+first bytes go out as soon as the first chunk is fetched and memory use does
+not grow with the number of rows. Several querysets (live and archived
+orders) are streamed as one, merged by created_at.
+"""
+import csv
+import heapq
+import json
+from datetime import datetime, time
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+CHUNK_SIZE = 2000
+
+ORDER_EXPORT_COLUMNS = [
+    ('order_id', 'order_id'),
+    ('status', 'status'),
+    ('event_id', 'event_id'),
+    ('event_title', 'event__title'),
+    ('user_email', 'user__email'),
+    ('first_name', 'user__first_name'),
+    ('last_name', 'user__last_name'),
+    ('quantity', 'quantity'),
+    ('total_amount', 'total_amount'),
+    ('payment_method', 'payment_method'),
+    ('payment_reference', 'payment_reference'),
+    ('transaction_id', 'payment_confirmation__transaction_id'),
+    ('payment_confirmed_at', 'payment_confirmed_at'),
+    ('created_at', 'created_at'),
+]
+
+TICKET_EXPORT_COLUMNS = [
+    ('ticket_id', 'ticket_id'),
+    ('order_id', 'order__order_id'),
+    ('order_status', 'order__status'),
+    ('event_id', 'order__event_id'),
+    ('event_title', 'order__event__title'),
+    ('attendee_email', 'order__user__email'),
+    ('first_name', 'order__user__first_name'),
+    ('last_name', 'order__user__last_name'),
+    ('phone', 'order__user__phone'),
+    ('section', 'seat_row__section'),
+    ('row', 'seat_row__row'),
+    ('seat', 'seat_number'),
+    ('is_used', 'is_used'),
+    ('used_at', 'used_at'),
+    ('gate', 'gate'),
+    ('created_at', 'created_at'),
+]
+
+
+class ExportFilterError(ValueError):
+    pass
+
+
+def _parse_bound(value, end_of_day=False):
+    try:
+        moment = parse_datetime(value)
+        day = parse_date(value) if moment is None else None
+    except ValueError:
+        raise ExportFilterError(f'Invalid date: {value}')
+    if moment is None:
+        if day is None:
+            raise ExportFilterError(f'Invalid date: {value}')
+        moment = datetime.combine(day, time.max if end_of_day else time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def filter_export_queryset(queryset, params, event_field, status_field):
+    """Apply the event, status and created_from/created_to query parameters"""
+    try:
+        if params.get('event'):
+            queryset = queryset.filter(**{event_field: int(params['event'])})
+    except ValueError:
+        raise ExportFilterError('event must be an event id')
+    if params.get('status'):
+        queryset = queryset.filter(**{status_field: params['status']})
+    if params.get('created_from'):
+        queryset = queryset.filter(created_at__gte=_parse_bound(params['created_from']))
+    if params.get('created_to'):
+        queryset = queryset.filter(created_at__lte=_parse_bound(params['created_to'], end_of_day=True))
+    return queryset
+
+
+class _Echo:
+    """File-like object whose write() hands the encoded line back to csv.writer"""
+
+    def write(self, value):
+        return value
+
+
+def _csv_lines(header, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def _ndjson_lines(header, rows):
+    for row in rows:
+        yield json.dumps(dict(zip(header, row)), cls=DjangoJSONEncoder) + '\n'
+
+
+def stream_export(queryset, columns, export_format, filename):
+    """Stream ``queryset`` (or a list of querysets) as CSV or NDJSON with the given (header, field) columns"""
+    header = [name for name, _ in columns]
+    querysets = queryset if isinstance(queryset, (list, tuple)) else [queryset]
+    sources = [
+        qs.order_by('created_at').values_list(
+            *[field for _, field in columns], 'created_at'
+        ).iterator(chunk_size=CHUNK_SIZE)
+        for qs in querysets
+    ]
+    rows = (row[:-1] for row in heapq.merge(*sources, key=lambda row: row[-1]))
+    lines = _csv_lines(header, rows) if export_format == 'csv' else _ndjson_lines(header, rows)
+
+    response = StreamingHttpResponse(lines, content_type=EXPORT_FORMATS[export_format])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{export_format}"'
+    return response
@@ -0,0 +1,161 @@
+"""
+Idempotency-Key support for retried POST requests.
+
+The first request with a given key runs the view and stores its response.
+Retries with the same key get the stored response back without running the
+view again; a retry that arrives while the first request is still running
+gets 409. A claim with no response after IDEMPOTENCY_LEASE (its process
+died) is taken over by the next retry. Keys expire after IDEMPOTENCY_KEY_TTL
+and are removed by the ``purge_idempotency_keys`` command.
+
+Server errors are never stored, and neither are responses the view marks
+with ``do_not_store``: client errors it returns for unexpected failures,
+such as a locked database, that a retry may get past.
+"""
+import hashlib
+import json
+import logging
+from functools import wraps
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from orders.models import IdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'Idempotency-Key'
+
+
+def _file_digest(upload):
+    digest = hashlib.sha256()
+    for chunk in upload.chunks():
+        digest.update(chunk)
+    upload.seek(0)
+    return digest.hexdigest()
+
+
+def _canonical(value):
+    """JSON-serialisable form of parsed request data; uploads by name, size and content hash"""
+    if isinstance(value, UploadedFile):
+        return {'file': value.name, 'size': value.size, 'sha256': _file_digest(value)}
+    if hasattr(value, 'getlist'):  # QueryDict of a form or multipart body
+        return {key: [_canonical(item) for item in value.getlist(key)] for key in value}
+    if isinstance(value, dict):
+        return {str(key): _canonical(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(item) for item in value]
+    return value
+
+
+def _fingerprint(request):
+    # The parsed data, not request.body: multipart bodies over DATA_UPLOAD_MAX_MEMORY_SIZE
+    # are streamed to the parser and cannot be read again
+    digest = hashlib.sha256()
+    digest.update(request.method.encode())
+    digest.update(request.get_full_path().encode())
+    digest.update(json.dumps(_canonical(request.data), sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+def do_not_store(response):
+    """Keep ``response`` from being replayed, so a retry with the same key runs the view again"""
+    response.idempotent_store = False
+    return response
+
+
+def _claim(request, scope, key, fingerprint):
+    """Insert the key, or return the existing record if it is already taken"""
+    lookup = {'user': request.user, 'scope': scope, 'key': key}
+    for _ in range(2):
+        try:
+            with transaction.atomic():
+                return IdempotencyKey.objects.create(
+                    fingerprint=fingerprint,
+                    expires_at=timezone.now() + settings.IDEMPOTENCY_KEY_TTL,
+                    **lookup
+                ), True
+        except IntegrityError:
+            record = IdempotencyKey.objects.filter(**lookup).first()
+            if record is None:
+                continue
+            now = timezone.now()
+            if record.expires_at <= now:
+                record.delete()
+                continue
+            if record.status_code is None and record.created_at <= now - settings.IDEMPOTENCY_LEASE:
+                # Abandoned claim; only one retry gets to delete it
+                IdempotencyKey.objects.filter(pk=record.pk, status_code__isnull=True).delete()
+                continue
+            return record, False
+    return None, False
+
+
+def idempotent(scope):
+    """Replay stored responses for requests that repeat an Idempotency-Key"""
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            key = request.headers.get(HEADER)
+            if not key or not request.user.is_authenticated:
+                return view_func(request, *args, **kwargs)
+
+            if len(key) > 255:
+                return Response(
+                    {'error': f'{HEADER} must be at most 255 characters'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            fingerprint = _fingerprint(request)
+            record, created = _claim(request, scope, key, fingerprint)
+
+            if not created:
+                if record is not None and record.fingerprint != fingerprint:
+                    return Response(
+                        {'error': f'{HEADER} was already used for a different request'},
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY
+                    )
+                if record is None or record.status_code is None:
+                    return Response(
+                        {'error': f'A request with this {HEADER} is still in progress'},
+                        status=status.HTTP_409_CONFLICT
+                    )
+                response = Response(record.response_body, status=record.status_code)
+                response['Idempotent-Replayed'] = 'true'
+                return response
+
+            try:
+                response = view_func(request, *args, **kwargs)
+            except Exception:
+                record.delete()
+                raise
+
+            if response.status_code >= 500 or not getattr(response, 'idempotent_store', True):
+                # Let the client retry server errors
+                record.delete()
+            elif IdempotencyKey.objects.filter(pk=record.pk).update(
+                status_code=response.status_code, response_body=response.data
+            ):
+                logger.info(f"Stored response for {scope} {HEADER} {key}")
+            else:
+                logger.warning(f"{scope} {HEADER} {key} outlived its lease; response not stored")
+            return response
+        return wrapper
+    return decorator
+
+
+def purge_expired_keys(batch_size=1000):
+    """Delete expired keys in bounded batches, returning how many were removed"""
+    removed = 0
+    while True:
+        ids = list(
+            IdempotencyKey.objects.filter(expires_at__lte=timezone.now())
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return removed
+        removed += IdempotencyKey.objects.filter(id__in=ids).delete()[0]
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from orders.archive import ArchiveError, archivable_event_ids, archive_event, restore_event
+
+
+class Command(BaseCommand):
+    help = (
+        'Move orders, tickets and payment confirmations of events that ended more than '
+        'ARCHIVE_AFTER_DAYS ago to the archive tables, or restore an event with --restore'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--event', type=int, action='append', help='Only this event (repeatable)')
+        parser.add_argument('--restore', action='store_true', help='Move the --event orders back to the live tables')
+        parser.add_argument('--batch-size', type=int, help='Orders per transaction (default ARCHIVE_BATCH_SIZE)')
+        parser.add_argument('--max-batches', type=int, help='Stop each event after this many batches')
+        parser.add_argument('--pause', type=float, default=0, help='Seconds to sleep between batches')
+        parser.add_argument('--dry-run', action='store_true', help='Only list the events that would be archived')
+
+    def handle(self, *args, **options):
+        if options['restore'] and not options['event']:
+            raise CommandError('--restore needs at least one --event')
+        event_ids = options['event'] or archivable_event_ids()
+        if options['dry_run']:
+            self.stdout.write(f"Would {'restore' if options['restore'] else 'archive'} events: {event_ids}")
+            return
+
+        move = restore_event if options['restore'] else archive_event
+        for event_id in event_ids:
+            try:
+                moved = move(
+                    event_id, batch_size=options['batch_size'],
+                    max_batches=options['max_batches'], pause=options['pause']
+                )
+            except ArchiveError as e:
+                raise CommandError(str(e))
+            self.stdout.write(
+                f"Event {event_id}: {'restored' if options['restore'] else 'archived'} "
+                + ', '.join(f'{count} {name}' for name, count in moved.items())
+            )
+        self.stdout.write(self.style.SUCCESS(f'Done with {len(event_ids)} events'))
@@ -0,0 +1,107 @@
+import statistics
+import time
+from io import StringIO
+
+from django.contrib import admin
+from django.core.management import call_command
+from django.core.paginator import Paginator
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from orders.models import Order
+from tickets.models import Ticket
+from users.models import User
+
+PAGES = [
+    (Order, '/admin/orders/order/'),
+    (Order, '/admin/orders/order/?status__exact=approved'),
+    (Order, '/admin/orders/order/?p={deep_page}'),
+    (Ticket, '/admin/tickets/ticket/'),
+    (Ticket, '/admin/tickets/ticket/?is_used__exact=1'),
+]
+
+# Django's defaults, i.e. how the changelists were configured before
+BASELINE = {'list_select_related': False, 'paginator': Paginator, 'show_full_result_count': True}
+
+
+class Command(BaseCommand):
+    help = (
+        'Time the order and ticket admin changelists against ROWS orders and tickets, seeded '
+        'with seed_scale into a throwaway test database that is dropped afterwards'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, required=True, help='Orders and tickets to seed, e.g. 1000000')
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument(
+            '--compare', action='store_true',
+            help='Also time the pages with the default admin options (exact counts, no select_related)'
+        )
+        parser.add_argument(
+            '--noinput', '--no-input', action='store_false', dest='interactive',
+            help='Replace a leftover test database without asking'
+        )
+
+    def handle(self, *args, **options):
+        if options['rows'] < 1:
+            raise CommandError('--rows must be positive')
+        # Never seed the configured database: work in the test database, as the test runner does
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=not options['interactive'], serialize=False)
+        try:
+            self.stdout.write(f"Seeding {options['rows']:,} orders and tickets into {connection.settings_dict['NAME']}")
+            started = time.perf_counter()
+            call_command(
+                'seed_scale', orders=options['rows'], tickets=options['rows'], batch_size=options['batch_size'],
+                stdout=StringIO(),
+            )
+            self.stdout.write(f'Seeded in {time.perf_counter() - started:.0f}s')
+            self.benchmark(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def benchmark(self, options):
+        client = Client()
+        client.force_login(self.admin_user())
+        configs = [('optimized', {})]
+        if options['compare']:
+            configs.append(('baseline', BASELINE))
+
+        self.stdout.write(f"{'config':<10} {'page':<48} {'median ms':>10} {'queries':>8}")
+        for label, overrides in configs:
+            for model, url in PAGES:
+                model_admin = admin.site._registry[model]
+                # Page 200, or the last page of a smaller data set
+                url = url.format(deep_page=max(1, min(200, Order.objects.count() // model_admin.list_per_page)))
+                saved = {name: getattr(model_admin, name) for name in overrides}
+                for name, value in overrides.items():
+                    setattr(model_admin, name, value)
+                try:
+                    timings, queries = self.render(client, url, options['repeat'])
+                finally:
+                    for name, value in saved.items():
+                        setattr(model_admin, name, value)
+                self.stdout.write(f'{label:<10} {url:<48} {statistics.median(timings):>10.1f} {queries:>8}')
+
+    def render(self, client, url, repeat):
+        client.get(url)  # warm up templates and caches
+        timings = []
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = client.get(url)
+                timings.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                raise RuntimeError(f'{url} returned {response.status_code}')
+        return timings, len(queries)
+
+    def admin_user(self):
+        user, _ = User.objects.get_or_create(
+            username='benchmark-admin',
+            defaults={'email': 'benchmark-admin@example.com', 'phone': 'benchmark-admin',
+                      'is_staff': True, 'is_superuser': True, 'is_admin': True},
+        )
+        return user
@@ -0,0 +1,128 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter: load the entry point, serve one request, report timings
+FIRST_REQUEST = r'''
+import io, json, os, sys, time
+started = time.perf_counter()
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'eticketing_backend.settings')
+entry_point, path = sys.argv[1], sys.argv[2]
+if entry_point == 'wsgi':
+    from eticketing_backend.wsgi import application
+    loaded = time.perf_counter()
+    statuses = []
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': '', 'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '8000', 'SERVER_PROTOCOL': 'HTTP/1.1', 'wsgi.url_scheme': 'http',
+        'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr,
+    }
+    b''.join(application(environ, lambda status, headers, exc_info=None: statuses.append(status)))
+    status = int(statuses[0].split()[0])
+else:
+    import asyncio
+    from eticketing_backend.asgi import application
+    loaded = time.perf_counter()
+    scope = {
+        'type': 'http', 'method': 'GET', 'path': path, 'raw_path': path.encode(), 'query_string': b'',
+        'root_path': '', 'scheme': 'http', 'http_version': '1.1', 'headers': [(b'host', b'localhost')],
+        'server': ('localhost', 8000), 'client': ('127.0.0.1', 50000),
+    }
+    messages, received = [], []
+
+    async def receive():
+        if not received:
+            received.append(True)
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # No disconnect: wait until Django cancels the listener after responding
+        await asyncio.get_running_loop().create_future()
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(application(scope, receive, send))
+    status = messages[0]['status']
+done = time.perf_counter()
+print(json.dumps({'load': loaded - started, 'first_request': done - loaded, 'status': status}))
+'''
+
+# The entry point plus the URLconf, i.e. everything a worker loads to serve requests
+IMPORT_ENTRY_POINT = 'import eticketing_backend.{}; from django.urls import get_resolver; get_resolver().url_patterns'
+
+# Heavy optional libraries that should stay out of startup
+WATCHED_MODULES = ['qrcode', 'PIL', 'events.importer']
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure cold start: python -X importtime totals and time to first request '
+        'for the WSGI and ASGI entry points, each in a fresh interpreter'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--path', default='/api/events/', help='URL of the first request')
+        parser.add_argument('--top', type=int, default=10, help='Slowest top-level imports to list')
+
+    def handle(self, *args, **options):
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'eticketing_backend.settings')}
+        for entry_point in ('wsgi', 'asgi'):
+            self.stdout.write(self.style.MIGRATE_HEADING(f'{entry_point.upper()} entry point'))
+
+            totals, modules = [], None
+            for _ in range(options['repeat']):
+                total, modules = self.import_times(entry_point, env)
+                totals.append(total)
+            self.stdout.write(f'  -X importtime total:   {statistics.median(totals):8.1f} ms ({len(modules)} modules)')
+            loaded = [name for name in WATCHED_MODULES if name in modules]
+            self.stdout.write(f"  heavy modules loaded:  {', '.join(loaded) if loaded else 'none'}")
+
+            runs = [self.first_request(entry_point, options['path'], env) for _ in range(options['repeat'])]
+            for label, key in (('process start to ready', 'process'), ('entry point load', 'load'),
+                               ('first request', 'first_request')):
+                self.stdout.write(f'  {label + ":":<22} {statistics.median(run[key] for run in runs) * 1000:8.1f} ms')
+            self.stdout.write(f"  first response status: {runs[0]['status']}")
+
+            slowest = sorted(
+                ((cumulative, name) for name, (_, cumulative, depth) in modules.items() if depth == 0),
+                reverse=True
+            )[:options['top']]
+            self.stdout.write('  slowest top-level imports (cumulative ms):')
+            for cumulative, name in slowest:
+                self.stdout.write(f'    {cumulative / 1000:8.1f}  {name}')
+
+    def import_times(self, entry_point, env):
+        """Sum of self times and {module: (self us, cumulative us, depth)} from -X importtime"""
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', IMPORT_ENTRY_POINT.format(entry_point)],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        if result.returncode:
+            raise CommandError(result.stderr[-2000:])
+        modules = {}
+        for line in result.stderr.splitlines():
+            if not line.startswith('import time:') or 'self [us]' in line:
+                continue
+            self_us, cumulative_us, name = line[len('import time:'):].split('|')
+            depth = (len(name) - len(name.lstrip()) - 1) // 2
+            modules[name.strip()] = (int(self_us), int(cumulative_us), depth)
+        return sum(self_us for self_us, _, _ in modules.values()) / 1000, modules
+
+    def first_request(self, entry_point, path, env):
+        started = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, '-c', FIRST_REQUEST, entry_point, path],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        elapsed = time.perf_counter() - started
+        if result.returncode:
+            raise CommandError(result.stderr[-2000:])
+        timings = json.loads(result.stdout.strip().splitlines()[-1])
+        timings['process'] = elapsed
+        return timings
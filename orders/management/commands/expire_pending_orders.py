@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from orders.expiry import expire_pending_orders
+
+
+class Command(BaseCommand):
+    help = 'Expire pending orders that have no payment confirmation after PENDING_ORDER_TTL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--interval', type=int, default=0,
+            help='Keep running and sweep every INTERVAL seconds'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            expired = expire_pending_orders(batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Expired {expired} pending orders'))
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from orders.stats import rebuild_event_stats, verify_event_stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute per-event sales stats from orders and tickets and verify them'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Only compare the stored counters with the orders and tickets tables'
+        )
+
+    def handle(self, *args, **options):
+        if not options['check']:
+            rebuilt = rebuild_event_stats()
+            self.stdout.write(f'Rebuilt sales stats for {rebuilt} events')
+
+        mismatches = verify_event_stats()
+        for event_id, diff in mismatches.items():
+            for field, (stored, actual) in diff.items():
+                self.stderr.write(f'Event {event_id}: {field} is {stored}, expected {actual}')
+        if mismatches:
+            raise CommandError(f'Sales stats are off for {len(mismatches)} events')
+        self.stdout.write(self.style.SUCCESS('Sales stats match the orders and tickets tables'))
@@ -0,0 +1,195 @@
+import random
+import time
+import uuid
+from bisect import bisect
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.dateparse import parse_date
+
+from events.models import Event
+from orders.models import Order
+from orders.stats import rebuild_event_stats
+from payment.models import PaymentConfirmation
+from tickets.checkins import rebuild_check_in_minutes
+from tickets.models import Ticket
+from users.models import User
+
+STATUS_WEIGHTS = {'approved': 70, 'pending': 12, 'rejected': 8, 'expired': 10}
+PAYMENT_METHOD_WEIGHTS = {'mobile_money': 60, 'bank_transfer': 30, 'credit_card': 10}
+PRICES = [Decimal(p) for p in ('20.00', '35.00', '50.00', '75.00', '100.00', '150.00', '250.00')]
+CITIES = ['Accra', 'Kumasi', 'Koforidua', 'Takoradi', 'Tamale', 'Cape Coast', 'Ho', 'Sunyani']
+EVENT_KINDS = ['Concert', 'Festival', 'Conference', 'Match', 'Comedy Night', 'Exhibition', 'Gala', 'Workshop']
+FIRST_NAMES = ['Ama', 'Kofi', 'Akosua', 'Kwame', 'Yaa', 'Kwesi', 'Esi', 'Yaw', 'Abena', 'Kojo', 'Adwoa', 'Fiifi']
+LAST_NAMES = ['Mensah', 'Owusu', 'Boateng', 'Asante', 'Addo', 'Osei', 'Appiah', 'Amoah', 'Darko', 'Badu']
+GATES = [f'gate-{n}' for n in range(1, 9)]
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """Let bulk_create keep the generated created_at/updated_at values instead of now()"""
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate users, events, orders, tickets and payment confirmations at production scale '
+        'with chunked bulk_create (no save() and no QR rendering), deterministic from --seed'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=100_000)
+        parser.add_argument('--tickets', type=int, help='Approximate ticket total (default 2.5 per order)')
+        parser.add_argument('--users', type=int, help='Default: one per 5 orders')
+        parser.add_argument('--events', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--anchor', help='Date the data is generated around, YYYY-MM-DD (default today)')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        seed = options['seed']
+        if not 0 <= seed <= 9999:
+            raise CommandError('--seed must be between 0 and 9999')
+        self.tag = f'S{seed}'
+        if Order.objects.filter(order_id__startswith=f'OR{self.tag}-').exists():
+            raise CommandError(f'Data for --seed {seed} already exists; use another seed')
+
+        if options['anchor']:
+            anchor = parse_date(options['anchor'])
+            if anchor is None:
+                raise CommandError('--anchor must be YYYY-MM-DD')
+        else:
+            anchor = datetime.now(dt_timezone.utc).date()
+        self.anchor = datetime.combine(anchor, datetime.min.time(), tzinfo=dt_timezone.utc)
+
+        self.rng = random.Random(seed)
+        self.batch_size = options['batch_size']
+        orders = options['orders']
+        tickets = options['tickets'] if options['tickets'] is not None else orders * 5 // 2
+        users = options['users'] or max(1, orders // 5)
+
+        with explicit_timestamps(User, Event, Order, Ticket, PaymentConfirmation):
+            user_ids = self.timed('users', lambda: self.seed_users(users))
+            events = self.timed('events', lambda: self.seed_events(options['events'], user_ids))
+            self.timed('orders, tickets and payment confirmations',
+                       lambda: self.seed_orders(orders, tickets, user_ids, events))
+        self.timed('sales stats', rebuild_event_stats)
+        self.timed('check-in minutes', rebuild_check_in_minutes)
+        self.stdout.write(self.style.SUCCESS(f'Seeded data set {self.tag}'))
+
+    def timed(self, label, step):
+        started = time.perf_counter()
+        result = step()
+        self.stdout.write(f'{label}: {time.perf_counter() - started:.1f}s')
+        return result
+
+    def uuid(self):
+        return uuid.UUID(int=self.rng.getrandbits(128), version=4)
+
+    def seed_users(self, count):
+        password = make_password('seed-password')
+        ids = []
+        for start in range(0, count, self.batch_size):
+            batch = []
+            for n in range(start, min(start + self.batch_size, count)):
+                first, last = self.rng.choice(FIRST_NAMES), self.rng.choice(LAST_NAMES)
+                batch.append(User(
+                    username=f'{self.tag.lower()}-user{n}', email=f'{self.tag.lower()}-user{n}@example.com',
+                    first_name=first, last_name=last, phone=f'+{self.tag}{n:010d}', password=password,
+                    is_admin=n < 5, date_joined=self.anchor - timedelta(days=self.rng.randint(30, 720)),
+                ))
+            with transaction.atomic():
+                ids += [user.id for user in User.objects.bulk_create(batch)]
+        return ids
+
+    def seed_events(self, count, user_ids):
+        organizers = user_ids[:max(1, min(20, len(user_ids)))]
+        events = []
+        for n in range(count):
+            date = self.anchor + timedelta(days=self.rng.randint(-180, 180), hours=self.rng.choice([14, 17, 19, 20]))
+            city = self.rng.choice(CITIES)
+            events.append(Event(
+                title=f'{city} {self.rng.choice(EVENT_KINDS)} {n + 1}', description='Generated by seed_scale',
+                date=date, price=self.rng.choice(PRICES), image='events/seed.png', location=city,
+                organizer_id=self.rng.choice(organizers), created_at=date - timedelta(days=90),
+                updated_at=date - timedelta(days=90), is_active=True,
+            ))
+        with transaction.atomic():
+            return Event.objects.bulk_create(events, batch_size=self.batch_size)
+
+    def seed_orders(self, count, ticket_total, user_ids, events):
+        rng = self.rng
+        # A few events sell most of the tickets
+        event_weights = list(accumulate(1 / (rank + 1) for rank in range(len(events))))
+        statuses, status_weights = zip(*STATUS_WEIGHTS.items())
+        methods, method_weights = zip(*PAYMENT_METHOD_WEIGHTS.items())
+        approved_share = STATUS_WEIGHTS['approved'] / sum(STATUS_WEIGHTS.values())
+        mean_quantity = max(1.0, ticket_total / max(1, count * approved_share))
+        max_quantity = min(10, max(1, round(2 * mean_quantity - 1)))
+
+        written = {'orders': 0, 'tickets': 0, 'confirmations': 0}
+        for start in range(0, count, self.batch_size):
+            orders, tickets, confirmations = [], [], []
+            for n in range(start, min(start + self.batch_size, count)):
+                event = events[bisect(event_weights, rng.random() * event_weights[-1])]
+                status = rng.choices(statuses, status_weights)[0]
+                if status == 'pending' and event.date < self.anchor:
+                    status = 'expired'
+                quantity = rng.randint(1, max_quantity) if status == 'approved' else rng.randint(1, 4)
+                latest = min(event.date, self.anchor)
+                created_at = latest - timedelta(minutes=rng.randint(1, 60 * 24 * 60))
+                confirmed_at = created_at + timedelta(minutes=rng.randint(5, 60 * 24)) if status == 'approved' else None
+                order = Order(
+                    id=self.uuid(), order_id=f'OR{self.tag}-{n:09d}', user_id=rng.choice(user_ids), event=event,
+                    quantity=quantity, total_amount=event.price * quantity,
+                    payment_method=rng.choices(methods, method_weights)[0], status=status,
+                    payment_reference=f'REF{self.tag}{n}' if rng.random() < 0.5 else None,
+                    payment_confirmed_at=confirmed_at, created_at=created_at, updated_at=confirmed_at or created_at,
+                )
+                orders.append(order)
+
+                if status == 'approved' or (status == 'pending' and rng.random() < 0.5):
+                    confirmations.append(PaymentConfirmation(
+                        id=self.uuid(), order=order, transaction_id=f'TX{self.tag}{n:09d}',
+                        created_at=created_at + timedelta(minutes=2), updated_at=confirmed_at or created_at,
+                    ))
+                if status == 'approved':
+                    attended = event.date < self.anchor
+                    for _ in range(quantity):
+                        used = attended and rng.random() < 0.85
+                        tickets.append(Ticket(
+                            id=self.uuid(), ticket_id=f'TK{self.tag}-{written["tickets"] + len(tickets):010d}',
+                            order=order, is_used=used, created_at=confirmed_at,
+                            used_at=event.date + timedelta(minutes=rng.randint(-60, 180)) if used else None,
+                            gate=rng.choice(GATES) if used else '',
+                        ))
+
+            with transaction.atomic():
+                Order.objects.bulk_create(orders)
+                PaymentConfirmation.objects.bulk_create(confirmations)
+                Ticket.objects.bulk_create(tickets, batch_size=self.batch_size)
+            written['orders'] += len(orders)
+            written['tickets'] += len(tickets)
+            written['confirmations'] += len(confirmations)
+            if (start // self.batch_size) % 20 == 19 or written['orders'] == count:
+                self.stdout.write(
+                    f"  {written['orders']:,} orders, {written['tickets']:,} tickets, "
+                    f"{written['confirmations']:,} payment confirmations"
+                )
+        return written
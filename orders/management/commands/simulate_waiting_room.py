@@ -0,0 +1,120 @@
+import heapq
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from orders import waiting_room
+from orders.views import waiting_room_status
+
+
+class Command(BaseCommand):
+    help = (
+        'Load-test the waiting room: queue simulated users for an event, let them poll '
+        'as advised on a simulated clock, and check every one is admitted in order'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50000)
+        parser.add_argument('--event-id', type=int, default=0, help='Queue to use; 0 is never a real event')
+        parser.add_argument(
+            '--rate', type=int, default=3000,
+            help='Admissions per minute; 0 uses WAITING_ROOM_ADMIT_PER_MINUTE'
+        )
+        parser.add_argument('--burst', type=int, help='Admitted at opening (default WAITING_ROOM_BURST)')
+        parser.add_argument('--arrival-seconds', type=int, default=60, help='Spread of simulated arrivals')
+        parser.add_argument('--threads', type=int, default=8, help='Threads joining the queue concurrently')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        overrides = {}
+        if options['rate']:
+            overrides['WAITING_ROOM_ADMIT_PER_MINUTE'] = options['rate']
+        if options['burst'] is not None:
+            overrides['WAITING_ROOM_BURST'] = options['burst']
+        with override_settings(**overrides):
+            self.simulate(options)
+
+    def simulate(self, options):
+        event_id, users = options['event_id'], options['users']
+        rng = random.Random(options['seed'])
+        user_ids = list(range(1, users + 1))
+        waiting_room.clear(event_id, user_ids)
+
+        opens_at = time.time()
+        arrivals = sorted((opens_at + rng.uniform(0, options['arrival_seconds']), user_id) for user_id in user_ids)
+
+        # Join concurrently so the position counter is exercised under contention
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+            results = pool.map(lambda arrival: waiting_room.join(event_id, arrival[1], now=arrival[0]), arrivals)
+            joined = [(arrival, user_id, result) for (arrival, user_id), result in zip(arrivals, results)]
+        join_seconds = time.perf_counter() - started
+
+        positions = sorted(result['position'] for _, _, result in joined)
+        if positions != list(range(1, users + 1)):
+            raise CommandError('Queue positions are not a gapless 1..N sequence')
+        rejoin = waiting_room.join(event_id, arrivals[0][1], now=arrivals[-1][0])
+        if rejoin['position'] != joined[0][2]['position']:
+            raise CommandError('Joining twice changed the queue position')
+
+        # Each client polls again when the status response tells it to
+        polls, admitted = [], {}
+        for arrival, _, result in joined:
+            heapq.heappush(polls, (arrival, result['position'], result['queue_token']))
+        poll_count = 0
+        started = time.perf_counter()
+        while polls:
+            now, position, token = heapq.heappop(polls)
+            result = waiting_room.status(token, now=now)
+            poll_count += 1
+            if result['admitted']:
+                admitted[position] = (now, result['admission_token'])
+            else:
+                heapq.heappush(polls, (now + result['poll_after_seconds'], position, token))
+        status_seconds = time.perf_counter() - started
+
+        self.check_admissions(event_id, users, opens_at, admitted, joined)
+        sample_queries = self.check_status_endpoint(event_id, joined[:min(users, 1000)])
+
+        last_admitted = max(moment for moment, _ in admitted.values())
+        self.stdout.write(f'Users queued: {users} ({users / join_seconds:,.0f} joins/s over {options["threads"]} threads)')
+        self.stdout.write(
+            f'Status polls: {poll_count} ({poll_count / users:.1f} per user, '
+            f'{poll_count / status_seconds:,.0f} polls/s, {status_seconds / poll_count * 1e6:.0f} us each)'
+        )
+        self.stdout.write(f'Simulated time to admit everyone: {(last_admitted - opens_at) / 60:.1f} min')
+        self.stdout.write(f'Database queries for {min(users, 1000)} status requests: {sample_queries}')
+        waiting_room.clear(event_id, user_ids)
+        self.stdout.write(self.style.SUCCESS('Waiting room admitted every user in queue order'))
+
+    def check_admissions(self, event_id, users, opens_at, admitted, joined):
+        if len(admitted) != users:
+            raise CommandError(f'Only {len(admitted)} of {users} users were admitted')
+        for position, (moment, _) in admitted.items():
+            if position > waiting_room.admitted_through(event_id, now=moment):
+                raise CommandError(f'Position {position} was admitted before its turn')
+
+        # The admission token only works for its own user and event
+        user_id = next(user_id for _, user_id, result in joined if result['position'] == 1)
+        token = admitted[1][1]
+        if not waiting_room.verify_admission(token, event_id, user_id):
+            raise CommandError('Admission token was rejected for its own user')
+        if waiting_room.verify_admission(token, event_id, user_id + 1):
+            raise CommandError('Admission token was accepted for another user')
+        if waiting_room.verify_admission(token, event_id + 1, user_id):
+            raise CommandError('Admission token was accepted for another event')
+
+    def check_status_endpoint(self, event_id, sample):
+        factory = RequestFactory()
+        with CaptureQueriesContext(connection) as queries:
+            for _, _, result in sample:
+                request = factory.get('/api/events/queue/status/', HTTP_X_QUEUE_TOKEN=result['queue_token'])
+                response = waiting_room_status(request, event_id=event_id)
+                if response.status_code != 200:
+                    raise CommandError(f'Status endpoint returned {response.status_code}')
+        return len(queries)
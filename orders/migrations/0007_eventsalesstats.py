@@ -0,0 +1,32 @@
+# Generated by Django 5.2.5 on 2026-10-19 18:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0004_event_is_active'),
+        ('orders', '0006_order_expired_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventSalesStats',
+            fields=[
+                ('event', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='sales_stats', serialize=False, to='events.event')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('tickets_sold', models.IntegerField(default=0)),
+                ('pending_count', models.IntegerField(default=0)),
+                ('approved_count', models.IntegerField(default=0)),
+                ('rejected_count', models.IntegerField(default=0)),
+                ('expired_count', models.IntegerField(default=0)),
+                ('checked_in_count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'event sales stats',
+            },
+        ),
+    ]
@@ -1,10 +1,12 @@
-from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
 from django.utils import timezone
 import uuid
 
 # Avoid importing Ticket or Order directly here — use string references instead
 from users.models import User
 from events.models import Event
+from events.seating import hold_seats, seat_assignments
 
 
 class Order(models.Model):
@@ -12,7 +14,10 @@ class Order(models.Model):
         ('pending', 'Pending'),
         ('approved', 'Approved'),
         ('rejected', 'Rejected'),
+        ('expired', 'Expired'),
     ]
+    # Moving a pending order to these gives its reserved seats back
+    SEAT_RELEASING_STATUSES = ('rejected', 'expired')
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     order_id = models.CharField(max_length=20, unique=True, blank=True)
@@ -29,36 +34,76 @@ class Order(models.Model):
     payment_reference = models.CharField(max_length=100, blank=True, null=True)
     payment_confirmed_at = models.DateTimeField(blank=True, null=True)
     admin_notes = models.TextField(blank=True, null=True)
+    # Reserved seating: [{'row_id', 'section', 'row', 'seats': [numbers]}] held for the order
+    seats = models.JSONField(default=list, blank=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='order_status_created_idx'),
+            models.Index(fields=['created_at'], name='order_created_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored status so save() can report the transition
+        if 'status' in field_names:
+            instance._loaded_status = values[field_names.index('status')]
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        if fields is None or 'status' in fields:
+            self._loaded_status = self.status
 
     def save(self, *args, **kwargs):
         if not self.order_id:
             timestamp = str(int(timezone.now().timestamp()))
-            self.order_id = f"ORD{timestamp}"
+            self.order_id = f"ORD{timestamp}{uuid.uuid4().hex[:7].upper()}"
 
         self.total_amount = self.event.price * self.quantity
 
         if self.status == 'approved' and not self.payment_confirmed_at:
             self.payment_confirmed_at = timezone.now()
 
-        super().save(*args, **kwargs)
+        previous_status = None if self._state.adding else getattr(self, '_loaded_status', None)
+        if previous_status is not None and previous_status != self.status:
+            # Saving would skip the conditional UPDATE that makes concurrent changes safe
+            from orders.transitions import TransitionError
+            raise TransitionError(
+                f'Change order status with orders.transitions.transition_order, not save() '
+                f'({previous_status} -> {self.status})'
+            )
+
+        with transaction.atomic():
+            if self._state.adding and not self.seats and self.event.reserved_seating:
+                # Orders not created through the API (admin, scripts) hold their seats here,
+                # in the order's transaction so a failed insert gives them back
+                self.seats = hold_seats(self.event_id, self.quantity)
+            super().save(*args, **kwargs)
+            if previous_status != self.status:
+                from orders.stats import record_transition
+                record_transition(
+                    self.event_id, previous_status, self.status,
+                    amount=self.total_amount, quantity=self.quantity
+                )
+        self._loaded_status = self.status
 
         if self.status == 'approved':
             self.create_tickets()
 
     def create_tickets(self):
-        """Create tickets for approved orders"""
+        """Create tickets for approved orders, on the seats the order holds"""
         if self.tickets.exists():
             return
 
         Ticket = self._get_ticket_model()
-        for _ in range(self.quantity):
-            Ticket.objects.create(order=self)
+        for seat_row_id, seat_number in seat_assignments(self.seats, self.quantity):
+            Ticket.objects.create(order=self, seat_row_id=seat_row_id, seat_number=seat_number)
 
     def _get_ticket_model(self):
         """Lazy import Ticket to avoid circular import"""
@@ -69,3 +114,67 @@ class Order(models.Model):
         return f"{self.order_id} - {self.user.get_full_name()} - {self.event.title}"
 
 
+
+
+class IdempotencyKey(models.Model):
+    """Stored outcome of a request sent with an Idempotency-Key header"""
+    key = models.CharField(max_length=255)
+    scope = models.CharField(max_length=50)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_keys')
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(blank=True, null=True)  # null while in progress
+    response_body = models.JSONField(encoder=DjangoJSONEncoder, blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'scope', 'key'], name='unique_idempotency_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.scope} - {self.key}"
+
+
+class EventSalesStats(models.Model):
+    """Per-event sales counters, kept current by orders.stats on every change"""
+    event = models.OneToOneField(Event, on_delete=models.CASCADE, primary_key=True, related_name='sales_stats')
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    tickets_sold = models.IntegerField(default=0)
+    pending_count = models.IntegerField(default=0)
+    approved_count = models.IntegerField(default=0)
+    rejected_count = models.IntegerField(default=0)
+    expired_count = models.IntegerField(default=0)
+    checked_in_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'event sales stats'
+
+    def __str__(self):
+        return f"Sales stats for event {self.event_id}"
+
+
+class ArchivedOrder(models.Model):
+    """An order of a long-past event, moved out of Order by orders.archive"""
+    id = models.UUIDField(primary_key=True, editable=False)
+    order_id = models.CharField(max_length=20, unique=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_orders')
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='archived_orders')
+    quantity = models.PositiveIntegerField()
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    payment_method = models.CharField(max_length=50, choices=Order._meta.get_field('payment_method').choices)
+    status = models.CharField(max_length=10, choices=Order.STATUS_CHOICES)
+    payment_reference = models.CharField(max_length=100, blank=True, null=True)
+    payment_confirmed_at = models.DateTimeField(blank=True, null=True)
+    admin_notes = models.TextField(blank=True, null=True)
+    seats = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.order_id} - {self.user.get_full_name()} - {self.event.title} (archived)"
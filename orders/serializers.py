@@ -1,8 +1,12 @@
 from rest_framework import serializers
-from .models import Order
+from .models import Order, EventSalesStats
 from events.serializers import EventSerializer
 from tickets.serializers import TicketSerializer
 from users.serializers import UserSerializer
+from events.cache import get_event
+from events.models import SeatRow
+from events.seating import hold_seats, release_seats
+from eticketing_backend.fieldsets import SparseFieldsMixin
 from events.models import Event
 from users.models import User
 from payment.serializers import PaymentConfirmationSerializer
@@ -14,13 +18,15 @@ class OrderCreateSerializer(serializers.ModelSerializer):
     total_amount = serializers.DecimalField(max_digits=10, decimal_places=2, coerce_to_string=True, read_only=True)
     tickets = TicketSerializer(many=True, read_only=True)
     user = UserSerializer(read_only=True)
+    # Reserved seating: the section to seat the order in; best available anywhere if left out
+    section = serializers.CharField(write_only=True, required=False, allow_blank=True)
 
     class Meta:
         model = Order
         fields = [
             'id', 'order_id', 'user', 'event', 'event_id', 'quantity',
             'total_amount', 'payment_method', 'status', 'payment_reference',
-            'admin_notes', 'created_at', 'updated_at', 'tickets'
+            'admin_notes', 'created_at', 'updated_at', 'tickets', 'section'
         ]
         read_only_fields = ['order_id', 'total_amount', 'user']
 
@@ -28,21 +34,44 @@ class OrderCreateSerializer(serializers.ModelSerializer):
         request = self.context.get('request')
         if request and request.user:
             validated_data['user'] = request.user
-        return super().create(validated_data)
+        if getattr(self, '_event', None) is not None:
+            validated_data['event'] = self._event
+        section = validated_data.pop('section', '')
+        event = validated_data.get('event')
+        if event is None or not event.reserved_seating:
+            return super().create(validated_data)
+
+        # Held in a statement of its own, not inside the order's transaction,
+        # which also updates the event's sales stats row; raises SeatsUnavailable
+        validated_data['seats'] = hold_seats(event.id, validated_data['quantity'], section or None)
+        try:
+            return super().create(validated_data)
+        except Exception:
+            release_seats(validated_data['seats'])
+            raise
 
     def validate_event_id(self, value):
-        try:
-            event = Event.objects.get(id=value, is_active=True)
-            return value
-        except Event.DoesNotExist:
+        event = get_event(value)
+        if event is None or not event.is_active:
             raise serializers.ValidationError("Event not found or inactive")
+        # Order.save() needs the event for its price; hand over the one we have
+        self._event = event
+        return value
+
+    def validate(self, attrs):
+        section = attrs.get('section')
+        if section and not self._event.reserved_seating:
+            raise serializers.ValidationError({'section': 'This event has no reserved seating'})
+        if section and not SeatRow.objects.filter(event_id=self._event.pk, section=section).exists():
+            raise serializers.ValidationError({'section': f'The event has no section {section}'})
+        return attrs
 
     def validate_quantity(self, value):
         if value < 1 or value > 10:
             raise serializers.ValidationError("Quantity must be between 1 and 10")
         return value
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     event = EventSerializer(read_only=True)
     event_id = serializers.IntegerField(write_only=True)   # 👈 change UUIDField → IntegerField
     total_amount = serializers.DecimalField(max_digits=10, decimal_places=2, coerce_to_string=True, read_only=True)
@@ -52,24 +81,27 @@ class OrderSerializer(serializers.ModelSerializer):
     class Meta:
         model = Order
         fields = [
-            'id', 'order_id', 'user', 'event', 'event_id', 'quantity',
+            'id', 'order_id', 'user', 'event', 'event_id', 'quantity', 'seats',
             'total_amount', 'payment_method', 'status', 'payment_reference',
             'admin_notes', 'created_at', 'updated_at', 'tickets'
         ]
-        read_only_fields = ['order_id', 'total_amount', 'user']
+        read_only_fields = ['order_id', 'total_amount', 'user', 'seats']
 
     def create(self, validated_data):
         request = self.context.get('request')
         if request and request.user:
             validated_data['user'] = request.user
+        if getattr(self, '_event', None) is not None:
+            validated_data['event'] = self._event
         return super().create(validated_data)
 
     def validate_event_id(self, value):
-        try:
-            event = Event.objects.get(id=value, is_active=True)
-            return value
-        except Event.DoesNotExist:
+        event = get_event(value)
+        if event is None or not event.is_active:
             raise serializers.ValidationError("Event not found or inactive")
+        # Order.save() needs the event for its price; hand over the one we have
+        self._event = event
+        return value
 
 
 
@@ -116,4 +148,33 @@ class AdminOrderDetailSerializer(serializers.ModelSerializer):
             'payment_method', 'status', 'payment_reference', 'admin_notes',
             'payment_confirmed_at', 'created_at', 'updated_at', 'tickets',
             'payment_confirmation'
-        ]
\ No newline at end of file
+        ]
+
+
+class EventSalesStatsSerializer(serializers.ModelSerializer):
+    event_title = serializers.CharField(source='event.title', read_only=True)
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2, coerce_to_string=True)
+
+    class Meta:
+        model = EventSalesStats
+        fields = [
+            'event', 'event_title', 'revenue', 'tickets_sold', 'pending_count',
+            'approved_count', 'rejected_count', 'expired_count', 'checked_in_count',
+            'updated_at'
+        ]
+
+
+class BatchReviewItemSerializer(serializers.Serializer):
+    id = serializers.UUIDField()
+    notes = serializers.CharField(required=False, allow_blank=True)
+
+
+class BatchReviewSerializer(serializers.Serializer):
+    decision = serializers.ChoiceField(choices=['approved', 'rejected'])
+    orders = BatchReviewItemSerializer(many=True, allow_empty=False, max_length=500)
+
+    def validate_orders(self, value):
+        ids = [item['id'] for item in value]
+        if len(ids) != len(set(ids)):
+            raise serializers.ValidationError("Each order may appear only once")
+        return value
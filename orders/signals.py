@@ -0,0 +1,60 @@
+"""
+Seats and sales stats of deleted orders.
+
+Deleting an order, directly, from the admin or through a cascade from its
+user, gives its seats back once the delete commits and takes the order (and
+the check-ins of its used tickets) out of its event's EventSalesStats in the
+same transaction. Archival deletes orders it has copied to the archive,
+which keep their seats and still count, inside ``moving_orders``. Deleting
+the event itself removes its stats row, so there is nothing to adjust.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from events.models import Event
+from events.seating import release_seats
+from orders.models import Order
+from orders.stats import record_check_in, record_transition
+from tickets.models import Ticket
+
+_moving = ContextVar('moving_orders', default=False)
+
+
+@contextmanager
+def moving_orders():
+    """Delete orders without releasing their seats or stats: they are being moved, not cancelled"""
+    token = _moving.set(True)
+    try:
+        yield
+    finally:
+        _moving.reset(token)
+
+
+def _cancelled(origin):
+    """Whether a delete started from ``origin`` takes orders out of their event"""
+    if _moving.get():
+        return False
+    return not (isinstance(origin, Event) or getattr(origin, 'model', None) is Event)
+
+
+@receiver(post_delete, sender=Order)
+def release_deleted_order(sender, instance, using, origin=None, **kwargs):
+    if not _cancelled(origin):
+        return
+    record_transition(
+        instance.event_id, instance.status, None, amount=instance.total_amount, quantity=instance.quantity
+    )
+    if instance.seats:
+        transaction.on_commit(partial(release_seats, instance.seats), using=using)
+
+
+@receiver(post_delete, sender=Ticket)
+def uncount_deleted_check_in(sender, instance, origin=None, **kwargs):
+    # Tickets go before their order, so the order row is still there to read the event from
+    if instance.is_used and _cancelled(origin):
+        record_check_in(Order.objects.filter(pk=instance.order_id).values_list('event_id', flat=True).get(), -1)
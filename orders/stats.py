@@ -0,0 +1,107 @@
+"""
+Incremental per-event sales counters.
+
+Every order status change and ticket check-in adjusts the event's
+EventSalesStats row with F-expressions inside the caller's transaction, so
+reading the numbers never aggregates over orders or tickets. Use the
+``rebuild_sales_stats`` command to recompute them from scratch.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from orders.models import ArchivedOrder, EventSalesStats, Order
+
+STATUSES = [value for value, _ in Order.STATUS_CHOICES]
+COUNTER_FIELDS = (
+    ['revenue', 'tickets_sold'] + [f'{s}_count' for s in STATUSES] + ['checked_in_count']
+)
+
+
+def _apply(event_id, deltas):
+    changes = {field: F(field) + delta for field, delta in deltas.items() if delta}
+    if not changes:
+        return
+    changes['updated_at'] = timezone.now()
+    with transaction.atomic():
+        if not EventSalesStats.objects.filter(event_id=event_id).update(**changes):
+            EventSalesStats.objects.get_or_create(event_id=event_id)
+            EventSalesStats.objects.filter(event_id=event_id).update(**changes)
+
+
+def record_transition(event_id, old_status, new_status, amount=Decimal('0'), quantity=0, count=1):
+    """Move ``count`` orders of an event from ``old_status`` to ``new_status``"""
+    if old_status == new_status:
+        return
+    deltas = defaultdict(int)
+    if old_status:
+        deltas[f'{old_status}_count'] -= count
+    if new_status:
+        deltas[f'{new_status}_count'] += count
+    if new_status == 'approved':
+        deltas['revenue'] += amount
+        deltas['tickets_sold'] += quantity
+    if old_status == 'approved':
+        deltas['revenue'] -= amount
+        deltas['tickets_sold'] -= quantity
+    _apply(event_id, deltas)
+
+
+def record_check_in(event_id, count=1):
+    _apply(event_id, {'checked_in_count': count})
+
+
+def compute_event_stats():
+    """Aggregate the counters from the live and archived order and ticket tables, keyed by event id"""
+    from tickets.models import ArchivedTicket, Ticket
+
+    stats = defaultdict(lambda: {field: 0 for field in COUNTER_FIELDS})
+    for model in (Order, ArchivedOrder):
+        by_status = model.objects.order_by().values('event_id', 'status').annotate(
+            orders=Count('id'), revenue=Sum('total_amount'), tickets=Sum('quantity')
+        )
+        for row in by_status:
+            event_stats = stats[row['event_id']]
+            event_stats[f"{row['status']}_count"] += row['orders']
+            if row['status'] == 'approved':
+                event_stats['revenue'] += row['revenue'] or Decimal('0')
+                event_stats['tickets_sold'] += row['tickets'] or 0
+
+    for model in (Ticket, ArchivedTicket):
+        check_ins = model.objects.filter(is_used=True).order_by().values(
+            'order__event_id'
+        ).annotate(total=Count('id'))
+        for row in check_ins:
+            stats[row['order__event_id']]['checked_in_count'] += row['total']
+    return stats
+
+
+def verify_event_stats():
+    """Return {event_id: {field: (stored, actual)}} for every counter that is off"""
+    actual = compute_event_stats()
+    stored = {s.event_id: s for s in EventSalesStats.objects.all()}
+    mismatches = {}
+    for event_id in set(actual) | set(stored):
+        expected = actual.get(event_id, {field: 0 for field in COUNTER_FIELDS})
+        row = stored.get(event_id)
+        diff = {}
+        for field in COUNTER_FIELDS:
+            value = getattr(row, field) if row else 0
+            if value != expected[field]:
+                diff[field] = (value, expected[field])
+        if diff:
+            mismatches[event_id] = diff
+    return mismatches
+
+
+def rebuild_event_stats():
+    """Recompute every event's counters from scratch, returning the number of rows written"""
+    actual = compute_event_stats()
+    with transaction.atomic():
+        EventSalesStats.objects.exclude(event_id__in=list(actual)).delete()
+        for event_id, values in actual.items():
+            EventSalesStats.objects.update_or_create(event_id=event_id, defaults=values)
+    return len(actual)
@@ -1,3 +1,709 @@
-from django.test import TestCase
+import json
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import BytesIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import Permission
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+
+from events.cache import event_cache
+from events.models import Event, SeatRow
+from events.seating import SeatsUnavailable, hold_seats, load_seat_map, seat_availability
+from notifications.models import Notification
+from notifications.outbox import enqueue_orders_approved
+from orders import waiting_room
+from orders.archive import archive_event, find_order, restore_event
+from orders.models import ArchivedOrder, EventSalesStats, IdempotencyKey, Order
+from orders.serializers import OrderCreateSerializer, OrderSerializer
+from orders.stats import verify_event_stats
+from orders.transitions import TransitionError, transition_order
+from payment.models import ArchivedPaymentConfirmation, PaymentConfirmation
+from tickets.models import ArchivedTicket, Ticket
+from users.models import User
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class OrderTransitionConcurrencyTests(TransactionTestCase):
+    """Many admins acting on the same order at once must change it exactly once"""
+
+    THREADS = 8
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='buyer@example.com', email='buyer@example.com', password='secret', phone='0200000000'
+        )
+        self.event = Event.objects.create(
+            title='Concert', description='Live', date='2030-01-01T20:00:00Z', price=50,
+            image='events/concert.jpg', location='Accra', organizer=self.user
+        )
+        self.order = Order.objects.create(
+            user=self.user, event=self.event, quantity=3, payment_method='mobile_money'
+        )
+
+    def _race(self, decisions):
+        """Run transition_order for each decision in its own thread, released together"""
+        barrier = threading.Barrier(len(decisions))
+        results = []
+
+        def worker(new_status):
+            try:
+                order = Order.objects.get(pk=self.order.pk)
+                barrier.wait()
+                transition_order(order, new_status)
+                results.append(new_status)
+            except TransitionError:
+                results.append('lost')
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(decision,)) for decision in decisions]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_concurrent_approvals_issue_tickets_once(self):
+        results = self._race(['approved'] * self.THREADS)
+
+        self.assertEqual(results.count('approved'), 1)
+        self.assertEqual(results.count('lost'), self.THREADS - 1)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'approved')
+        self.assertEqual(self.order.tickets.count(), 3)
+
+        stats = EventSalesStats.objects.get(event=self.event)
+        self.assertEqual(stats.approved_count, 1)
+        self.assertEqual(stats.pending_count, 0)
+        self.assertEqual(stats.tickets_sold, 3)
+        self.assertEqual(stats.revenue, 150)
+
+    def test_concurrent_approve_and_reject_pick_one_winner(self):
+        results = self._race(['approved', 'rejected'] * (self.THREADS // 2))
+
+        winners = [result for result in results if result != 'lost']
+        self.assertEqual(len(winners), 1)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, winners[0])
+        self.assertEqual(self.order.tickets.count(), 3 if winners[0] == 'approved' else 0)
+
+    def test_stale_read_cannot_transition(self):
+        stale = Order.objects.get(pk=self.order.pk)
+        transition_order(self.order, 'rejected')
+
+        with self.assertRaisesMessage(TransitionError, 'Order is already rejected'):
+            transition_order(stale, 'approved')
+        self.assertEqual(self.order.tickets.count(), 0)
+
+    def test_save_cannot_change_status(self):
+        transition_order(self.order, 'rejected')
+        self.order.status = 'approved'
+
+        with self.assertRaises(TransitionError):
+            self.order.save()
+        self.assertEqual(Order.objects.get(pk=self.order.pk).status, 'rejected')
+        self.assertEqual(self.order.tickets.count(), 0)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class SeatAllocationConcurrencyTests(TransactionTestCase):
+    """Buyers racing for the same rows must never be given the same seat"""
+
+    THREADS = 8
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='buyer@example.com', email='buyer@example.com', password='secret', phone='0200000000'
+        )
+        self.event = Event.objects.create(
+            title='Stadium', description='Final', date='2030-01-01T20:00:00Z', price=50,
+            image='events/stadium.jpg', location='Accra', organizer=self.user
+        )
+        load_seat_map(self.event, {'sections': [
+            {'name': 'A', 'rows': 2, 'seats': 12, 'rank': 0},
+            {'name': 'B', 'rows': 2, 'seats': 12, 'rank': 0},
+        ]})
+
+    def _race(self, quantity):
+        barrier = threading.Barrier(self.THREADS)
+        holds = []
+
+        def worker():
+            try:
+                barrier.wait()
+                holds.extend(hold_seats(self.event.pk, quantity))
+            except SeatsUnavailable:
+                holds.append(None)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return holds
+
+    def test_concurrent_holds_never_share_a_seat(self):
+        holds = self._race(4) + self._race(4)
+
+        seats = [(hold['row_id'], number) for hold in holds if hold for number in hold['seats']]
+        self.assertEqual(len(seats), len(set(seats)))
+        # The first party of four sits mid-row, leaving four seats either side: three parties per row
+        self.assertEqual(len(seats), 48)
+        self.assertEqual(holds.count(None), 4)
+        self.assertEqual(sum(section['available'] for section in seat_availability(self.event.pk)), 0)
+        for hold in filter(None, holds):
+            self.assertEqual(hold['seats'], list(range(hold['seats'][0], hold['seats'][0] + 4)))
+
+    def test_rejection_releases_and_approval_seats_tickets(self):
+        first = Order.objects.create(
+            user=self.user, event=self.event, quantity=3, payment_method='mobile_money',
+            seats=hold_seats(self.event.pk, 3, 'B')
+        )
+        second = Order.objects.create(
+            user=self.user, event=self.event, quantity=2, payment_method='mobile_money',
+            seats=hold_seats(self.event.pk, 2, 'B')
+        )
+        transition_order(first, 'rejected')
+        transition_order(second, 'approved')
+
+        first.refresh_from_db()
+        self.assertEqual(first.seats, [])
+        seated = list(second.tickets.values_list('seat_row__section', 'seat_number'))
+        self.assertEqual(sorted(seated), [('B', number) for number in second.seats[0]['seats']])
+        self.assertEqual(seat_availability(self.event.pk, 'B')[0]['available'], 22)
+        # Seats 8-9 of the row stay sold; 1-7 are free again
+        self.assertEqual(second.seats[0]['seats'], [8, 9])
+        self.assertEqual(SeatRow.objects.get(pk=second.seats[0]['row_id']).longest_run, 7)
+
+    def _available(self):
+        return sum(section['available'] for section in seat_availability(self.event.pk))
+
+    def test_orders_created_without_the_api_hold_seats(self):
+        order = Order.objects.create(user=self.user, event=self.event, quantity=4, payment_method='mobile_money')
+
+        self.assertEqual(len(order.seats[0]['seats']), 4)
+        self.assertEqual(self._available(), 44)
+
+    def test_deleting_an_order_releases_its_seats_but_archiving_does_not(self):
+        kept = Order.objects.create(user=self.user, event=self.event, quantity=2, payment_method='mobile_money')
+        deleted = Order.objects.create(user=self.user, event=self.event, quantity=3, payment_method='mobile_money')
+        deleted.delete()
+        self.assertEqual(self._available(), 46)
+
+        Event.objects.filter(pk=self.event.pk).update(date='2020-01-01T20:00:00Z')
+        archive_event(self.event.pk)
+        self.assertEqual(ArchivedOrder.objects.get().seats, kept.seats)
+        self.assertEqual(self._available(), 46)
+
+    def test_unknown_section_is_a_bad_request(self):
+        caches['throttle'].clear()
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.post('/api/orders/', {
+            'event_id': self.event.pk, 'quantity': 2, 'payment_method': 'mobile_money', 'section': 'Z'
+        }, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('section', response.json()['details'])
+        self.assertEqual(self._available(), 48)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class IdempotencyKeyTests(TestCase):
+    """Retries with an Idempotency-Key run the view once and replay its response"""
+
+    def setUp(self):
+        caches['throttle'].clear()
+        self.user = User.objects.create_user(
+            username='buyer@example.com', email='buyer@example.com', password='secret', phone='0200000000'
+        )
+        self.event = Event.objects.create(
+            title='Concert', description='Live', date='2030-01-01T20:00:00Z', price=50,
+            image='events/concert.jpg', location='Accra', organizer=self.user
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _order(self, key, quantity=2):
+        return self.client.post(
+            '/api/orders/', {'event_id': self.event.pk, 'quantity': quantity, 'payment_method': 'mobile_money'},
+            format='json', HTTP_IDEMPOTENCY_KEY=key
+        )
+
+    def test_retry_replays_the_stored_response(self):
+        first = self._order('k1')
+        retry = self._order('k1')
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json()['order_id'], first.json()['order_id'])
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_key_reused_for_a_different_request_is_rejected(self):
+        self._order('k1')
+        response = self._order('k1', quantity=3)
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_request_in_progress_gets_409_until_its_lease_ends(self):
+        self._order('k1')
+        record = IdempotencyKey.objects.get()
+        IdempotencyKey.objects.filter(pk=record.pk).update(status_code=None, response_body=None)
+
+        self.assertEqual(self._order('k1').status_code, 409)
+
+        # The first request's process died: past the lease a retry runs the view again
+        IdempotencyKey.objects.filter(pk=record.pk).update(created_at=record.created_at - timedelta(minutes=10))
+        retry = self._order('k1')
+        self.assertEqual(retry.status_code, 201)
+        self.assertNotIn('Idempotent-Replayed', retry)
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_failure_from_an_unexpected_error_is_not_replayed(self):
+        locked = mock.patch.object(OrderCreateSerializer, 'save', side_effect=OperationalError('database is locked'))
+        with locked, self.assertLogs('orders.views', 'ERROR'):
+            self.assertEqual(self._order('k1').status_code, 400)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+        self.assertEqual(self._order('k1').status_code, 201)
+
+    @override_settings(DATA_UPLOAD_MAX_MEMORY_SIZE=1024)
+    def test_large_upload_with_a_key_is_fingerprinted_and_replayed(self):
+        from payment.views import submit_payment_confirmation
+
+        order = Order.objects.create(user=self.user, event=self.event, quantity=1, payment_method='mobile_money')
+        image = BytesIO()
+        Image.frombytes('L', (64, 64), bytes(range(256)) * 16).save(image, 'PNG')
+        factory = APIRequestFactory()
+
+        def submit(transaction_id):
+            screenshot = SimpleUploadedFile('paid.png', image.getvalue() + b'\0' * 4096, content_type='image/png')
+            request = factory.post(
+                f'/api/payments/{order.order_id}/submit-confirmation/',
+                {'transaction_id': transaction_id, 'payment_screenshot': screenshot},
+                format='multipart', HTTP_IDEMPOTENCY_KEY='pay-1'
+            )
+            force_authenticate(request, self.user)
+            return submit_payment_confirmation(request, order_id=order.order_id)
+
+        first = submit('TX1')
+        self.assertEqual(first.status_code, 200, first.data)
+        self.assertEqual(submit('TX1')['Idempotent-Replayed'], 'true')
+        self.assertEqual(submit('TX2').status_code, 422)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ArchiveTests(TestCase):
+    """Archiving and restoring an event moves its orders intact, and only admins who may change orders restore"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='buyer@example.com', email='buyer@example.com', password='secret', phone='0200000000'
+        )
+        self.event = Event.objects.create(
+            title='Concert', description='Live', date='2020-01-01T20:00:00Z', price=50,
+            image='events/concert.jpg', location='Accra', organizer=self.user
+        )
+        self.approved = Order.objects.create(user=self.user, event=self.event, quantity=2, payment_method='mobile_money')
+        transition_order(self.approved, 'approved')
+        PaymentConfirmation.objects.create(order=self.approved, transaction_id='TX1')
+        Notification.objects.update(status='sent')
+        self.pending = Order.objects.create(user=self.user, event=self.event, quantity=1, payment_method='bank')
+
+    def test_round_trip_keeps_rows_intact(self):
+        before = Order.objects.filter(pk=self.approved.pk).values().get()
+        tickets = sorted(Ticket.objects.filter(order=self.approved).values_list('ticket_id', 'created_at'))
+
+        moved = archive_event(self.event.pk, batch_size=1)
+        self.assertEqual(moved, {'orders': 2, 'tickets': 2, 'payment confirmations': 1})
+        self.assertFalse(Order.objects.filter(event=self.event).exists())
+        self.assertEqual(ArchivedTicket.objects.count(), 2)
+        self.assertEqual(ArchivedPaymentConfirmation.objects.get().transaction_id, 'TX1')
+        self.assertIsInstance(find_order(order_id=self.approved.order_id), ArchivedOrder)
+
+        restored = restore_event(self.event.pk)
+        self.assertEqual(restored, moved)
+        self.assertFalse(ArchivedOrder.objects.exists())
+        self.assertEqual(Order.objects.filter(pk=self.approved.pk).values().get(), before)
+        self.assertEqual(sorted(Ticket.objects.filter(order=self.approved).values_list('ticket_id', 'created_at')), tickets)
+
+    def test_orders_with_unsent_notifications_stay_live(self):
+        Notification.objects.update(status='pending')
+
+        moved = archive_event(self.event.pk)
+        self.assertEqual(moved['orders'], 1)
+        self.assertTrue(Order.objects.filter(pk=self.approved.pk).exists())
+
+    def _restore_as(self, *codenames):
+        staff = User.objects.create_user(
+            username='staff@example.com', email='staff@example.com', password='secret', phone='0200000001',
+            is_staff=True
+        )
+        staff.user_permissions.set(Permission.objects.filter(codename__in=codenames))
+        self.client.force_login(staff)
+        return self.client.post('/admin/orders/archivedorder/', {
+            'action': 'restore_events', '_selected_action': [str(self.approved.pk)],
+        })
+
+    def test_view_permission_cannot_restore(self):
+        archive_event(self.event.pk)
+        self._restore_as('view_archivedorder')
+        self.assertEqual(ArchivedOrder.objects.count(), 2)
+
+    def test_change_permission_on_orders_restores(self):
+        archive_event(self.event.pk)
+        response = self._restore_as('view_archivedorder', 'change_order')
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(ArchivedOrder.objects.exists())
+
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class BatchReviewTests(TestCase):
+    """A failing order in a batch review is reported with its stored status and does not undo the others"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='buyer@example.com', email='buyer@example.com', password='secret', phone='0200000000'
+        )
+        admin = User.objects.create_user(
+            username='admin@example.com', email='admin@example.com', password='secret', phone='0200000001',
+            is_admin=True
+        )
+        self.event = Event.objects.create(
+            title='Concert', description='Live', date='2030-01-01T20:00:00Z', price=50,
+            image='events/concert.jpg', location='Accra', organizer=self.user
+        )
+        self.orders = [
+            Order.objects.create(user=self.user, event=self.event, quantity=1, payment_method='mobile_money')
+            for _ in range(3)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(admin)
+
+    def _review(self, items):
+        return self.client.post(
+            '/api/admin/orders/batch-review/', {'decision': 'approved', 'orders': items}, format='json'
+        )
+
+    def test_unexpected_error_fails_only_its_orders(self):
+        transition_order(self.orders[0], 'rejected')
+        broken = self.orders[1]
+
+        def enqueue_or_fail(orders):
+            if any(order.pk == broken.pk for order in orders):
+                raise RuntimeError('mail queue down')
+            enqueue_orders_approved(orders)
+
+        # Different notes go through separate bulk transitions
+        with mock.patch('orders.transitions.enqueue_orders_approved', side_effect=enqueue_or_fail), \
+                self.assertLogs('orders.views', 'ERROR'):
+            response = self._review([
+                {'id': str(order.pk), 'notes': f'note {n}'} for n, order in enumerate(self.orders)
+            ])
+
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual((response.data['succeeded'], response.data['failed']), (1, 2))
+        results = {result['id']: result for result in response.data['results']}
+        self.assertEqual(results[self.orders[0].pk]['status'], 'rejected')
+        self.assertEqual(results[self.orders[0].pk]['error'], 'Order is already rejected')
+        self.assertEqual(results[broken.pk]['status'], 'pending')
+        self.assertEqual(results[broken.pk]['error'], 'Could not update this order')
+        self.assertFalse(Ticket.objects.filter(order=broken).exists())
+        self.assertEqual(results[self.orders[2].pk]['status'], 'approved')
+        self.assertEqual(Order.objects.get(pk=self.orders[2].pk).status, 'approved')
+
+    def test_approvals_issue_tickets_without_rendering_qr_codes(self):
+        with mock.patch('tickets.models.render_qr_png') as render:
+            response = self._review([{'id': str(order.pk)} for order in self.orders])
+
+        self.assertEqual(response.data['succeeded'], 3)
+        self.assertEqual(Ticket.objects.filter(order__in=self.orders).count(), 3)
+        # Left for generate_qr_codes, outside the review's transaction
+        render.assert_not_called()
+        self.assertFalse(Ticket.objects.exclude(qr_code='').exists())
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, WAITING_ROOM_BURST=1, WAITING_ROOM_ADMIT_PER_MINUTE=1)
+class WaitingRoomTests(TestCase):
+    """Buyers of a waiting-room event are admitted in queue order and only order with their admission token"""
+
+    def setUp(self):
+        # Saves invalidate the event cache on commit, which never comes inside a TestCase
+        event_cache.clear()
+        caches['waiting_room'].clear()
+        caches['throttle'].clear()
+        self.first, self.second = [
+            User.objects.create_user(
+                username=f'buyer{n}@example.com', email=f'buyer{n}@example.com', password='secret',
+                phone=f'020000000{n}'
+            )
+            for n in (1, 2)
+        ]
+        self.event = Event.objects.create(
+            title='Concert', description='Live', date='2030-01-01T20:00:00Z', price=50,
+            image='events/concert.jpg', location='Accra', organizer=self.first, waiting_room_enabled=True
+        )
+        self.queue_url = f'/api/events/{self.event.pk}/queue/'
+
+    def _client(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def _order(self, user, admission_token=None, event_id=None):
+        headers = {'HTTP_X_ADMISSION_TOKEN': admission_token} if admission_token else {}
+        return self._client(user).post(
+            '/api/orders/',
+            {'event_id': self.event.pk if event_id is None else event_id, 'quantity': 1, 'payment_method': 'mobile_money'},
+            format='json', **headers
+        )
+
+    def test_order_needs_an_admission_token(self):
+        self.assertEqual(self._order(self.first).status_code, 403)
+        # However the event id is spelled
+        self.assertEqual(self._order(self.first, event_id=f'{self.event.pk}.0').status_code, 403)
+        response = self._client(self.first).post('/api/orders/', [self.event.pk], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+        joined = self._client(self.first).post(self.queue_url).data
+        self.assertEqual((joined['position'], joined['admitted']), (1, True))
+        # The token is bound to its buyer
+        self.assertEqual(self._order(self.second, joined['admission_token']).status_code, 403)
+        self.assertEqual(self._order(self.first, joined['admission_token']).status_code, 201)
+
+    def test_admission_is_good_for_one_order(self):
+        opened = time.time()
+        with mock.patch('orders.waiting_room.time.time', return_value=opened):
+            joined = self._client(self.first).post(self.queue_url).data
+            self.assertEqual(self._order(self.first, joined['admission_token']).status_code, 201)
+            self.assertEqual(self._order(self.first, joined['admission_token']).status_code, 403)
+            # Polling mints a new token for the same, used, position
+            polled = APIClient().get(f"{self.queue_url}status/?token={joined['queue_token']}").data
+            self.assertEqual(self._order(self.first, polled['admission_token']).status_code, 403)
+
+            rejoined = self._client(self.first).post(self.queue_url).data
+        self.assertEqual((rejoined['position'], rejoined['admitted']), (2, False))
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_failed_order_gives_the_admission_back(self):
+        joined = self._client(self.first).post(self.queue_url).data
+
+        with mock.patch('orders.views.OrderCreateSerializer.save', side_effect=SeatsUnavailable('Sold out')):
+            self.assertEqual(self._order(self.first, joined['admission_token']).status_code, 409)
+        self.assertEqual(self._order(self.first, joined['admission_token']).status_code, 201)
+
+    def test_queue_admits_by_position_over_time(self):
+        opened = time.time()
+        with mock.patch('orders.waiting_room.time.time', return_value=opened):
+            self._client(self.first).post(self.queue_url)
+            joined = self._client(self.second).post(self.queue_url).data
+            again = self._client(self.second).post(self.queue_url).data
+        self.assertEqual(again['position'], joined['position'])
+        self.assertEqual((joined['position'], joined['admitted'], joined['ahead']), (2, False, 1))
+        self.assertNotIn('admission_token', joined)
+
+        status_url = f"{self.queue_url}status/?token={joined['queue_token']}"
+        with mock.patch('orders.waiting_room.time.time', return_value=opened + 59):
+            self.assertFalse(APIClient().get(status_url).data['admitted'])
+        with mock.patch('orders.waiting_room.time.time', return_value=opened + 60):
+            admitted = APIClient().get(status_url).data
+        self.assertTrue(admitted['admitted'])
+        self.assertEqual(self._order(self.second, admitted['admission_token']).status_code, 201)
+
+    def test_tampered_and_expired_tokens_are_refused(self):
+        joined = self._client(self.first).post(self.queue_url).data
+        token = joined['admission_token']
+
+        response = APIClient().get(f"{self.queue_url}status/?token={joined['queue_token']}x")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(waiting_room.verify_admission(token, self.event.pk + 1, self.first.pk))
+        with override_settings(WAITING_ROOM_ADMISSION_SECONDS=0), mock.patch('time.time', return_value=time.time() + 5):
+            self.assertFalse(waiting_room.verify_admission(token, self.event.pk, self.first.pk))
+        self.assertTrue(waiting_room.verify_admission(token, self.event.pk, self.first.pk))
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class SalesStatsTests(TestCase):
+    """Deleting orders keeps the event's sales counters in step; archiving them does not change the counters"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='buyer@example.com', email='buyer@example.com', password='secret', phone='0200000000'
+        )
+        organizer = User.objects.create_user(
+            username='organizer@example.com', email='organizer@example.com', password='secret', phone='0200000001'
+        )
+        self.event = Event.objects.create(
+            title='Concert', description='Live', date='2020-01-01T20:00:00Z', price=50,
+            image='events/concert.jpg', location='Accra', organizer=organizer
+        )
+        self.pending = Order.objects.create(user=self.user, event=self.event, quantity=1, payment_method='bank')
+        self.approved = Order.objects.create(user=self.user, event=self.event, quantity=2, payment_method='bank')
+        transition_order(self.approved, 'approved')
+        self.approved.tickets.first().mark_as_used(gate='north')
+
+    def test_deleted_orders_leave_the_counters(self):
+        self.pending.delete()
+        self.assertEqual(verify_event_stats(), {})
+        self.assertEqual(EventSalesStats.objects.get(event=self.event).pending_count, 0)
+
+        Order.objects.filter(pk=self.approved.pk).delete()
+        self.assertEqual(verify_event_stats(), {})
+        stats = EventSalesStats.objects.get(event=self.event)
+        self.assertEqual((stats.approved_count, stats.revenue, stats.checked_in_count), (0, 0, 0))
+
+    def test_deleting_the_buyer_cascades_into_the_counters(self):
+        self.user.delete()
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(verify_event_stats(), {})
+
+    def test_archiving_keeps_the_counters(self):
+        Notification.objects.update(status='sent')
+        archive_event(self.event.pk)
+        self.assertEqual(verify_event_stats(), {})
+        self.assertEqual(EventSalesStats.objects.get(event=self.event).checked_in_count, 1)
+
+    def test_deleting_the_event_removes_its_counters(self):
+        Event.objects.filter(pk=self.event.pk).delete()
+        self.assertFalse(EventSalesStats.objects.exists())
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class SparseFieldsTests(TestCase):
+    """?fields= and ?expand= trim the response and the queries behind it, and leave it alone when absent"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='buyer@example.com', email='buyer@example.com', password='secret', phone='0200000000'
+        )
+        self.event = Event.objects.create(
+            title='Concert', description='Live', date='2030-01-01T20:00:00Z', price=50,
+            image='events/concert.jpg', location='Accra', organizer=self.user
+        )
+        self.order = transition_order(
+            Order.objects.create(user=self.user, event=self.event, quantity=2, payment_method='mobile_money'),
+            'approved'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = f'/api/orders/{self.order.pk}/'
+
+    def test_without_parameters_the_response_is_unchanged(self):
+        response = self.client.get(self.url)
+
+        expected = OrderSerializer(Order.objects.get(pk=self.order.pk), context={'request': response.wsgi_request})
+        self.assertEqual(response.json(), json.loads(JSONRenderer().render(expected.data)))
+
+    def test_fields_keep_exactly_the_listed_keys(self):
+        response = self.client.get(f'{self.url}?fields=order_id,status,total_amount,event.title')
+
+        self.assertEqual(response.json(), {
+            'order_id': self.order.order_id, 'status': 'approved', 'total_amount': '100.00',
+            'event': {'title': 'Concert'},
+        })
+        listed = self.client.get('/api/orders/list/?fields=order_id,tickets.ticket_id').json()
+        self.assertEqual(listed, [{
+            'order_id': self.order.order_id,
+            'tickets': [{'ticket_id': ticket_id} for ticket_id in self.order.tickets.values_list('ticket_id', flat=True)],
+        }])
+
+    def test_expand_collapses_unlisted_relations_to_ids(self):
+        data = self.client.get(f'{self.url}?expand=').json()
+        self.assertEqual(data['event'], self.event.pk)
+        self.assertEqual(data['user'], self.user.pk)
+        self.assertEqual(sorted(data['tickets']), sorted(str(pk) for pk in self.order.tickets.values_list('pk', flat=True)))
+
+        data = self.client.get(f'{self.url}?expand=event').json()
+        self.assertEqual(data['event']['title'], 'Concert')
+        self.assertEqual(data['user'], self.user.pk)
+
+    def test_unknown_fields_are_a_bad_request(self):
+        response = self.client.get('/api/orders/list/?fields=bogus')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'fields': ['Unknown field(s): bogus']})
+        response = self.client.get(f'{self.url}?fields=order_id,event.bogus')
+        self.assertEqual(response.json(), {'fields': ['Unknown field(s): event.bogus']})
+
+    def test_fewer_fields_mean_fewer_queries_and_columns(self):
+        # The conditional-GET check, the order with its event and user joined, and its tickets
+        with self.assertNumQueries(3), CaptureQueriesContext(connection) as full:
+            self.client.get(self.url)
+        with self.assertNumQueries(2), CaptureQueriesContext(connection) as sparse:
+            self.client.get(f'{self.url}?fields=order_id,status')
+
+        self.assertIn('JOIN "events_event"', full.captured_queries[1]['sql'])
+        order_query = sparse.captured_queries[1]['sql']
+        self.assertTrue(order_query.startswith(
+            'SELECT "orders_order"."id", "orders_order"."order_id", "orders_order"."status" FROM'
+        ), order_query)
+        self.assertNotIn('JOIN', order_query)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ConditionalGetTests(TestCase):
+    """An unchanged order answers revalidation with 304 from one query; a transition changes its ETag"""
+
+    def setUp(self):
+        user = User.objects.create_user(
+            username='buyer@example.com', email='buyer@example.com', password='secret', phone='0200000000'
+        )
+        event = Event.objects.create(
+            title='Concert', description='Live', date='2030-01-01T20:00:00Z', price=50,
+            image='events/concert.jpg', location='Accra', organizer=user
+        )
+        self.order = Order.objects.create(user=user, event=event, quantity=1, payment_method='mobile_money')
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+        self.url = f'/api/orders/{self.order.pk}/'
+
+    def test_unchanged_order_is_not_modified(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+
+        # Only the state row is read
+        with self.assertNumQueries(1):
+            revalidated = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(revalidated['ETag'], first['ETag'])
+        since = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(since.status_code, 304)
+
+    def test_etag_varies_with_the_fields_asked_for(self):
+        etag = self.client.get(self.url)['ETag']
+
+        sparse = self.client.get(f'{self.url}?fields=order_id', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(sparse.status_code, 200)
+        self.assertNotEqual(sparse['ETag'], etag)
+
+    def test_transition_changes_the_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        transition_order(self.order, 'approved')
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'approved')
+        self.assertNotEqual(response['ETag'], etag)
@@ -0,0 +1,130 @@
+"""
+Order status state machine.
+
+Every status change goes through ``transition_order``, which applies it as a
+single conditional UPDATE (``WHERE id = ... AND status = <status we read>``).
+Only the caller whose UPDATE matched a row runs the side effects (sales stats,
+ticket issuance, queued notifications), so two admins approving the same order
+at once issue its tickets exactly once and the loser gets a TransitionError.
+"""
+from django.db import transaction
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from events.seating import release_seats, seat_assignments
+from orders.models import Order
+from orders.stats import record_transition
+from notifications.outbox import enqueue_order_approved, enqueue_orders_approved
+
+# target status -> statuses it may be reached from
+TRANSITIONS = {
+    'approved': {'pending'},
+    'rejected': {'pending'},
+    'expired': {'pending'},
+}
+
+
+class TransitionError(Exception):
+    pass
+
+
+def can_transition(current_status, new_status):
+    return current_status in TRANSITIONS.get(new_status, ())
+
+
+def transition_order(order, new_status, notes=None):
+    """
+    Move ``order`` from the status it was read with to ``new_status``.
+
+    Raises TransitionError if the move is not allowed or another request
+    changed the order first. On success ``order`` is refreshed from the
+    database and returned.
+    """
+    observed_status = order.status
+    if not can_transition(observed_status, new_status):
+        raise TransitionError(f'Order is already {observed_status}')
+
+    now = timezone.now()
+    changes = {'status': new_status, 'updated_at': now}
+    if notes is not None:
+        changes['admin_notes'] = notes
+    if new_status == 'approved':
+        changes['payment_confirmed_at'] = Coalesce('payment_confirmed_at', now)
+    # A pending order's seats cannot change, so the ones we read are the ones to release
+    released = order.seats if new_status in Order.SEAT_RELEASING_STATUSES else []
+    if released:
+        changes['seats'] = []
+
+    with transaction.atomic():
+        won = Order.objects.filter(pk=order.pk, status=observed_status).update(**changes)
+        if not won:
+            current = Order.objects.filter(pk=order.pk).values_list('status', flat=True).first()
+            if current is None:
+                raise TransitionError('Order no longer exists')
+            raise TransitionError(f'Order is already {current}')
+
+        order.refresh_from_db()
+        record_transition(
+            order.event_id, observed_status, new_status,
+            amount=order.total_amount, quantity=order.quantity
+        )
+        release_seats(released)
+        if new_status == 'approved':
+            order.create_tickets()
+            enqueue_order_approved(order)
+    return order
+
+
+def bulk_transition(order_ids, new_status, notes=None):
+    """
+    Move many orders to ``new_status`` in one transaction.
+
+    Orders whose current status does not allow the move are skipped. Approved
+    orders get their tickets, on their held seats, with one bulk insert; their
+    QR codes are left for the ``generate_qr_codes`` command. Rejected and
+    expired orders release their seats. Returns the ids of the orders that moved.
+    """
+    from tickets.models import Ticket
+
+    sources = TRANSITIONS[new_status]
+    now = timezone.now()
+    changes = {'status': new_status, 'updated_at': now}
+    if notes is not None:
+        changes['admin_notes'] = notes
+    if new_status == 'approved':
+        changes['payment_confirmed_at'] = Coalesce('payment_confirmed_at', now)
+
+    with transaction.atomic():
+        # Locked rows cannot change status under us before the UPDATE below
+        rows = list(
+            Order.objects.select_for_update(of=('self',))
+            .filter(id__in=order_ids, status__in=sources)
+            .values_list('id', 'status', 'event_id', 'total_amount', 'quantity', 'seats')
+        )
+        moved = [row[0] for row in rows]
+        if not moved:
+            return []
+        if new_status in Order.SEAT_RELEASING_STATUSES:
+            changes['seats'] = []
+        Order.objects.filter(id__in=moved).update(**changes)
+
+        totals = {}
+        for _, old_status, event_id, amount, quantity, _ in rows:
+            count, amount_sum, quantity_sum = totals.get((event_id, old_status), (0, 0, 0))
+            totals[(event_id, old_status)] = (count + 1, amount_sum + amount, quantity_sum + quantity)
+        for (event_id, old_status), (count, amount, quantity) in totals.items():
+            record_transition(event_id, old_status, new_status, amount=amount, quantity=quantity, count=count)
+
+        if new_status in Order.SEAT_RELEASING_STATUSES:
+            release_seats([hold for *_, seats in rows for hold in seats])
+        if new_status == 'approved':
+            Ticket.objects.bulk_create([
+                Ticket(
+                    order_id=order_id, ticket_id=Ticket.generate_ticket_id(),
+                    seat_row_id=seat_row_id, seat_number=seat_number
+                )
+                for order_id, _, _, _, quantity, seats in rows
+                for seat_row_id, seat_number in seat_assignments(seats, quantity)
+            ], batch_size=1000)
+            enqueue_orders_approved(Order.objects.filter(id__in=moved).select_related('user'))
+    return moved
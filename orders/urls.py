@@ -11,10 +11,16 @@ urlpatterns = [
     path('orders/<uuid:order_id>/reject/', views.reject_order, name='order-reject'),
     path('orders/<str:order_id>/status/', views.OrderStatusView.as_view(), name='order-status'),
     path('orders/<str:order_id>/payment-status/', views.check_payment_status, name='check-payment-status'),
+    path('events/<int:event_id>/queue/', views.join_waiting_room, name='waiting-room-join'),
+    path('events/<int:event_id>/queue/status/', views.waiting_room_status, name='waiting-room-status'),
 
 
     # Admin-specific endpoints
     path('admin/orders/', views.AdminPendingOrdersView.as_view(), name='admin-pending-orders'),
+    path('admin/orders/batch-review/', views.batch_review_orders, name='admin-order-batch-review'),
+    path('admin/orders/export/<str:export_format>/', views.export_orders, name='admin-order-export'),
+    path('admin/events/sales/', views.AdminEventSalesStatsView.as_view(), name='admin-event-sales'),
+    path('admin/events/<int:event_id>/sales/', views.event_sales_stats, name='admin-event-sales-detail'),
 
     # Payment method endpoint
     path('payment-methods/', views.PaymentMethodListView.as_view(), name='payment-method-list'),
@@ -1,23 +1,43 @@
 from rest_framework import generics, status, permissions
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, authentication_classes, permission_classes, throttle_classes
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from django.shortcuts import get_object_or_404
+from django.http import Http404
 from django.utils import timezone
+from django.db import transaction
 from django.db.models import Q
+from django.utils.decorators import method_decorator
+from collections import defaultdict
+from functools import partial
 
 import logging
 
-from orders.models import Order
+from orders.models import ArchivedOrder, Order, EventSalesStats
 from payment.models import PaymentMethod
 from events.models import Event
+from events.cache import get_event
+from events.seating import SeatsUnavailable
+from payment.cache import active_payment_methods
 from users.models import User
 from tickets.models import Ticket
 from .serializers import (
     EventSerializer, OrderSerializer, OrderCreateSerializer,
-    OrderStatusUpdateSerializer, AdminOrderListSerializer, AdminOrderDetailSerializer
+    OrderStatusUpdateSerializer, AdminOrderListSerializer, AdminOrderDetailSerializer,
+    EventSalesStatsSerializer, BatchReviewSerializer
 )
 from payment.serializers import PaymentMethodSerializer  # Import PaymentMethodSerializer from payment.serializers
+from eticketing_backend.db_router import ReplicaReadMixin, pin_to_primary
+from eticketing_backend.conditional import conditional_get
+from eticketing_backend.fieldsets import SparseFieldsViewMixin, optimize_queryset, parse_sparse_params
+from orders.idempotency import do_not_store, idempotent
+from orders.transitions import TransitionError, bulk_transition, transition_order
+from eticketing_backend.throttling import OrderCreateThrottle
+from orders import waiting_room
+from orders.archive import find_order, order_state, user_orders
+from orders.exports import (
+    EXPORT_FORMATS, ORDER_EXPORT_COLUMNS, ExportFilterError, filter_export_queryset, stream_export
+)
 
 
 logger = logging.getLogger(__name__)
@@ -26,7 +46,9 @@ class OrderCreateView(generics.CreateAPIView):
     """Create a new order"""
     serializer_class = OrderCreateSerializer
     permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [OrderCreateThrottle]
 
+    @method_decorator(idempotent('order-create'))
     def create(self, request, *args, **kwargs):
         # Debug logging
         logger.info("=== ORDER CREATE REQUEST ===")
@@ -46,27 +68,51 @@ class OrderCreateView(generics.CreateAPIView):
                 'error': 'Invalid data',
                 'details': serializer.errors
             }, status=status.HTTP_400_BAD_REQUEST)
-        
+
+        # Checked against the validated event, so no spelling of event_id gets past the waiting room
+        event = serializer._event
+        admitted_position = None
+        if event.waiting_room_enabled:
+            admitted_position = waiting_room.use_admission(
+                request.headers.get(waiting_room.ADMISSION_HEADER), event.id, request.user.id
+            )
+            if admitted_position is None:
+                # Not replayed: the same request succeeds once the buyer is admitted
+                return do_not_store(Response({
+                    'error': 'This event has a waiting room. Join the queue and order with a fresh '
+                             f'admission token in the {waiting_room.ADMISSION_HEADER} header; '
+                             'each admission is good for one order.'
+                }, status=status.HTTP_403_FORBIDDEN))
+
         try:
             # Create order
             order = serializer.save(user=request.user)
+            pin_to_primary(request.user)
             logger.info(f"Order created successfully: {order.order_id}")
             
             # Return full order details
             response_serializer = OrderSerializer(order, context={'request': request})
             
             return Response(response_serializer.data, status=status.HTTP_201_CREATED)
+
+        except SeatsUnavailable as e:
+            if admitted_position is not None:
+                waiting_room.release_admission(event.id, admitted_position)
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
             
         except Exception as e:
+            if admitted_position is not None:
+                waiting_room.release_admission(event.id, admitted_position)
             logger.error(f"Error creating order: {str(e)}")
             logger.error(f"Error type: {type(e)}")
             import traceback
             logger.error(f"Traceback: {traceback.format_exc()}")
             
-            return Response({
+            # Not replayed: the failure may be transient (e.g. a locked database)
+            return do_not_store(Response({
                 'error': 'Failed to create order',
                 'details': str(e)
-            }, status=status.HTTP_400_BAD_REQUEST)
+            }, status=status.HTTP_400_BAD_REQUEST))
 
 # Also add a simple debug view to check what data is being received
 @api_view(['POST'])
@@ -108,25 +154,42 @@ def debug_order_data(request):
     })
 
 
-class OrderListView(generics.ListAPIView):
-    """List user's orders"""
+class OrderListView(ReplicaReadMixin, generics.ListAPIView):
+    """List user's orders; supports ?fields= and ?expand="""
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
-        orders = Order.objects.filter(user=request.user)
-        serializer = OrderSerializer(orders, many=True)
+        context = {'sparse': parse_sparse_params(request.query_params)}
+        plan = OrderSerializer(context=context)
+        # created_at orders the merge of live and archived orders
+        orders = user_orders(
+            request.user, prepare=lambda queryset: optimize_queryset(queryset, plan, also=['created_at'])
+        )
+        serializer = OrderSerializer(orders, many=True, context=context)
         return Response(serializer.data)
     
    
 
-class OrderDetailView(generics.RetrieveAPIView):
-    """Get order details"""
+class OrderDetailView(SparseFieldsViewMixin, generics.RetrieveAPIView):
+    """Get order details; supports ?fields=, ?expand= and conditional GET"""
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    def get(self, request, *args, **kwargs):
+        state = order_state(pk=kwargs['pk'], user=request.user)
+        return conditional_get(request, state, partial(super().get, request, *args, **kwargs))
+
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user)
+        return self.optimize_queryset(Order.objects.filter(user=self.request.user))
+
+    def get_object(self):
+        try:
+            return super().get_object()
+        except Http404:
+            return get_object_or_404(
+                self.optimize_queryset(ArchivedOrder.objects.filter(user=self.request.user)), pk=self.kwargs['pk']
+            )
 
 class OrderStatusUpdateView(generics.UpdateAPIView):
     """Update order status (for admins or payment confirmation)"""
@@ -152,7 +215,17 @@ class OrderStatusUpdateView(generics.UpdateAPIView):
         
         serializer = self.get_serializer(instance, data=request.data, partial=partial)
         serializer.is_valid(raise_exception=True)
-        self.perform_update(serializer)
+
+        new_status = serializer.validated_data.get('status', instance.status)
+        notes = serializer.validated_data.get('admin_notes')
+        if new_status != instance.status:
+            try:
+                transition_order(instance, new_status, notes=notes)
+            except TransitionError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        elif notes is not None:
+            instance.admin_notes = notes
+            instance.save(update_fields=['admin_notes', 'updated_at'])
         
         # Return full order details
         response_serializer = OrderSerializer(instance, context={'request': request})
@@ -171,6 +244,89 @@ class AdminPendingOrdersView(generics.ListAPIView):
         status_filter = self.request.query_params.get('status', 'pending')
         return Order.objects.filter(status=status_filter)
 
+class AdminEventSalesStatsView(generics.ListAPIView):
+    """Per-event revenue, order counts and check-ins for admin"""
+    serializer_class = EventSalesStatsSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        if not self.request.user.is_admin:
+            return EventSalesStats.objects.none()
+        return EventSalesStats.objects.select_related('event').order_by('-revenue')
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def event_sales_stats(request, event_id):
+    """Sales stats for one event (admin only)"""
+    if not request.user.is_admin:
+        return Response(
+            {'error': 'Admin access required'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+
+    stats = EventSalesStats.objects.select_related('event').filter(event_id=event_id).first()
+    if stats is None:
+        event = get_object_or_404(Event, id=event_id)
+        stats = EventSalesStats(event=event)
+    return Response(EventSalesStatsSerializer(stats).data)
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def join_waiting_room(request, event_id):
+    """Join an event's waiting room and get a queue token and position"""
+    event = get_event(event_id)
+    if event is None or not event.is_active:
+        return Response({'error': 'Event not found'}, status=status.HTTP_404_NOT_FOUND)
+    if not event.waiting_room_enabled:
+        return Response(
+            {'error': 'This event has no waiting room; order directly'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    return Response(waiting_room.join(event.id, request.user.id))
+
+@api_view(['GET'])
+@authentication_classes([])
+@permission_classes([permissions.AllowAny])
+@throttle_classes([])
+def waiting_room_status(request, event_id):
+    """Queue position for a queue token; answered from the cache without touching the database"""
+    token = request.headers.get('X-Queue-Token') or request.query_params.get('token')
+    if not token:
+        return Response({'error': 'Queue token required'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        result = waiting_room.status(token)
+    except waiting_room.InvalidToken as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    if result['event_id'] != event_id:
+        return Response({'error': 'Queue token is for another event'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(result)
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def export_orders(request, export_format):
+    """Stream orders as CSV or NDJSON, filtered by event, status and created_at range (admin only)"""
+    if not request.user.is_admin:
+        return Response(
+            {'error': 'Admin access required'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    if export_format not in EXPORT_FORMATS:
+        return Response(
+            {'error': f'Format must be one of: {", ".join(EXPORT_FORMATS)}'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    try:
+        orders = [
+            filter_export_queryset(
+                model.objects.all(), request.query_params, event_field='event_id', status_field='status'
+            )
+            for model in (ArchivedOrder, Order)
+        ]
+    except ExportFilterError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return stream_export(orders, ORDER_EXPORT_COLUMNS, export_format, 'orders')
+
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def approve_order(request, order_id):
@@ -183,16 +339,10 @@ def approve_order(request, order_id):
     
     order = get_object_or_404(Order, id=order_id)
     
-    if order.status != 'pending':
-        return Response(
-            {'error': f'Order is already {order.status}'},
-            status=status.HTTP_400_BAD_REQUEST
-        )
-    
-    # Update order status
-    order.status = 'approved'
-    order.admin_notes = request.data.get('notes', '')
-    order.save()
+    try:
+        transition_order(order, 'approved', notes=request.data.get('notes', ''))
+    except TransitionError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     
     # Return updated order
     serializer = AdminOrderDetailSerializer(order, context={'request': request})
@@ -213,16 +363,10 @@ def reject_order(request, order_id):
     
     order = get_object_or_404(Order, id=order_id)
     
-    if order.status != 'pending':
-        return Response(
-            {'error': f'Order is already {order.status}'},
-            status=status.HTTP_400_BAD_REQUEST
-        )
-    
-    # Update order status
-    order.status = 'rejected'
-    order.admin_notes = request.data.get('notes', 'Order rejected by admin')
-    order.save()
+    try:
+        transition_order(order, 'rejected', notes=request.data.get('notes', 'Order rejected by admin'))
+    except TransitionError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     
     # Return updated order
     serializer = AdminOrderDetailSerializer(order, context={'request': request})
@@ -231,16 +375,90 @@ def reject_order(request, order_id):
         'order': serializer.data
     })
 
+BATCH_REVIEW_CHUNK_SIZE = 50
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def batch_review_orders(request):
+    """Approve or reject up to 500 orders in one call (admin only); QR codes come from generate_qr_codes"""
+    if not request.user.is_admin:
+        return Response(
+            {'error': 'Admin access required'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+
+    serializer = BatchReviewSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response({
+            'error': 'Invalid data',
+            'details': serializer.errors
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    decision = serializer.validated_data['decision']
+    default_notes = '' if decision == 'approved' else 'Order rejected by admin'
+    items = serializer.validated_data['orders']
+
+    results = []
+    for start in range(0, len(items), BATCH_REVIEW_CHUNK_SIZE):
+        chunk = items[start:start + BATCH_REVIEW_CHUNK_SIZE]
+        order_ids = dict(Order.objects.filter(id__in=[item['id'] for item in chunk]).values_list('id', 'order_id'))
+        by_notes = defaultdict(list)
+        for item in chunk:
+            if item['id'] in order_ids:
+                by_notes[item.get('notes', default_notes)].append(item['id'])
+
+        # One bulk transition per distinct note: tickets are bulk inserted and their
+        # QR codes left to generate_qr_codes, so no files are written in the transaction
+        moved, errors = set(), {}
+        for notes, ids in by_notes.items():
+            try:
+                moved.update(bulk_transition(ids, decision, notes=notes))
+            except Exception:
+                logger.exception(f"Batch {decision} failed for {len(ids)} orders")
+                errors.update(dict.fromkeys(ids, 'Could not update this order'))
+
+        # Report what the database holds now, not the status the orders were read with
+        current = dict(Order.objects.filter(id__in=list(order_ids)).values_list('id', 'status'))
+        for item in chunk:
+            order_pk = item['id']
+            if order_pk not in order_ids:
+                results.append({'id': order_pk, 'success': False, 'error': 'Order not found'})
+                continue
+            result = {'id': order_pk, 'order_id': order_ids[order_pk], 'status': current.get(order_pk)}
+            if order_pk in moved:
+                result['success'] = True
+            else:
+                result['success'] = False
+                if order_pk in errors:
+                    result['error'] = errors[order_pk]
+                elif result['status'] is None:
+                    result['error'] = 'Order no longer exists'
+                else:
+                    result['error'] = f"Order is already {result['status']}"
+            results.append(result)
+
+    succeeded = sum(1 for result in results if result['success'])
+    logger.info(f"Batch {decision} by {request.user}: {succeeded} of {len(results)} orders")
+    return Response({
+        'decision': decision,
+        'succeeded': succeeded,
+        'failed': len(results) - succeeded,
+        'results': results,
+    })
+
 # Additional utility views
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def check_payment_status(request, order_id):
-    """Check payment status for an order"""
+    """Check payment status for an order; answers unchanged orders with 304"""
+    lookup = {'order_id': order_id}
+    if not request.user.is_admin:
+        lookup['user'] = request.user
+    return conditional_get(request, order_state(**lookup), partial(_payment_status_response, request, lookup))
+
+def _payment_status_response(request, lookup):
     try:
-        if request.user.is_admin:
-            order = Order.objects.get(order_id=order_id)
-        else:
-            order = Order.objects.get(order_id=order_id, user=request.user)
+        order = find_order(**lookup)
         
         serializer = OrderSerializer(order, context={'request': request})
         return Response({
@@ -249,7 +467,8 @@ def check_payment_status(request, order_id):
             'message': {
                 'pending': 'Payment is being processed',
                 'approved': 'Payment confirmed and tickets generated',
-                'rejected': 'Payment was rejected'
+                'rejected': 'Payment was rejected',
+                'expired': 'Order expired before payment was confirmed'
             }.get(order.status, 'Unknown status')
         })
         
@@ -260,15 +479,18 @@ def check_payment_status(request, order_id):
         )
 
 class OrderStatusView(APIView):
-    """Get order status by order ID"""
+    """Get order status by order ID; answers unchanged orders with 304"""
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request, order_id):
+        lookup = {'order_id': order_id}
+        if not request.user.is_admin:
+            lookup['user'] = request.user
+        return conditional_get(request, order_state(**lookup), partial(self.render_status, lookup))
+
+    def render_status(self, lookup):
         try:
-            if request.user.is_admin:
-                order = Order.objects.get(order_id=order_id)
-            else:
-                order = Order.objects.get(order_id=order_id, user=request.user)
+            order = find_order(**lookup)
             
             return Response({
                 'order_id': order.order_id,
@@ -284,12 +506,14 @@ class OrderStatusView(APIView):
                 status=status.HTTP_404_NOT_FOUND
             )
 
-class PaymentMethodListView(generics.ListAPIView):
+class PaymentMethodListView(ReplicaReadMixin, generics.ListAPIView):
     """List available payment methods"""
-    queryset = PaymentMethod.objects.filter(is_active=True)
     serializer_class = PaymentMethodSerializer
     permission_classes = [permissions.AllowAny]
 
+    def get_queryset(self):
+        return active_payment_methods()
+
 
 from rest_framework.views import APIView
 from rest_framework.response import Response
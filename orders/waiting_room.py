@@ -0,0 +1,142 @@
+"""
+Virtual waiting room for high-demand on-sales.
+
+For events with ``waiting_room_enabled``, a buyer first joins the event's
+queue and gets a signed queue token carrying their position. Positions are
+handed out by an atomic counter in the cache and admission is a function of
+time: ``WAITING_ROOM_BURST`` positions are admitted when the queue opens and
+then ``WAITING_ROOM_ADMIT_PER_MINUTE`` more every minute. Checking the queue
+therefore needs no database and no per-user state beyond the token: one cache
+read for the opening time. Once admitted, the buyer gets a short-lived signed
+admission token that OrderCreateView requires in the X-Admission-Token header.
+An admission is good for one order: placing it uses up the buyer's queue
+position, and joining again puts them at the back of the queue.
+
+Counters live in the 'waiting_room' cache, which must be shared (memcached,
+redis) and support atomic incr when several workers serve the queue.
+"""
+import math
+import time
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import caches
+
+QUEUE_SALT = 'orders.waiting_room.queue'
+ADMISSION_SALT = 'orders.waiting_room.admission'
+ADMISSION_HEADER = 'X-Admission-Token'
+MIN_POLL_SECONDS = 2
+MAX_POLL_SECONDS = 60
+
+
+class InvalidToken(Exception):
+    pass
+
+
+def _cache():
+    return caches['waiting_room']
+
+
+def _key(event_id, name):
+    return f'waiting-room:{event_id}:{name}'
+
+
+def admitted_through(event_id, now=None):
+    """Highest queue position admitted at ``now``"""
+    now = time.time() if now is None else now
+    elapsed = max(0.0, now - _cache().get(_key(event_id, 'opened'), now))
+    return settings.WAITING_ROOM_BURST + int(elapsed * settings.WAITING_ROOM_ADMIT_PER_MINUTE / 60)
+
+
+def join(event_id, user_id, now=None):
+    """Give the user a place in the queue (the same one if they already joined)"""
+    now = time.time() if now is None else now
+    cache = _cache()
+    # The first buyer to join opens the queue
+    cache.add(_key(event_id, 'opened'), now)
+
+    user_key = _key(event_id, f'user:{user_id}')
+    position = cache.get(user_key)
+    if position is not None and cache.get(_key(event_id, f'used:{position}')):
+        # Their admission bought an order; queue again for another
+        cache.delete(user_key)
+        position = None
+    if position is None:
+        cache.add(_key(event_id, 'joined'), 0)
+        position = cache.incr(_key(event_id, 'joined'))
+        if not cache.add(user_key, position):
+            # Another request from the same user won the race; keep its place
+            position = cache.get(user_key, position)
+
+    token = signing.dumps({'e': event_id, 'u': user_id, 'p': position}, salt=QUEUE_SALT)
+    return status(token, now=now)
+
+
+def status(queue_token, now=None):
+    """Current standing for a queue token, with an admission token once admitted"""
+    now = time.time() if now is None else now
+    try:
+        data = signing.loads(queue_token, salt=QUEUE_SALT)
+    except signing.BadSignature:
+        raise InvalidToken('Invalid queue token')
+
+    event_id, position = data['e'], data['p']
+    admitted_through_position = admitted_through(event_id, now)
+    result = {
+        'event_id': event_id,
+        'position': position,
+        'queue_token': queue_token,
+        'admitted': position <= admitted_through_position,
+    }
+    if result['admitted']:
+        result['admission_token'] = signing.dumps(
+            {'e': event_id, 'u': data['u'], 'p': position}, salt=ADMISSION_SALT
+        )
+    else:
+        ahead = position - admitted_through_position
+        result['ahead'] = ahead
+        result['estimated_wait_seconds'] = wait = math.ceil(ahead * 60 / settings.WAITING_ROOM_ADMIT_PER_MINUTE)
+        # Buyers far back poll rarely, so status traffic stays low while the queue is long
+        result['poll_after_seconds'] = min(MAX_POLL_SECONDS, max(MIN_POLL_SECONDS, wait // 2))
+    return result
+
+
+def _admitted_position(admission_token, event_id, user_id):
+    try:
+        data = signing.loads(
+            admission_token or '', salt=ADMISSION_SALT, max_age=settings.WAITING_ROOM_ADMISSION_SECONDS
+        )
+    except signing.BadSignature:
+        return None
+    return data['p'] if data['e'] == event_id and data['u'] == user_id else None
+
+
+def verify_admission(admission_token, event_id, user_id):
+    """True if the admission token was issued to this user for this event and is still fresh"""
+    return _admitted_position(admission_token, event_id, user_id) is not None
+
+
+def use_admission(admission_token, event_id, user_id):
+    """
+    Take the admission for one order, returning the queue position it used
+    or None if the token is invalid, stale or already used.
+    """
+    position = _admitted_position(admission_token, event_id, user_id)
+    if position is None:
+        return None
+    # The queue token keeps minting admission tokens for this position, so the mark must outlive them
+    if not _cache().add(_key(event_id, f'used:{position}'), user_id, timeout=None):
+        return None
+    return position
+
+
+def release_admission(event_id, position):
+    """Give back an admission whose order could not be placed"""
+    _cache().delete(_key(event_id, f'used:{position}'))
+
+
+def clear(event_id, user_ids=()):
+    """Forget an event's queue (counters, opening time and the given users' places)"""
+    keys = [_key(event_id, 'opened'), _key(event_id, 'joined')]
+    keys += [_key(event_id, f'user:{user_id}') for user_id in user_ids]
+    _cache().delete_many(keys)
@@ -0,0 +1,11 @@
+from eticketing_backend.refcache import ReferenceCache
+from .models import PaymentMethod
+
+payment_method_cache = ReferenceCache('payment-methods', [PaymentMethod], maxsize=1)
+
+
+def active_payment_methods():
+    """Active payment methods from the reference cache (shared list: do not modify)"""
+    return payment_method_cache.get_or_load(
+        'active', lambda: list(PaymentMethod.objects.filter(is_active=True).order_by('created_at'))
+    )
@@ -0,0 +1,61 @@
+import csv
+import time
+from datetime import timedelta
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from payment.reconciliation import approve_matches, read_statement, reconcile
+
+
+class Command(BaseCommand):
+    help = 'Match a CSV payment statement to pending orders and approve exact matches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV statement with amount, date and transaction_id/reference columns')
+        parser.add_argument(
+            '--window-hours', type=int, default=72,
+            help='How long after an order was placed a payment may arrive'
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Report matches without approving')
+        parser.add_argument('--report', help='Write the outcome of every statement row to this CSV file')
+        parser.add_argument(
+            '--skip-qr', action='store_true',
+            help='Do not render QR codes for the newly issued tickets afterwards'
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        try:
+            with open(options['path'], encoding='utf-8-sig', newline='') as stream:
+                rows, invalid = read_statement(stream)
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        result = reconcile(rows, window=timedelta(hours=options['window_hours']))
+        result.outcomes = invalid + result.outcomes
+        matched_in = time.monotonic() - started
+
+        for outcome, count in sorted(result.summary.items()):
+            self.stdout.write(f'{outcome}: {count}')
+        self.stdout.write(f'Reconciled {len(rows) + len(invalid)} statement rows in {matched_in:.2f}s')
+
+        if options['report']:
+            with open(options['report'], 'w', newline='') as report:
+                writer = csv.writer(report)
+                writer.writerow(['line', 'outcome', 'transaction_id', 'order_id', 'detail'])
+                for outcome in sorted(result.outcomes, key=lambda o: o.line):
+                    writer.writerow([
+                        outcome.line, outcome.outcome, outcome.transaction_id, outcome.order_id, outcome.detail
+                    ])
+
+        if options['dry_run']:
+            self.stdout.write(f'Dry run: {len(result.matched_order_ids)} orders would be approved')
+            return
+
+        approved = approve_matches(result)
+        self.stdout.write(self.style.SUCCESS(
+            f'Approved {approved} orders in {time.monotonic() - started:.2f}s total'
+        ))
+        if approved and not options['skip_qr']:
+            call_command('generate_qr_codes', stdout=self.stdout, stderr=self.stderr)
@@ -1,5 +1,6 @@
 # payment/models.py
 from django.db import models
+from eticketing_backend.refcache import ReferenceQuerySet
 import uuid
 from users.models import User
 
@@ -21,6 +22,9 @@ class PaymentMethod(models.Model):
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Bulk updates invalidate the reference cache (see eticketing_backend.refcache)
+    objects = ReferenceQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.get_type_display()} - {self.name}"
 
@@ -35,4 +39,18 @@ class PaymentConfirmation(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
-        return f"Payment confirmation for {self.order.order_id}"
\ No newline at end of file
+        return f"Payment confirmation for {self.order.order_id}"
+
+class ArchivedPaymentConfirmation(models.Model):
+    """The payment confirmation of an ArchivedOrder, moved out of PaymentConfirmation by orders.archive"""
+    id = models.UUIDField(primary_key=True, editable=False)
+    order = models.OneToOneField('orders.ArchivedOrder', on_delete=models.CASCADE, related_name='payment_confirmation')
+    confirmed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    transaction_id = models.CharField(max_length=50, blank=True, null=True)
+    payment_screenshot = models.ImageField(upload_to='payment_confirmations/', blank=True, null=True)
+    confirmation_notes = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Payment confirmation for {self.order.order_id} (archived)"
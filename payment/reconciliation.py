@@ -0,0 +1,271 @@
+"""
+Bank / mobile-money statement reconciliation.
+
+Pending orders are loaded once into in-memory hash indexes (transaction id,
+payment reference or order id, and amount), and every statement row is
+matched with dictionary lookups, so a statement of 100k rows against 100k
+pending orders reconciles in seconds.
+
+A row is an exact match when its transaction id (or, failing that, its
+reference) points at exactly one pending order with the same amount, paid
+within the time window after the order was placed, and no other statement
+row claims that order. Statements that only carry dates count a row as paid
+at some time during that day. A transaction id that already paid an approved order
+placed within the statement's time window is reported as a duplicate rather
+than matched again. Exact matches can be approved in bulk; everything else
+is reported for manual review.
+"""
+import csv
+from bisect import bisect_left, bisect_right
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, time, timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from orders.models import Order
+from orders.transitions import bulk_transition
+
+# Accepted header names for each statement column
+COLUMN_ALIASES = {
+    'transaction_id': ('transaction_id', 'transaction id', 'txn_id', 'transaction'),
+    'reference': ('reference', 'payment_reference', 'narration', 'description'),
+    'amount': ('amount', 'credit', 'value'),
+    'date': ('date', 'transaction_date', 'value_date', 'paid_at'),
+}
+
+EXACT = 'matched'
+PROBABLE = 'probable'
+AMBIGUOUS = 'ambiguous'
+DUPLICATE = 'duplicate_transaction'
+AMOUNT_MISMATCH = 'amount_mismatch'
+OUT_OF_WINDOW = 'outside_time_window'
+UNMATCHED = 'unmatched'
+INVALID = 'invalid'
+
+# Payments stamped slightly before the order (clock skew) still count
+CLOCK_SKEW = timedelta(minutes=5)
+
+
+@dataclass
+class StatementRow:
+    line: int
+    transaction_id: str
+    reference: str
+    amount: Decimal
+    paid_at: datetime
+    # Latest moment the payment can have happened: paid_at itself, or the end of the day for date-only rows
+    paid_until: datetime
+
+
+@dataclass
+class PendingOrder:
+    id: object
+    order_id: str
+    total_amount: Decimal
+    created_at: datetime
+
+
+@dataclass
+class RowOutcome:
+    line: int
+    outcome: str
+    transaction_id: str = ''
+    order_id: str = ''
+    detail: str = ''
+
+
+@dataclass
+class ReconciliationResult:
+    outcomes: list = field(default_factory=list)
+    matched_order_ids: list = field(default_factory=list)
+
+    @property
+    def summary(self):
+        return Counter(outcome.outcome for outcome in self.outcomes)
+
+
+def _normalize(value):
+    return (value or '').strip().upper()
+
+
+def _parse_paid_at(value):
+    """Return the (earliest, latest) moment of a payment: one instant, or the whole day for a bare date"""
+    # Before parse_datetime, which reads a bare date as midnight
+    day = parse_date(value)
+    if day is not None:
+        start = timezone.make_aware(datetime.combine(day, time.min))
+        return start, timezone.make_aware(datetime.combine(day, time.max))
+    moment = parse_datetime(value)
+    if moment is None:
+        raise ValueError(f'invalid date {value!r}')
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment, moment
+
+
+def read_statement(stream):
+    """Parse a CSV statement, returning (rows, invalid outcomes)"""
+    reader = csv.DictReader(stream)
+    headers = {name.strip().lower(): name for name in reader.fieldnames or []}
+    columns = {}
+    for column, aliases in COLUMN_ALIASES.items():
+        columns[column] = next((headers[alias] for alias in aliases if alias in headers), None)
+    missing = [column for column in ('amount', 'date') if columns[column] is None]
+    if missing:
+        raise ValueError(f"Statement is missing column(s): {', '.join(missing)}")
+    if columns['transaction_id'] is None and columns['reference'] is None:
+        raise ValueError('Statement needs a transaction_id or reference column')
+
+    rows, invalid = [], []
+    for line, record in enumerate(reader, start=2):
+        try:
+            amount = Decimal(record[columns['amount']].replace(',', '').strip())
+            paid_at, paid_until = _parse_paid_at(record[columns['date']].strip())
+        except (InvalidOperation, ValueError, AttributeError) as e:
+            invalid.append(RowOutcome(line, INVALID, detail=str(e)))
+            continue
+        rows.append(StatementRow(
+            line=line,
+            transaction_id=_normalize(record.get(columns['transaction_id'])) if columns['transaction_id'] else '',
+            reference=_normalize(record.get(columns['reference'])) if columns['reference'] else '',
+            amount=amount,
+            paid_at=paid_at,
+            paid_until=paid_until,
+        ))
+    return rows, invalid
+
+
+class AmountIndex:
+    """Pending orders per amount, sorted by created_at for window lookups"""
+
+    def __init__(self):
+        self._orders = defaultdict(list)
+        self._times = {}
+
+    def add(self, order):
+        self._orders[order.total_amount].append(order)
+
+    def freeze(self):
+        for amount, orders in self._orders.items():
+            orders.sort(key=lambda order: order.created_at)
+            self._times[amount] = [order.created_at for order in orders]
+
+    def placed_between(self, amount, earliest, latest):
+        """Return (how many orders, the first order) placed in [earliest, latest]"""
+        times = self._times.get(amount)
+        if not times:
+            return 0, None
+        start, end = bisect_left(times, earliest), bisect_right(times, latest)
+        return end - start, self._orders[amount][start] if end > start else None
+
+
+def load_settled_transactions(since):
+    """Normalized transaction id -> order_id of approved orders placed since ``since``"""
+    approved = Order.objects.filter(
+        status='approved', created_at__gte=since, payment_confirmation__transaction_id__gt=''
+    ).order_by().values_list('payment_confirmation__transaction_id', 'order_id')
+    return {_normalize(transaction_id): order_id for transaction_id, order_id in approved.iterator(chunk_size=5000)}
+
+
+def load_pending_orders():
+    """Build the transaction id, reference and amount indexes with one query"""
+    by_transaction, by_reference, by_amount = defaultdict(list), defaultdict(list), AmountIndex()
+    pending = Order.objects.filter(status='pending').order_by().values_list(
+        'id', 'order_id', 'total_amount', 'created_at',
+        'payment_reference', 'payment_confirmation__transaction_id'
+    )
+    for pk, order_id, total_amount, created_at, reference, transaction_id in pending.iterator(chunk_size=5000):
+        order = PendingOrder(pk, order_id, total_amount, created_at)
+        if transaction_id:
+            by_transaction[_normalize(transaction_id)].append(order)
+        by_reference[_normalize(order_id)].append(order)
+        if reference and _normalize(reference) != _normalize(order_id):
+            by_reference[_normalize(reference)].append(order)
+        by_amount.add(order)
+    by_amount.freeze()
+    return by_transaction, by_reference, by_amount
+
+
+def reconcile(rows, window=timedelta(days=3)):
+    """Match statement rows to pending orders; approves nothing"""
+    by_transaction, by_reference, by_amount = load_pending_orders()
+    statement_transactions = Counter(row.transaction_id for row in rows if row.transaction_id)
+    settled = load_settled_transactions(min(row.paid_at for row in rows) - window) if statement_transactions else {}
+
+    def in_window(order, row):
+        # Any moment the row may have been paid at counts
+        return order.created_at - CLOCK_SKEW <= row.paid_until and row.paid_at <= order.created_at + window
+
+    outcomes, claims = [], defaultdict(list)
+    for row in rows:
+        outcome = RowOutcome(row.line, UNMATCHED, transaction_id=row.transaction_id)
+        outcomes.append(outcome)
+
+        if row.transaction_id and statement_transactions[row.transaction_id] > 1:
+            outcome.outcome = DUPLICATE
+            outcome.detail = f'transaction id appears {statement_transactions[row.transaction_id]} times in the statement'
+            continue
+        if row.transaction_id in settled:
+            outcome.outcome = DUPLICATE
+            outcome.order_id = settled[row.transaction_id]
+            outcome.detail = 'transaction id already paid this approved order'
+            continue
+
+        candidates, key = [], ''
+        if row.transaction_id and row.transaction_id in by_transaction:
+            candidates, key = by_transaction[row.transaction_id], 'transaction id'
+        elif row.reference and row.reference in by_reference:
+            candidates, key = by_reference[row.reference], 'reference'
+
+        if candidates:
+            if len(candidates) > 1:
+                outcome.outcome = AMBIGUOUS
+                outcome.detail = f'{key} matches {len(candidates)} pending orders'
+                continue
+            order = candidates[0]
+            outcome.order_id = order.order_id
+            if order.total_amount != row.amount:
+                outcome.outcome = AMOUNT_MISMATCH
+                outcome.detail = f'order total {order.total_amount}, statement amount {row.amount}'
+            elif not in_window(order, row):
+                outcome.outcome = OUT_OF_WINDOW
+                paid = f'{row.paid_at:%Y-%m-%d}' if row.paid_until > row.paid_at else f'{row.paid_at:%Y-%m-%d %H:%M}'
+                outcome.detail = f'paid {paid}, ordered {order.created_at:%Y-%m-%d %H:%M}'
+            else:
+                outcome.outcome = EXACT
+                outcome.detail = f'matched on {key}'
+                claims[order.id].append((outcome, order))
+            continue
+
+        # No identifier matched: fall back to amount and time, for review only
+        nearby, first = by_amount.placed_between(row.amount, row.paid_at - window, row.paid_until + CLOCK_SKEW)
+        if nearby == 1:
+            outcome.outcome = PROBABLE
+            outcome.order_id = first.order_id
+            outcome.detail = 'same amount within the time window'
+        elif nearby:
+            outcome.outcome = AMBIGUOUS
+            outcome.detail = f'{nearby} pending orders with this amount in the time window'
+
+    result = ReconciliationResult(outcomes=outcomes)
+    for order_id, order_claims in claims.items():
+        if len(order_claims) > 1:
+            for outcome, _ in order_claims:
+                outcome.outcome = AMBIGUOUS
+                outcome.detail = f'{len(order_claims)} statement rows match this order'
+        else:
+            result.matched_order_ids.append(order_id)
+    return result
+
+
+def approve_matches(result, chunk_size=500):
+    """Approve every exactly matched order, returning how many moved to approved"""
+    notes = 'Auto-approved by statement reconciliation'
+    approved = 0
+    ids = result.matched_order_ids
+    for start in range(0, len(ids), chunk_size):
+        approved += len(bulk_transition(ids[start:start + chunk_size], 'approved', notes=notes))
+    return approved
@@ -1,3 +1,76 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from events.models import Event
+from orders.models import Order
+from orders.transitions import transition_order
+from payment.models import PaymentConfirmation
+from payment.reconciliation import DUPLICATE, EXACT, OUT_OF_WINDOW, PROBABLE, read_statement, reconcile
+from users.models import User
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ReconciliationTests(TestCase):
+    """Statement rows match pending orders once, and never re-match a transaction that already paid"""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        user = User.objects.create_user(
+            username='buyer@example.com', email='buyer@example.com', password='secret', phone='0200000000'
+        )
+        event = Event.objects.create(
+            title='Concert', description='Live', date='2030-01-01T20:00:00Z', price=50,
+            image='events/concert.jpg', location='Accra', organizer=user
+        )
+        self.paid = Order.objects.create(user=user, event=event, quantity=1, payment_method='mobile_money')
+        PaymentConfirmation.objects.create(order=self.paid, transaction_id='tx-paid')
+        transition_order(self.paid, 'approved')
+        self.pending = Order.objects.create(user=user, event=event, quantity=1, payment_method='mobile_money')
+        PaymentConfirmation.objects.create(order=self.pending, transaction_id='TX-NEW')
+
+    def _reconcile(self, *lines, paid_at=None):
+        paid_at = paid_at or (timezone.now() + timedelta(minutes=1)).isoformat()
+        rows, invalid = read_statement(StringIO(
+            'transaction_id,amount,date\n' + ''.join(f'{line},{paid_at}\n' for line in lines)
+        ))
+        self.assertEqual(invalid, [])
+        return reconcile(rows)
+
+    def test_pending_order_matches_on_its_transaction_id(self):
+        result = self._reconcile('TX-NEW,50.00')
+
+        self.assertEqual(result.outcomes[0].outcome, EXACT)
+        self.assertEqual(result.matched_order_ids, [self.pending.pk])
+
+    def test_transaction_of_an_approved_order_is_a_duplicate(self):
+        # Same amount as the pending order, so without the check it would be matched to it by amount
+        result = self._reconcile('TX-PAID,50.00')
+
+        self.assertEqual(result.outcomes[0].outcome, DUPLICATE)
+        self.assertEqual(result.outcomes[0].order_id, self.paid.order_id)
+        self.assertEqual(result.matched_order_ids, [])
+
+    def test_date_only_rows_match_orders_placed_that_day(self):
+        # Bank statements often carry only the day; the order was placed later that same day
+        Order.objects.filter(pk=self.pending.pk).update(created_at=timezone.now().replace(hour=20, minute=34))
+        today = timezone.localdate().isoformat()
+
+        result = self._reconcile('TX-NEW,50.00', paid_at=today)
+        self.assertEqual(result.outcomes[0].outcome, EXACT, result.outcomes[0].detail)
+
+        result = self._reconcile('TX-UNKNOWN,50.00', paid_at=today)
+        self.assertEqual((result.outcomes[0].outcome, result.outcomes[0].order_id), (PROBABLE, self.pending.order_id))
+
+        result = self._reconcile('TX-NEW,50.00', paid_at=(timezone.localdate() - timedelta(days=1)).isoformat())
+        self.assertEqual(result.outcomes[0].outcome, OUT_OF_WINDOW)
@@ -4,25 +4,37 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
+from .cache import active_payment_methods
 from .models import PaymentMethod, PaymentConfirmation
 from .serializers import PaymentMethodSerializer, PaymentConfirmationSerializer
 from orders.models import Order
+from eticketing_backend.db_router import ReplicaReadMixin, pin_to_primary
+from orders.idempotency import idempotent
+from orders.transitions import TransitionError, transition_order
 import logging
 
 logger = logging.getLogger(__name__)
 
-class PaymentMethodListView(generics.ListAPIView):
+class PaymentMethodListView(ReplicaReadMixin, generics.ListAPIView):
     """List available payment methods"""
-    queryset = PaymentMethod.objects.filter(is_active=True)
     serializer_class = PaymentMethodSerializer
     permission_classes = [permissions.AllowAny]
 
+    def get_queryset(self):
+        return active_payment_methods()
+
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
+@idempotent('payment-submit')
 def submit_payment_confirmation(request, order_id):
     """Submit transaction ID and payment screenshot for an order"""
     try:
         order = get_object_or_404(Order, order_id=order_id, user=request.user)
+        if order.status == 'expired':
+            return Response(
+                {'error': 'Order has expired, please place a new order'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         payment_confirmation, created = PaymentConfirmation.objects.get_or_create(order=order)
         
         # Update fields
@@ -34,6 +46,7 @@ def submit_payment_confirmation(request, order_id):
         )
         if serializer.is_valid():
             serializer.save()
+            pin_to_primary(request.user)
             logger.info(f"Payment confirmation submitted for order {order_id} by user {request.user.email}")
             return Response({
                 'message': 'Payment confirmation submitted successfully',
@@ -59,18 +72,20 @@ def review_payment_confirmation(request, order_id):
         order = get_object_or_404(Order, order_id=order_id)
         payment_confirmation = get_object_or_404(PaymentConfirmation, order=order)
         data = request.data
-        status = data.get('status')
+        new_status = data.get('status')
         confirmation_notes = data.get('confirmation_notes')
 
-        if status not in ['approved', 'rejected']:
+        if new_status not in ['approved', 'rejected']:
             return Response(
                 {'error': 'Status must be "approved" or "rejected"'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
         # Update order status
-        order.status = status
-        order.save()
+        try:
+            transition_order(order, new_status)
+        except TransitionError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
         # Update payment confirmation
         payment_confirmation.confirmed_by = request.user
@@ -78,9 +93,9 @@ def review_payment_confirmation(request, order_id):
         payment_confirmation.updated_at = timezone.now()
         payment_confirmation.save()
 
-        logger.info(f"Payment confirmation for order {order_id} {status} by admin {request.user.email}")
+        logger.info(f"Payment confirmation for order {order_id} {new_status} by admin {request.user.email}")
         return Response({
-            'message': f'Payment confirmation {status} successfully',
+            'message': f'Payment confirmation {new_status} successfully',
             'payment_confirmation': PaymentConfirmationSerializer(payment_confirmation, context={'request': request}).data
         }, status=status.HTTP_200_OK)
     except Order.DoesNotExist:
@@ -1,8 +1,42 @@
 from django.contrib import admin
-from .models import Ticket
+from .models import ArchivedTicket, Ticket
+from eticketing_backend.paginators import ApproximateCountPaginator
+from orders.exports import TICKET_EXPORT_COLUMNS, stream_export
 
 @admin.register(Ticket)
 class TicketAdmin(admin.ModelAdmin):
     list_display = ['ticket_id', 'order', 'created_at', 'is_used']
     list_filter = ['created_at', 'is_used']
-    readonly_fields = ['created_at']
\ No newline at end of file
+    # The order column renders Order.__str__, which needs the user and event
+    list_select_related = ['order__user', 'order__event']
+    search_fields = ['ticket_id']
+    readonly_fields = ['created_at']
+    raw_id_fields = ['order']
+    ordering = ['-created_at']
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
+    actions = ['export_csv']
+
+    def export_csv(self, request, queryset):
+        return stream_export(queryset, TICKET_EXPORT_COLUMNS, 'csv', 'tickets')
+    export_csv.short_description = "Export selected tickets as CSV"
+
+
+@admin.register(ArchivedTicket)
+class ArchivedTicketAdmin(admin.ModelAdmin):
+    list_display = ['ticket_id', 'order', 'created_at', 'is_used']
+    list_filter = ['is_used']
+    list_select_related = ['order__user', 'order__event']
+    search_fields = ['ticket_id']
+    raw_id_fields = ['order']
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,162 @@
+"""
+Live check-in analytics.
+
+Each worker counts scans in memory in minute buckets keyed by (event, gate,
+minute), so recording a scan is one dict increment under a lock. A
+background thread flushes the buckets every CHECKIN_FLUSH_SECONDS into
+CheckInMinute with F() increments: the database sees one write per event,
+gate and minute rather than one per scan. ``event_check_ins`` reads the last
+N hours from CheckInMinute (at most N * 60 rows per gate, however many tickets
+the event has) plus this worker's unflushed buckets.
+
+Buckets not yet flushed are lost if a worker dies; ``rebuild_check_in_minutes``
+recomputes the table from the tickets' used_at and gate.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncMinute
+from django.utils import timezone
+
+from tickets.models import ArchivedTicket, CheckInMinute, Ticket
+
+logger = logging.getLogger(__name__)
+
+MAX_HOURS = 24
+
+_pending = Counter()  # (event_id, gate, minute) -> scans not yet flushed
+_lock = threading.Lock()
+_flusher = None
+
+
+def _minute(moment):
+    return moment.replace(second=0, microsecond=0)
+
+
+def record_scan(event_id, gate='', at=None):
+    """Count one check-in for the event and gate"""
+    at = at or timezone.now()
+    with _lock:
+        _pending[(event_id, gate, _minute(at))] += 1
+    if _flusher is None:
+        _start_flusher()
+
+
+def _start_flusher():
+    global _flusher
+    with _lock:
+        if _flusher is not None:
+            return
+        _flusher = threading.Thread(target=_flush_loop, name='check-in-flusher', daemon=True)
+        _flusher.start()
+    atexit.register(flush)
+
+
+def _flush_loop():
+    while True:
+        time.sleep(settings.CHECKIN_FLUSH_SECONDS)
+        try:
+            flush()
+        except Exception:
+            logger.exception('Flushing check-in counters failed')
+        finally:
+            connections.close_all()
+
+
+def _add(event_id, gate, minute, count):
+    rows = CheckInMinute.objects.filter(event_id=event_id, gate=gate, minute=minute)
+    if rows.update(count=F('count') + count):
+        return
+    try:
+        with transaction.atomic():
+            CheckInMinute.objects.create(event_id=event_id, gate=gate, minute=minute, count=count)
+    except IntegrityError:
+        # Another worker created the bucket first
+        rows.update(count=F('count') + count)
+
+
+def flush():
+    """Write the unflushed buckets to CheckInMinute, returning how many scans were written"""
+    with _lock:
+        batch = dict(_pending)
+        _pending.clear()
+    if not batch:
+        return 0
+    try:
+        with transaction.atomic():
+            for (event_id, gate, minute), count in batch.items():
+                _add(event_id, gate, minute, count)
+    except Exception:
+        # Keep the counts for the next flush
+        with _lock:
+            _pending.update(batch)
+        raise
+    return sum(batch.values())
+
+
+def event_check_ins(event_id, hours=1, now=None):
+    """Per-minute check-ins for the event over the last ``hours``, in total and per gate"""
+    end = _minute(now or timezone.now())
+    slots = hours * 60
+    start = end - timedelta(minutes=slots - 1)
+    per_minute = [0] * slots
+    gates = {}
+
+    def add(gate, minute, count):
+        index = int((minute - start).total_seconds()) // 60
+        if 0 <= index < slots:
+            per_minute[index] += count
+            gates.setdefault(gate, [0] * slots)[index] += count
+
+    flushed = CheckInMinute.objects.filter(
+        event_id=event_id, minute__gte=start, minute__lte=end
+    ).values_list('gate', 'minute', 'count')
+    for gate, minute, count in flushed:
+        add(gate, minute, count)
+    with _lock:
+        unflushed = [(key, count) for key, count in _pending.items() if key[0] == event_id]
+    for (_, gate, minute), count in unflushed:
+        add(gate, minute, count)
+
+    return {
+        'event_id': event_id,
+        'from': start,
+        'to': end + timedelta(minutes=1),
+        'total': sum(per_minute),
+        'per_minute': per_minute,
+        'gates': {
+            gate: {'total': sum(counts), 'per_minute': counts}
+            for gate, counts in sorted(gates.items())
+        },
+    }
+
+
+def rebuild_check_in_minutes(event_id=None):
+    """Recompute CheckInMinute from the live and archived tickets, returning the number of rows written"""
+    minutes = CheckInMinute.objects.all()
+    if event_id is not None:
+        minutes = minutes.filter(event_id=event_id)
+    counts = Counter()
+    for model in (Ticket, ArchivedTicket):
+        tickets = model.objects.filter(is_used=True, used_at__isnull=False)
+        if event_id is not None:
+            tickets = tickets.filter(order__event_id=event_id)
+        rows = tickets.order_by().values(
+            'order__event_id', 'gate', minute=TruncMinute('used_at')
+        ).annotate(count=Count('id'))
+        for row in rows.iterator(chunk_size=5000):
+            counts[(row['order__event_id'], row['gate'], row['minute'])] += row['count']
+    with transaction.atomic():
+        minutes.delete()
+        created = CheckInMinute.objects.bulk_create([
+            CheckInMinute(event_id=event, gate=gate, minute=minute, count=count)
+            for (event, gate, minute), count in counts.items()
+        ], batch_size=1000)
+    return len(created)
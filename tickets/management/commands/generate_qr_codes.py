@@ -0,0 +1,105 @@
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from tickets.models import Ticket
+from tickets.qr import qr_filename, qr_payload, render_qr_png
+
+UPLOAD_TO = Ticket._meta.get_field('qr_code').upload_to
+
+
+def _init_worker():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'eticketing_backend.settings')
+    django.setup()
+
+
+def _render(job):
+    """Render one ticket's QR code and write it to storage (runs in a worker process)"""
+    pk, ticket_id, event_id, user_id, order_id, old_name = job
+    png = render_qr_png(qr_payload(ticket_id, event_id, user_id, order_id))
+    name = os.path.join(UPLOAD_TO, qr_filename(ticket_id))
+    if old_name != name and default_storage.exists(name):
+        # Left by an interrupted run; no row points at it
+        default_storage.delete(name)
+    # The ticket keeps its current file until the row points at the new one; if it
+    # is still at ``name``, storage saves the new file under a fresh name
+    return pk, default_storage.save(name, ContentFile(png)), old_name
+
+
+class Command(BaseCommand):
+    help = 'Render missing ticket QR codes (or all of them with --all) in a process pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Re-render every ticket, not just missing ones')
+        parser.add_argument('--workers', type=int, default=os.cpu_count())
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--checkpoint', default=os.path.join(tempfile.gettempdir(), 'qr_backfill.checkpoint'),
+            help='File recording the last processed ticket so an interrupted run can resume'
+        )
+        parser.add_argument('--reset', action='store_true', help='Ignore any existing checkpoint')
+
+    def _load_checkpoint(self, path, mode):
+        if not os.path.exists(path):
+            return None
+        with open(path) as handle:
+            checkpoint = json.load(handle)
+        return checkpoint['last_id'] if checkpoint.get('mode') == mode else None
+
+    def _save_checkpoint(self, path, mode, last_id):
+        with open(path, 'w') as handle:
+            json.dump({'mode': mode, 'last_id': str(last_id)}, handle)
+
+    def handle(self, *args, **options):
+        mode = 'all' if options['all'] else 'missing'
+        checkpoint_path = options['checkpoint']
+        last_id = None if options['reset'] else self._load_checkpoint(checkpoint_path, mode)
+
+        tickets = Ticket.objects.filter(ticket_id__isnull=False)
+        if mode == 'missing':
+            tickets = tickets.filter(Q(qr_code__isnull=True) | Q(qr_code=''))
+        if last_id:
+            self.stdout.write(f'Resuming after ticket {last_id}')
+        jobs = tickets.order_by('id').values_list(
+            'id', 'ticket_id', 'order__event_id', 'order__user_id', 'order__order_id', 'qr_code'
+        )
+
+        processed = 0
+        started = time.monotonic()
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=_init_worker) as pool:
+            while True:
+                # Keyset pagination on the primary key: cheap at any depth
+                page = jobs.filter(id__gt=last_id) if last_id else jobs
+                batch = list(page[:options['batch_size']])
+                if not batch:
+                    break
+                rendered = list(pool.map(_render, batch, chunksize=max(1, len(batch) // (options['workers'] * 4))))
+                Ticket.objects.bulk_update(
+                    [Ticket(id=pk, qr_code=name) for pk, name, _ in rendered], ['qr_code']
+                )
+                # Only now that no row points at them
+                for _, name, old_name in rendered:
+                    if old_name and old_name != name:
+                        default_storage.delete(old_name)
+                last_id = batch[-1][0]
+                self._save_checkpoint(checkpoint_path, mode, last_id)
+
+                processed += len(batch)
+                elapsed = time.monotonic() - started
+                self.stdout.write(f'{processed} tickets rendered ({processed / elapsed:.1f}/s)')
+
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        elapsed = time.monotonic() - started
+        rate = processed / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Rendered {processed} QR codes in {elapsed:.1f}s ({rate:.1f} tickets/s)'
+        ))
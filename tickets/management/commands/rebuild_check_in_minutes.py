@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from tickets.checkins import rebuild_check_in_minutes
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per-minute check-in counters from the tickets table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--event', type=int, help='Only rebuild this event')
+
+    def handle(self, *args, **options):
+        written = rebuild_check_in_minutes(event_id=options['event'])
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} check-in minute buckets'))
@@ -0,0 +1,33 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from events.models import Event
+from tickets.scan_index import warm_event
+
+
+class Command(BaseCommand):
+    help = 'Load the tickets of upcoming events into the door validation index before doors open'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--event', type=int, action='append', default=[], help='Event id (repeatable)')
+        parser.add_argument(
+            '--starting-within', type=float, metavar='HOURS',
+            help='Warm every active event starting within this many hours'
+        )
+
+    def handle(self, *args, **options):
+        event_ids = list(options['event'])
+        if options['starting_within'] is not None:
+            now = timezone.now()
+            event_ids += Event.objects.filter(
+                is_active=True, date__gte=now, date__lte=now + timedelta(hours=options['starting_within'])
+            ).values_list('id', flat=True)
+        if not event_ids:
+            raise CommandError('Give --event or --starting-within')
+
+        for event_id in dict.fromkeys(event_ids):
+            loaded = warm_event(event_id)
+            self.stdout.write(f'Event {event_id}: indexed {loaded} tickets')
+        self.stdout.write(self.style.SUCCESS('Ticket index warmed'))
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.5 on 2026-10-19 19:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0008_order_created_idx'),
+        ('tickets', '0002_rename_issued_at_ticket_created_at_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['created_at'], name='ticket_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['is_used', 'created_at'], name='ticket_used_created_idx'),
+        ),
+    ]
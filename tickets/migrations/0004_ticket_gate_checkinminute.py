@@ -0,0 +1,34 @@
+# Generated by Django 5.2.5 on 2026-10-19 19:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0005_event_waiting_room_enabled'),
+        ('tickets', '0003_ticket_admin_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='gate',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+        migrations.CreateModel(
+            name='CheckInMinute',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('gate', models.CharField(blank=True, default='', max_length=50)),
+                ('minute', models.DateTimeField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='check_in_minutes', to='events.event')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['event', 'minute'], name='check_in_event_minute_idx')],
+                'constraints': [models.UniqueConstraint(fields=('event', 'gate', 'minute'), name='unique_check_in_minute')],
+            },
+        ),
+    ]
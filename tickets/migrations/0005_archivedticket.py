@@ -0,0 +1,28 @@
+# Generated by Django 5.2.5 on 2026-10-19 19:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0009_archivedorder'),
+        ('tickets', '0004_ticket_gate_checkinminute'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedTicket',
+            fields=[
+                ('id', models.UUIDField(editable=False, primary_key=True, serialize=False)),
+                ('ticket_id', models.CharField(blank=True, max_length=20, null=True, unique=True)),
+                ('qr_code', models.ImageField(blank=True, null=True, upload_to='qr_codes/')),
+                ('is_used', models.BooleanField(default=False)),
+                ('used_at', models.DateTimeField(blank=True, null=True)),
+                ('gate', models.CharField(blank=True, default='', max_length=50)),
+                ('created_at', models.DateTimeField()),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tickets', to='orders.archivedorder')),
+            ],
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.5 on 2026-10-19 19:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0006_seat_map'),
+        ('orders', '0010_order_seats'),
+        ('tickets', '0005_archivedticket'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedticket',
+            name='seat_number',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='archivedticket',
+            name='seat_row',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='events.seatrow'),
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='seat_number',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='seat_row',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='tickets', to='events.seatrow'),
+        ),
+        migrations.AddConstraint(
+            model_name='ticket',
+            constraint=models.UniqueConstraint(fields=('seat_row', 'seat_number'), name='unique_ticket_seat'),
+        ),
+    ]
@@ -1,10 +1,10 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 import uuid
-import qrcode
-from io import BytesIO
-from django.core.files import File
-from orders.models import Order
+from django.core.files.base import ContentFile
+from events.models import Event, SeatRow
+from orders.models import ArchivedOrder, Order
+from tickets.qr import qr_filename, qr_payload, render_qr_png
 
 
 class Ticket(models.Model):
@@ -14,12 +14,30 @@ class Ticket(models.Model):
     qr_code = models.ImageField(upload_to='qr_codes/', blank=True, null=True)
     is_used = models.BooleanField(default=False)
     used_at = models.DateTimeField(blank=True, null=True)
+    gate = models.CharField(max_length=50, blank=True, default='')  # gate / scanner that checked it in
+    # Reserved seating: the seat the order held for this ticket
+    seat_row = models.ForeignKey(SeatRow, on_delete=models.PROTECT, blank=True, null=True, related_name='tickets')
+    seat_number = models.PositiveSmallIntegerField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='ticket_created_idx'),
+            models.Index(fields=['is_used', 'created_at'], name='ticket_used_created_idx'),
+        ]
+        constraints = [
+            # A seat is sold once, whatever the seat map bitsets say
+            models.UniqueConstraint(fields=['seat_row', 'seat_number'], name='unique_ticket_seat'),
+        ]
+
+    @staticmethod
+    def generate_ticket_id():
+        timestamp = str(int(timezone.now().timestamp()))
+        return f"TKT{timestamp}{uuid.uuid4().hex[:7]}"
+
     def save(self, *args, **kwargs):
         if not self.ticket_id:
-            timestamp = str(int(timezone.now().timestamp()))
-            self.ticket_id = f"TKT{timestamp}{self.order.id.hex[:6]}"
+            self.ticket_id = self.generate_ticket_id()
 
         super().save(*args, **kwargs)
 
@@ -27,42 +45,59 @@ class Ticket(models.Model):
             self.generate_qr_code()
 
     def generate_qr_code(self):
-        qr_data = {
-            'ticket_id': self.ticket_id,
-            'event_id': str(self.order.event.id),
-            'user_id': str(self.order.user.id),
-            'order_id': self.order.order_id
-        }
-
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=10,
-            border=4,
+        qr_data = qr_payload(
+            self.ticket_id, self.order.event_id, self.order.user_id, self.order.order_id
         )
-        qr.add_data(str(qr_data))
-        qr.make(fit=True)
-
-        qr_image = qr.make_image(fill_color="black", back_color="white")
+        self.qr_code.save(qr_filename(self.ticket_id), ContentFile(render_qr_png(qr_data)), save=True)
 
-        buffer = BytesIO()
-        qr_image.save(buffer, format='PNG')
-        buffer.seek(0)
+    def mark_as_used(self, gate=''):
+        from orders.stats import record_check_in
+        from tickets.checkins import record_scan
 
-        filename = f'qr_{self.ticket_id}.png'
-        self.qr_code.save(filename, File(buffer), save=True)
-
-    def mark_as_used(self):
         self.is_used = True
         self.used_at = timezone.now()
-        self.save()
+        self.gate = gate
+        event_id = self.order.event_id
+        with transaction.atomic():
+            self.save()
+            record_check_in(event_id)
+            transaction.on_commit(lambda: record_scan(event_id, gate, self.used_at))
 
     def __str__(self):
         return f"{self.ticket_id} - {self.order.event.title}"
 
 
+class CheckInMinute(models.Model):
+    """Check-ins per event, gate and minute, flushed from the in-memory counters in tickets.checkins"""
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='check_in_minutes')
+    gate = models.CharField(max_length=50, blank=True, default='')
+    minute = models.DateTimeField()
+    count = models.PositiveIntegerField(default=0)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['event', 'gate', 'minute'], name='unique_check_in_minute'),
+        ]
+        indexes = [
+            models.Index(fields=['event', 'minute'], name='check_in_event_minute_idx'),
+        ]
 
+    def __str__(self):
+        return f"{self.event_id} {self.gate or '-'} {self.minute:%Y-%m-%d %H:%M}: {self.count}"
 
 
+class ArchivedTicket(models.Model):
+    """A ticket of an ArchivedOrder, moved out of Ticket by orders.archive"""
+    id = models.UUIDField(primary_key=True, editable=False)
+    ticket_id = models.CharField(max_length=20, unique=True, null=True, blank=True)
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE, related_name='tickets')
+    qr_code = models.ImageField(upload_to='qr_codes/', blank=True, null=True)
+    is_used = models.BooleanField(default=False)
+    used_at = models.DateTimeField(blank=True, null=True)
+    gate = models.CharField(max_length=50, blank=True, default='')
+    seat_row = models.ForeignKey(SeatRow, on_delete=models.PROTECT, blank=True, null=True, related_name='+')
+    seat_number = models.PositiveSmallIntegerField(blank=True, null=True)
+    created_at = models.DateTimeField()
 
+    def __str__(self):
+        return f"{self.ticket_id} - {self.order.event.title} (archived)"
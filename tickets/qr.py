@@ -0,0 +1,41 @@
+"""
+QR code rendering for tickets, usable both from models and worker processes.
+
+qrcode (and Pillow behind it) is imported on first render, not at startup,
+so processes that never draw a QR code don't pay for loading them.
+"""
+from io import BytesIO
+
+
+def qr_payload(ticket_id, event_id, user_id, order_id):
+    """Text encoded in a ticket's QR code"""
+    return str({
+        'ticket_id': ticket_id,
+        'event_id': str(event_id),
+        'user_id': str(user_id),
+        'order_id': order_id
+    })
+
+
+def render_qr_png(data):
+    """Render ``data`` as a QR code and return the PNG bytes"""
+    import qrcode
+
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        box_size=10,
+        border=4,
+    )
+    qr.add_data(data)
+    qr.make(fit=True)
+
+    qr_image = qr.make_image(fill_color="black", back_color="white")
+
+    buffer = BytesIO()
+    qr_image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def qr_filename(ticket_id):
+    return f'qr_{ticket_id}.png'
@@ -0,0 +1,276 @@
+"""
+Streaming ZIP and PDF print-sheet exports of ticket QR codes.
+
+Tickets are read in chunks with ``values()`` and each chunk's PNGs are
+written to the response as soon as they are ready: the ZIP goes through
+zipfile on a write-only sink, which makes it use data descriptors instead of
+seeking back, and the PDF is written object by object with its cross-reference
+table at the end. Only the byte offsets of the PDF objects are kept, so
+memory does not grow with the number of tickets.
+
+Stored QR codes are read from storage. Missing ones (tickets approved in bulk
+before ``generate_qr_codes`` ran) are rendered for the export only, a chunk at
+a time, in a process pool of QR_RENDER_WORKERS shared by the worker. The PDF
+embeds the PNG image data as it is, so QR codes from ``render_qr_png`` are
+never decoded.
+"""
+import multiprocessing
+import struct
+import threading
+import zipfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from io import BytesIO
+from itertools import islice
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from tickets.qr import qr_filename, qr_payload, render_qr_png
+
+QR_EXPORT_FORMATS = {
+    'zip': 'application/zip',
+    'pdf': 'application/pdf',
+}
+CHUNK_SIZE = 200
+
+TICKET_FIELDS = [
+    'id', 'ticket_id', 'qr_code', 'order__order_id', 'order__event_id', 'order__user_id',
+    'order__event__title', 'order__user__first_name', 'order__user__last_name',
+    'seat_row__section', 'seat_row__row', 'seat_number',
+]
+
+# A4 portrait in points, cut into a grid of labels
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842
+MARGIN = 36
+COLUMNS, ROWS = 3, 4
+QR_SIZE = 140
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _render_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None and settings.QR_RENDER_WORKERS > 0:
+            # Spawned, not forked: the parent is a threaded server and rendering needs none of its state
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.QR_RENDER_WORKERS, mp_context=multiprocessing.get_context('spawn')
+            )
+        return _pool
+
+
+def _discard_pool(pool):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+
+
+def _payload(ticket):
+    return qr_payload(
+        ticket['ticket_id'], ticket['order__event_id'], ticket['order__user_id'], ticket['order__order_id']
+    )
+
+
+def _stored_png(ticket):
+    try:
+        with default_storage.open(ticket['qr_code']) as handle:
+            return handle.read()
+    except OSError:
+        return None
+
+
+def _renderer(pool, ticket):
+    """A callable returning the ticket's QR code, rendering it in the pool from now if there is one"""
+    if pool is None:
+        return partial(render_qr_png, _payload(ticket))
+    return pool.submit(render_qr_png, _payload(ticket)).result
+
+
+def _ticket_images(querysets, pool):
+    for queryset in querysets:
+        tickets = queryset.order_by('order__order_id', 'ticket_id').values(*TICKET_FIELDS).iterator(
+            chunk_size=CHUNK_SIZE
+        )
+        while chunk := list(islice(tickets, CHUNK_SIZE)):
+            # Start rendering the chunk's missing codes, then stream it in order while they finish
+            pngs = {ticket['id']: _stored_png(ticket) for ticket in chunk if ticket['qr_code']}
+            pending = {
+                ticket['id']: _renderer(pool, ticket) for ticket in chunk if pngs.get(ticket['id']) is None
+            }
+            for ticket in chunk:
+                png = pngs.get(ticket['id'])
+                yield ticket, png if png is not None else pending[ticket['id']]()
+
+
+def ticket_images(querysets):
+    """(ticket values, QR code PNG) for the tickets of each queryset in turn"""
+    pool = _render_pool()
+    try:
+        yield from _ticket_images(querysets, pool)
+    except BrokenProcessPool:
+        # A worker died; the next export starts a fresh pool
+        _discard_pool(pool)
+        raise
+
+
+class _Sink:
+    """Write-only file for zipfile; the generator hands on what was written after each member"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def zip_stream(images):
+    """ZIP of the QR code PNGs, one folder per order"""
+    sink = _Sink()
+    date_time = timezone.localtime().timetuple()[:6]
+    with zipfile.ZipFile(sink, 'w') as archive:
+        for ticket, png in images:
+            member = zipfile.ZipInfo(f"{ticket['order__order_id']}/{qr_filename(ticket['ticket_id'])}", date_time)
+            member.external_attr = 0o644 << 16
+            # PNG is compressed already
+            archive.writestr(member, png, compress_type=zipfile.ZIP_STORED)
+            if data := sink.drain():
+                yield data
+    yield sink.drain()
+
+
+def _pdf_image(png):
+    """(dictionary entries, data) of an image XObject showing the PNG"""
+    width, height, depth, color_type, _, _, interlace = struct.unpack('>IIBBBBB', png[16:29])
+    if color_type in (0, 2) and depth <= 8 and not interlace:
+        # The IDAT stream is zlib data with PNG row filters, which PDF decodes with predictor 15
+        data, position = [], 8
+        while position < len(png):
+            length, kind = struct.unpack('>I4s', png[position:position + 8])
+            if kind == b'IDAT':
+                data.append(png[position + 8:position + 8 + length])
+            position += 12 + length
+        colors = 1 if color_type == 0 else 3
+        entries = (
+            b'/ColorSpace /%s /BitsPerComponent %d /Filter /FlateDecode '
+            b'/DecodeParms << /Predictor 15 /Colors %d /BitsPerComponent %d /Columns %d >>'
+            % (b'DeviceGray' if colors == 1 else b'DeviceRGB', depth, colors, depth, width)
+        )
+        return b'/Width %d /Height %d ' % (width, height) + entries, b''.join(data)
+
+    from PIL import Image
+
+    image = Image.open(BytesIO(png)).convert('L')
+    return (
+        b'/Width %d /Height %d /ColorSpace /DeviceGray /BitsPerComponent 8 /Filter /FlateDecode' % image.size,
+        zlib.compress(image.tobytes()),
+    )
+
+
+def _pdf_text(value, limit=38):
+    value = value if len(value) <= limit else value[:limit - 3] + '...'
+    encoded = value.encode('cp1252', errors='replace')
+    return encoded.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+
+
+class _PdfWriter:
+    """Numbers and writes PDF objects, remembering their byte offsets for the cross-reference table"""
+
+    def __init__(self):
+        self.position = 0
+        self.offsets = [None]  # object 0 heads the free list
+
+    def reserve(self):
+        self.offsets.append(None)
+        return len(self.offsets) - 1
+
+    def emit(self, data):
+        self.position += len(data)
+        return data
+
+    def object(self, number, body):
+        self.offsets[number] = self.position
+        return self.emit(b'%d 0 obj\n%s\nendobj\n' % (number, body))
+
+    def stream(self, number, entries, data):
+        return self.object(number, b'<< %s /Length %d >>\nstream\n%s\nendstream' % (entries, len(data), data))
+
+    def trailer(self, root):
+        xref = self.position
+        entries = b''.join(b'%010d 00000 n \n' % offset for offset in self.offsets[1:])
+        return self.emit(
+            b'xref\n0 %d\n0000000000 65535 f \n%s' % (len(self.offsets), entries)
+            + b'trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(self.offsets), root, xref)
+        )
+
+
+def pdf_stream(images):
+    """A4 print sheet: a grid of QR codes labelled with ticket, event, attendee and seat"""
+    pdf = _PdfWriter()
+    catalog, pages, font = pdf.reserve(), pdf.reserve(), pdf.reserve()
+    yield pdf.emit(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+    yield pdf.object(catalog, b'<< /Type /Catalog /Pages %d 0 R >>' % pages)
+    yield pdf.object(font, b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>')
+
+    cell_width = (PAGE_WIDTH - 2 * MARGIN) / COLUMNS
+    cell_height = (PAGE_HEIGHT - 2 * MARGIN) / ROWS
+    kids = []
+    images = iter(images)
+    while page_images := list(islice(images, COLUMNS * ROWS)):
+        content, xobjects = [], []
+        for index, (ticket, png) in enumerate(page_images):
+            image = pdf.reserve()
+            entries, data = _pdf_image(png)
+            yield pdf.stream(image, b'/Type /XObject /Subtype /Image ' + entries, data)
+            xobjects.append(b'/Q%d %d 0 R' % (index, image))
+
+            left = MARGIN + (index % COLUMNS) * cell_width
+            top = PAGE_HEIGHT - MARGIN - (index // COLUMNS) * cell_height
+            x, y = left + (cell_width - QR_SIZE) / 2, top - QR_SIZE - 6
+            attendee = f"{ticket['order__user__first_name']} {ticket['order__user__last_name']}".strip()
+            seat = (
+                f"{ticket['seat_row__section']} / row {ticket['seat_row__row']} / seat {ticket['seat_number']}"
+                if ticket['seat_number'] else ''
+            )
+            content.append(b'0.8 G 0.5 w %.2f %.2f %.2f %.2f re S' % (left, top - cell_height, cell_width, cell_height))
+            content.append(b'q %d 0 0 %d %.2f %.2f cm /Q%d Do Q' % (QR_SIZE, QR_SIZE, x, y, index))
+            for line, text in enumerate([ticket['ticket_id'], ticket['order__event__title'], attendee, seat]):
+                content.append(b'BT /F1 %d Tf %.2f %.2f Td (%s) Tj ET' % (
+                    10 if line == 0 else 8, x, y - 10 - 11 * line, _pdf_text(text or '')
+                ))
+
+        stream, page = pdf.reserve(), pdf.reserve()
+        yield pdf.stream(stream, b'/Filter /FlateDecode', zlib.compress(b'\n'.join(content)))
+        yield pdf.object(page, (
+            b'<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %d %d] /Contents %d 0 R '
+            b'/Resources << /Font << /F1 %d 0 R >> /XObject << %s >> >> >>'
+        ) % (pages, PAGE_WIDTH, PAGE_HEIGHT, stream, font, b' '.join(xobjects)))
+        kids.append(b'%d 0 R' % page)
+
+    yield pdf.object(pages, b'<< /Type /Pages /Kids [%s] /Count %d >>' % (b' '.join(kids), len(kids)))
+    yield pdf.trailer(catalog)
+
+
+def stream_qr_codes(querysets, export_format, filename):
+    """Stream the QR codes of the tickets in ``querysets`` as a ZIP of PNGs or a PDF print sheet"""
+    images = ticket_images(querysets)
+    chunks = zip_stream(images) if export_format == 'zip' else pdf_stream(images)
+    response = StreamingHttpResponse(chunks, content_type=QR_EXPORT_FORMATS[export_format])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{export_format}"'
+    return response
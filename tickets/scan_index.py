@@ -0,0 +1,274 @@
+"""
+Pre-warmed ticket index and write-behind scan marking for the doors.
+
+``warm_event`` loads every ticket of an event into the 'ticket_index' cache
+(ticket_id -> event, order status, used flag and the serialized ticket)
+before doors open, so a scan is answered without reading the ticket, order
+or event tables. Point the cache at a shared store (memcached, redis) so all
+workers use one index.
+
+The first scan of a ticket wins by atomically adding a claim key to the same
+store. The database write is then handed to a per-worker ``ScanBatcher``
+that marks a whole batch of tickets used in one transaction (group commit).
+The request waits for its batch to commit, so a scan is acknowledged only
+once it is durable. The batch only updates rows that are still unused, so
+the database stays the final arbiter if a claim key is ever lost.
+
+A scan whose batch has not committed within TICKET_SCAN_TIMEOUT_SECONDS
+keeps its claim and is answered PENDING: the write may still commit. Its
+outcome is recorded on the claim when the batch finishes, and the gate's
+retry is told VALID once if the late write won. A failed write frees the
+claim, so the retry scans the ticket afresh.
+"""
+import logging
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from dataclasses import dataclass, field
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections, transaction
+from django.db.models import Case, CharField, DateTimeField, Value, When
+from django.utils import timezone
+
+from tickets.models import Ticket
+
+logger = logging.getLogger(__name__)
+
+VALID = 'valid'
+ALREADY_USED = 'already_used'
+NOT_FOUND = 'not_found'
+NOT_APPROVED = 'not_approved'
+PENDING = 'pending'
+
+
+def _cache():
+    return caches['ticket_index']
+
+
+def _entry_key(ticket_id):
+    return f'ticket-index:{ticket_id}'
+
+
+def _claim_key(ticket_id):
+    return f'ticket-scan:{ticket_id}'
+
+
+def _index_timeout():
+    return int(settings.TICKET_INDEX_TTL.total_seconds())
+
+
+def _entry(ticket):
+    from tickets.serializers import TicketSerializer
+
+    return {
+        'event_id': ticket.order.event_id,
+        'order_status': ticket.order.status,
+        'is_used': ticket.is_used,
+        'ticket': TicketSerializer(ticket).data,
+    }
+
+
+def warm_event(event_id, chunk_size=2000):
+    """Load every ticket of the event into the index, returning how many were loaded"""
+    tickets = Ticket.objects.filter(order__event_id=event_id).select_related('order__event').order_by('pk')
+    cache, loaded, batch = _cache(), 0, {}
+    for ticket in tickets.iterator(chunk_size=chunk_size):
+        batch[_entry_key(ticket.ticket_id)] = _entry(ticket)
+        if len(batch) >= chunk_size:
+            cache.set_many(batch, timeout=_index_timeout())
+            loaded += len(batch)
+            batch = {}
+    if batch:
+        cache.set_many(batch, timeout=_index_timeout())
+        loaded += len(batch)
+    return loaded
+
+
+def _lookup(ticket_id):
+    """Index entry for the ticket, loading (and indexing) it from the database on a miss"""
+    entry = _cache().get(_entry_key(ticket_id))
+    if entry is not None:
+        return entry
+    ticket = Ticket.objects.select_related('order__event').filter(ticket_id=ticket_id).first()
+    if ticket is None:
+        return None
+    entry = _entry(ticket)
+    _cache().set(_entry_key(ticket_id), entry, timeout=_index_timeout())
+    return entry
+
+
+@dataclass(eq=False)
+class Scan:
+    ticket_id: str
+    gate: str
+    used_at: object
+    future: Future = field(default_factory=Future)
+
+
+class ScanBatcher:
+    """Marks scanned tickets used in batches from a background thread"""
+
+    def __init__(self, batch_size, max_wait):
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, scan):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='ticket-scan-batcher', daemon=True)
+                    self._thread.start()
+        self._queue.put(scan)
+        return scan.future
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                won = write_scans(batch)
+            except Exception as e:
+                logger.exception('Writing %s ticket scans failed', len(batch))
+                connections.close_all()
+                for scan in batch:
+                    scan.future.set_exception(e)
+                continue
+            for scan in batch:
+                scan.future.set_result(scan in won)
+
+
+def write_scans(scans):
+    """Mark the scanned tickets used in one transaction, returning the scans that won their ticket"""
+    from orders.stats import record_check_in
+    from tickets.checkins import record_scan
+
+    first = {}
+    for scan in scans:
+        first.setdefault(scan.ticket_id, scan)
+
+    with transaction.atomic():
+        unused = dict(
+            Ticket.objects.select_for_update(of=('self',))
+            .filter(ticket_id__in=list(first), is_used=False)
+            .values_list('ticket_id', 'order__event_id')
+        )
+        if not unused:
+            return []
+        winners = [first[ticket_id] for ticket_id in unused]
+        Ticket.objects.filter(ticket_id__in=list(unused)).update(
+            is_used=True,
+            used_at=Case(
+                *[When(ticket_id=scan.ticket_id, then=Value(scan.used_at)) for scan in winners],
+                output_field=DateTimeField()
+            ),
+            gate=Case(
+                *[When(ticket_id=scan.ticket_id, then=Value(scan.gate)) for scan in winners],
+                output_field=CharField()
+            ),
+        )
+        for event_id, count in Counter(unused.values()).items():
+            record_check_in(event_id, count)
+
+        def after_commit():
+            for scan in winners:
+                record_scan(unused[scan.ticket_id], scan.gate, scan.used_at)
+        transaction.on_commit(after_commit)
+    return winners
+
+
+_batcher = None
+
+
+def get_batcher():
+    global _batcher
+    if _batcher is None:
+        _batcher = ScanBatcher(settings.TICKET_SCAN_BATCH_SIZE, settings.TICKET_SCAN_BATCH_WAIT_MS / 1000)
+    return _batcher
+
+
+def _mark_used(ticket_id, entry):
+    entry['is_used'] = True
+    entry['ticket'] = {**entry['ticket'], 'is_used': True}
+    _cache().set(_entry_key(ticket_id), entry, timeout=_index_timeout())
+
+
+def _finish_late_scan(ticket_id, entry, claim, future):
+    """Record the outcome of a scan its request stopped waiting for (runs in the batcher thread)"""
+    if future.exception() is not None:
+        _cache().delete(_claim_key(ticket_id))
+        return
+    _cache().set(_claim_key(ticket_id), {**claim, 'outcome': VALID if future.result() else ALREADY_USED},
+                 timeout=_index_timeout())
+    _mark_used(ticket_id, entry)
+
+
+def _claimed_outcome(ticket_id, entry):
+    """Outcome for a ticket someone else claimed: the late result of a timed-out scan, or ALREADY_USED"""
+    cache = _cache()
+    claim = cache.get(_claim_key(ticket_id))
+    if not claim or not claim.get('late'):
+        return ALREADY_USED, entry['ticket']
+    if claim['outcome'] is None:
+        return PENDING, entry['ticket']
+    if claim['outcome'] == VALID and not claim.get('acknowledged'):
+        # The gate was told to retry a scan that went through after all
+        cache.set(_claim_key(ticket_id), {**claim, 'acknowledged': True}, timeout=_index_timeout())
+        ticket = {**entry['ticket'], 'is_used': True}
+        return VALID, {**ticket, 'used_at': claim['used_at'], 'gate': claim['gate']}
+    return ALREADY_USED, {**entry['ticket'], 'is_used': True}
+
+
+def scan_ticket(ticket_id, gate=''):
+    """
+    Validate and check in a ticket, returning (outcome, serialized ticket).
+
+    Blocks until the scan is committed, or returns PENDING if that takes
+    longer than TICKET_SCAN_TIMEOUT_SECONDS; raises if the write failed, in
+    which case the ticket is left unclaimed so it can be scanned again.
+    """
+    entry = _lookup(ticket_id)
+    if entry is None:
+        return NOT_FOUND, None
+    if entry['order_status'] != 'approved':
+        return NOT_APPROVED, entry['ticket']
+
+    cache = _cache()
+    used_at = timezone.now()
+    claim = {'used_at': used_at, 'gate': gate}
+    if entry['is_used'] or not cache.add(_claim_key(ticket_id), claim, timeout=_index_timeout()):
+        return _claimed_outcome(ticket_id, entry)
+
+    future = get_batcher().submit(Scan(ticket_id, gate, used_at))
+    try:
+        won = future.result(timeout=settings.TICKET_SCAN_TIMEOUT_SECONDS)
+    except FutureTimeoutError:
+        # The scan is still queued and may yet commit: keep the claim and let the batch settle it
+        late = {**claim, 'late': True, 'outcome': None}
+        cache.set(_claim_key(ticket_id), late, timeout=_index_timeout())
+        future.add_done_callback(partial(_finish_late_scan, ticket_id, entry, late))
+        return PENDING, entry['ticket']
+    except Exception:
+        cache.delete(_claim_key(ticket_id))
+        raise
+
+    _mark_used(ticket_id, entry)
+    if not won:
+        return ALREADY_USED, entry['ticket']
+    return VALID, {**entry['ticket'], 'used_at': used_at, 'gate': gate}
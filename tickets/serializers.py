@@ -1,15 +1,23 @@
 # tickets/serializers.py
 from rest_framework import serializers
+from eticketing_backend.fieldsets import SparseFieldsMixin
 from .models import Ticket
 
 
-class TicketSerializer(serializers.ModelSerializer):
+class TicketSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     qr_code = serializers.SerializerMethodField()
     order = serializers.SerializerMethodField()  # Add order data
+    seat = serializers.SerializerMethodField()
 
     class Meta:
         model = Ticket
-        fields = ['id', 'ticket_id', 'qr_code', 'is_used', 'created_at', 'order']
+        fields = ['id', 'ticket_id', 'qr_code', 'is_used', 'created_at', 'seat', 'order']
+        field_sources = {
+            'qr_code': ['qr_code'],
+            'seat': ['seat_row__section', 'seat_row__row', 'seat_number'],
+            'order': ['order__status', 'order__quantity', 'order__event__title',
+                      'order__event__date', 'order__event__location'],
+        }
 
     def get_qr_code(self, obj):
         if obj.qr_code:
@@ -19,6 +27,11 @@ class TicketSerializer(serializers.ModelSerializer):
             return obj.qr_code.url
         return None
 
+    def get_seat(self, obj):
+        if obj.seat_row_id is None:
+            return None
+        return {'section': obj.seat_row.section, 'row': obj.seat_row.row, 'number': obj.seat_number}
+
     def get_order(self, obj):
         # Return minimal order data
         return {
@@ -37,14 +50,4 @@ class TicketSerializer(serializers.ModelSerializer):
 class TicketValidationSerializer(serializers.Serializer):
     """Serializer for ticket validation"""
     ticket_id = serializers.CharField(max_length=20)
-
-    def validate_ticket_id(self, value):
-        try:
-            ticket = Ticket.objects.get(ticket_id=value)
-            if ticket.is_used:
-                raise serializers.ValidationError("Ticket has already been used")
-            if ticket.order.status != 'approved':
-                raise serializers.ValidationError("Order not approved")
-            return value
-        except Ticket.DoesNotExist:
-            raise serializers.ValidationError("Invalid ticket ID")
\ No newline at end of file
+    gate = serializers.CharField(max_length=50, required=False, allow_blank=True, default='')
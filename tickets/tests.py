@@ -1,3 +1,284 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import caches
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import OperationalError
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from eticketing_backend.throttling import TicketValidationThrottle
+from events.models import Event
+from orders.models import Order
+from orders.transitions import transition_order
+from tickets import checkins, scan_index
+from tickets.models import CheckInMinute
+from users.models import User
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+class _HeldBatcher:
+    """Stands in for the ScanBatcher: scans wait until the test settles their futures"""
+
+    def __init__(self):
+        self.futures = []
+
+    def submit(self, scan):
+        self.futures.append(Future())
+        return self.futures[-1]
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, TICKET_SCAN_TIMEOUT_SECONDS=0.01)
+class SlowScanTests(TestCase):
+    """A scan that times out must not turn the gate's retry into a false 'already used'"""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        caches['ticket_index'].clear()
+        user = User.objects.create_user(
+            username='buyer@example.com', email='buyer@example.com', password='secret', phone='0200000000'
+        )
+        event = Event.objects.create(
+            title='Concert', description='Live', date='2030-01-01T20:00:00Z', price=50,
+            image='events/concert.jpg', location='Accra', organizer=user
+        )
+        order = transition_order(
+            Order.objects.create(user=user, event=event, quantity=1, payment_method='mobile_money'), 'approved'
+        )
+        self.ticket_id = order.tickets.get().ticket_id
+        self.batcher = _HeldBatcher()
+        patcher = mock.patch.object(scan_index, 'get_batcher', return_value=self.batcher)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _scan(self, gate='gate-1'):
+        return scan_index.scan_ticket(self.ticket_id, gate)[0]
+
+    def test_retry_learns_a_late_write_went_through(self):
+        self.assertEqual(self._scan(), scan_index.PENDING)
+        self.assertEqual(self._scan(), scan_index.PENDING)
+
+        self.batcher.futures[0].set_result(True)
+        outcome, ticket = scan_index.scan_ticket(self.ticket_id, 'gate-2')
+        self.assertEqual(outcome, scan_index.VALID)
+        self.assertEqual(ticket['gate'], 'gate-1')
+        self.assertEqual(self._scan(), scan_index.ALREADY_USED)
+        self.assertEqual(len(self.batcher.futures), 1)
+
+    def test_retry_after_a_late_write_lost_is_already_used(self):
+        self.assertEqual(self._scan(), scan_index.PENDING)
+        self.batcher.futures[0].set_result(False)
+
+        self.assertEqual(self._scan(), scan_index.ALREADY_USED)
+
+    def test_failed_late_write_frees_the_ticket(self):
+        self.assertEqual(self._scan(), scan_index.PENDING)
+        self.batcher.futures[0].set_exception(RuntimeError('database is locked'))
+
+        self.assertEqual(self._scan(), scan_index.PENDING)
+        self.assertEqual(len(self.batcher.futures), 2)
+        self.batcher.futures[1].set_result(True)
+        self.assertEqual(self._scan(), scan_index.VALID)
+
+
+class TicketValidationThrottleTests(TestCase):
+    """A staff account scanning at the doors is not throttled at door rates, at one gate or several"""
+
+    def setUp(self):
+        caches['throttle'].clear()
+        self.now = 1000.0
+
+    def _throttle(self):
+        throttle = TicketValidationThrottle()
+        throttle.timer = lambda: self.now
+        return throttle
+
+    def _scan(self, gate):
+        request = SimpleNamespace(user=SimpleNamespace(is_authenticated=True, pk=7), data={'gate': gate})
+        return self._throttle().allow_request(request, None)
+
+    def test_sustained_door_rate_is_never_throttled(self):
+        # Four lanes on one account, each scanning a ticket every half second for ten minutes
+        allowed = []
+        for _ in range(1200):
+            allowed += [self._scan(f'north-{lane}') for lane in range(4)]
+            self.now += 0.5
+        self.assertTrue(all(allowed))
+
+    def test_each_gate_has_its_own_bucket(self):
+        capacity = self._throttle().capacity
+        self.assertTrue(all(self._scan('north') for _ in range(capacity)))
+        self.assertFalse(self._scan('north'))
+        self.assertTrue(self._scan('south'))
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class GenerateQrCodesTests(TestCase):
+    """Re-rendering QR codes never leaves a ticket pointing at a file that is gone"""
+
+    def setUp(self):
+        user = User.objects.create_user(
+            username='buyer@example.com', email='buyer@example.com', password='secret', phone='0200000000'
+        )
+        event = Event.objects.create(
+            title='Concert', description='Live', date='2030-01-01T20:00:00Z', price=50,
+            image='events/concert.jpg', location='Accra', organizer=user
+        )
+        order = transition_order(
+            Order.objects.create(user=user, event=event, quantity=2, payment_method='mobile_money'), 'approved'
+        )
+        self.tickets = list(order.tickets.order_by('id'))
+        # Worker processes would not see the test settings
+        patcher = mock.patch(
+            'tickets.management.commands.generate_qr_codes.ProcessPoolExecutor', ThreadPoolExecutor
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.checkpoint = os.path.join(MEDIA_ROOT, 'qr.checkpoint')
+
+    def _generate(self):
+        call_command('generate_qr_codes', '--all', '--workers=1', f'--checkpoint={self.checkpoint}', stdout=StringIO())
+
+    def test_new_file_is_written_before_the_old_one_goes(self):
+        old_names = [ticket.qr_code.name for ticket in self.tickets]
+
+        self._generate()
+
+        for ticket, old_name in zip(self.tickets, old_names):
+            ticket.refresh_from_db()
+            self.assertNotEqual(ticket.qr_code.name, old_name)
+            self.assertTrue(default_storage.exists(ticket.qr_code.name))
+            self.assertFalse(default_storage.exists(old_name))
+
+    def test_failed_write_keeps_the_current_files(self):
+        with mock.patch.object(default_storage, 'save', side_effect=OSError('disk full')), \
+                self.assertRaises(OSError):
+            self._generate()
+
+        for ticket in self.tickets:
+            name = ticket.qr_code.name
+            ticket.refresh_from_db()
+            self.assertEqual(ticket.qr_code.name, name)
+            self.assertTrue(default_storage.exists(name))
+
+
+class CheckInAnalyticsTests(TestCase):
+    """Scans are counted in minute buckets, merged into CheckInMinute on flush and reported per gate"""
+
+    def setUp(self):
+        user = User.objects.create_user(
+            username='admin@example.com', email='admin@example.com', password='secret', phone='0200000000',
+            is_admin=True
+        )
+        self.event = Event.objects.create(
+            title='Concert', description='Live', date='2030-01-01T20:00:00Z', price=50,
+            image='events/concert.jpg', location='Accra', organizer=user
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+        self.now = datetime(2030, 1, 1, 20, 30, 15, tzinfo=dt_timezone.utc)
+        self.minute = self.now.replace(second=0)
+        # No background flusher: the tests flush by hand
+        for patcher in (
+            mock.patch.object(checkins, '_flusher', object()),
+            mock.patch.object(checkins, '_pending', Counter()),
+            mock.patch('tickets.checkins.timezone.now', return_value=self.now),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_flush_merges_into_the_existing_minute(self):
+        CheckInMinute.objects.create(event=self.event, gate='north', minute=self.minute, count=3)
+        checkins.record_scan(self.event.pk, 'north', self.minute + timedelta(seconds=5))
+        checkins.record_scan(self.event.pk, 'north', self.minute + timedelta(seconds=50))
+        checkins.record_scan(self.event.pk, 'south')
+
+        self.assertEqual(checkins.flush(), 3)
+        self.assertEqual(
+            dict(CheckInMinute.objects.values_list('gate', 'count')), {'north': 5, 'south': 1}
+        )
+        self.assertEqual(checkins.flush(), 0)
+
+    def test_failed_flush_keeps_the_counts(self):
+        checkins.record_scan(self.event.pk, 'north')
+        with mock.patch.object(checkins, '_add', side_effect=OperationalError('database is locked')), \
+                self.assertRaises(OperationalError):
+            checkins.flush()
+
+        self.assertEqual(checkins.flush(), 1)
+        self.assertEqual(CheckInMinute.objects.get().count, 1)
+
+    def test_endpoint_reports_flushed_and_unflushed_scans_per_minute(self):
+        CheckInMinute.objects.bulk_create([
+            CheckInMinute(event=self.event, gate='north', minute=self.minute - timedelta(minutes=90), count=4),
+            CheckInMinute(event=self.event, gate='south', minute=self.minute, count=2),
+            # Older than the two hours asked for
+            CheckInMinute(event=self.event, gate='north', minute=self.minute - timedelta(hours=2), count=7),
+        ])
+        checkins.record_scan(self.event.pk, 'north')
+
+        response = self.client.get(f'/api/admin/events/{self.event.pk}/check-ins/?hours=2')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total'], 7)
+        self.assertEqual(len(response.data['per_minute']), 120)
+        self.assertEqual((response.data['per_minute'][29], response.data['per_minute'][-1]), (4, 3))
+        self.assertEqual(
+            {gate: stats['total'] for gate, stats in response.data['gates'].items()}, {'north': 5, 'south': 2}
+        )
+        self.assertEqual(self.client.get(f'/api/admin/events/{self.event.pk}/check-ins/?hours=25').status_code, 400)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class TicketConditionalGetTests(TestCase):
+    """An unchanged ticket answers revalidation with 304; a scan changes its ETag"""
+
+    def setUp(self):
+        user = User.objects.create_user(
+            username='buyer@example.com', email='buyer@example.com', password='secret', phone='0200000000'
+        )
+        event = Event.objects.create(
+            title='Concert', description='Live', date='2030-01-01T20:00:00Z', price=50,
+            image='events/concert.jpg', location='Accra', organizer=user
+        )
+        order = transition_order(
+            Order.objects.create(user=user, event=event, quantity=1, payment_method='mobile_money'), 'approved'
+        )
+        self.ticket = order.tickets.get()
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+        self.url = f'/api/tickets/{self.ticket.pk}/'
+
+    def test_unchanged_ticket_is_not_modified(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+
+        with self.assertNumQueries(1):
+            revalidated = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(revalidated.status_code, 304)
+        since = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(since.status_code, 304)
+
+    def test_scan_changes_the_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        # The batcher's bulk update leaves the order's updated_at alone
+        scan_index.write_scans([scan_index.Scan(self.ticket.ticket_id, 'north', timezone.now())])
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['is_used'])
+        self.assertNotEqual(response['ETag'], etag)
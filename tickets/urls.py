@@ -1,8 +1,14 @@
 from django.urls import path
-from tickets.views import TicketListView, TicketDetailView, validate_ticket
+from tickets.views import (
+    TicketListView, TicketDetailView, validate_ticket, export_tickets, export_ticket_qr_codes,
+    event_check_in_stats
+)
 
 urlpatterns = [
     path("tickets/", TicketListView.as_view(), name="ticket-list"),
     path("tickets/<uuid:pk>/", TicketDetailView.as_view(), name="ticket-detail"),
     path("tickets/validate/", validate_ticket, name="ticket-validate"),
+    path("admin/tickets/export/<str:export_format>/", export_tickets, name="admin-ticket-export"),
+    path("admin/tickets/qr-codes/<str:export_format>/", export_ticket_qr_codes, name="admin-ticket-qr-codes"),
+    path("admin/events/<int:event_id>/check-ins/", event_check_in_stats, name="admin-event-check-ins"),
 ]
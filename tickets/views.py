@@ -1,52 +1,192 @@
 from rest_framework import generics, status, permissions
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
 from rest_framework.response import Response
+from django.http import Http404
+from functools import partial
 from django.shortcuts import get_object_or_404
-from tickets.models import Ticket
+from tickets.models import ArchivedTicket, Ticket
+from tickets import scan_index
+from tickets.checkins import MAX_HOURS, event_check_ins
+from tickets.qr_export import QR_EXPORT_FORMATS, stream_qr_codes
+from eticketing_backend.conditional import conditional_get
+from eticketing_backend.db_router import ReplicaReadMixin
+from eticketing_backend.fieldsets import SparseFieldsViewMixin
+from eticketing_backend.throttling import TicketValidationThrottle
+from orders.archive import ticket_state, user_tickets
+from orders.exports import (
+    EXPORT_FORMATS, TICKET_EXPORT_COLUMNS, ExportFilterError, filter_export_queryset, stream_export
+)
 from django.utils import timezone
 from tickets.serializers import TicketSerializer, TicketValidationSerializer
+import logging
 
+logger = logging.getLogger(__name__)
 
 
-class TicketListView(generics.ListAPIView):
-    """List tickets for the authenticated user"""
+
+class TicketListView(SparseFieldsViewMixin, ReplicaReadMixin, generics.ListAPIView):
+    """List tickets for the authenticated user; supports ?fields= and ?expand="""
     serializer_class = TicketSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return Ticket.objects.filter(order__user=self.request.user)
+        return user_tickets(self.request.user, prepare=self.optimize_queryset)
 
-class TicketDetailView(generics.RetrieveAPIView):
-    """Get ticket details"""
+class TicketDetailView(SparseFieldsViewMixin, generics.RetrieveAPIView):
+    """Get ticket details; supports ?fields=, ?expand= and conditional GET"""
     serializer_class = TicketSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    def get(self, request, *args, **kwargs):
+        state = ticket_state(pk=kwargs['pk'], order__user=request.user)
+        return conditional_get(request, state, partial(super().get, request, *args, **kwargs))
+
     def get_queryset(self):
-        return Ticket.objects.filter(order__user=self.request.user)
+        return self.optimize_queryset(Ticket.objects.filter(order__user=self.request.user))
+
+    def get_object(self):
+        try:
+            return super().get_object()
+        except Http404:
+            return get_object_or_404(
+                self.optimize_queryset(ArchivedTicket.objects.filter(order__user=self.request.user)),
+                pk=self.kwargs['pk']
+            )
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAdminUser])
+@throttle_classes([TicketValidationThrottle])
 def validate_ticket(request):
-    """Validate a ticket by ticket_id"""
+    """Validate a ticket by ticket_id and check it in at the given gate"""
     serializer = TicketValidationSerializer(data=request.data)
     serializer.is_valid(raise_exception=True)
-    ticket_id = serializer.validated_data['ticket_id']
     try:
-        ticket = Ticket.objects.get(ticket_id=ticket_id)
-        if ticket.is_used:
-            return Response(
-                {'error': 'Ticket has already been used'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        ticket.is_used = True
-        ticket.used_at = timezone.now()
-        ticket.save()
-        return Response({
-            'message': 'Ticket validated successfully',
-            'ticket': TicketSerializer(ticket, context={'request': request}).data
-        })
-    except Ticket.DoesNotExist:
+        outcome, ticket = scan_index.scan_ticket(
+            serializer.validated_data['ticket_id'], serializer.validated_data['gate']
+        )
+    except Exception as e:
+        logger.error(f"Recording scan of {serializer.validated_data['ticket_id']} failed: {e}")
+        return Response(
+            {'error': 'Could not record the scan, please scan the ticket again'},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+    if outcome == scan_index.NOT_FOUND:
         return Response(
             {'error': 'Ticket not found'},
             status=status.HTTP_404_NOT_FOUND
-        )
\ No newline at end of file
+        )
+    if outcome == scan_index.NOT_APPROVED:
+        return Response(
+            {'error': 'Order not approved'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if outcome == scan_index.PENDING:
+        return Response(
+            {'status': 'pending', 'error': 'The scan is still being recorded, please scan the ticket again'},
+            status=status.HTTP_202_ACCEPTED
+        )
+    if outcome == scan_index.ALREADY_USED:
+        return Response(
+            {'error': 'Ticket has already been used'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if ticket.get('qr_code'):
+        ticket['qr_code'] = request.build_absolute_uri(ticket['qr_code'])
+    return Response({
+        'message': 'Ticket validated successfully',
+        'ticket': ticket
+    })
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def export_tickets(request, export_format):
+    """Stream the attendee list as CSV or NDJSON, filtered by event, order status and created_at range (admin only)"""
+    if not request.user.is_admin:
+        return Response(
+            {'error': 'Admin access required'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    if export_format not in EXPORT_FORMATS:
+        return Response(
+            {'error': f'Format must be one of: {", ".join(EXPORT_FORMATS)}'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    try:
+        tickets = [
+            filter_export_queryset(
+                model.objects.all(), request.query_params,
+                event_field='order__event_id', status_field='order__status'
+            )
+            for model in (ArchivedTicket, Ticket)
+        ]
+    except ExportFilterError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    if request.query_params.get('is_used') in ('true', 'false'):
+        tickets = [qs.filter(is_used=request.query_params['is_used'] == 'true') for qs in tickets]
+    return stream_export(tickets, TICKET_EXPORT_COLUMNS, export_format, 'tickets')
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def export_ticket_qr_codes(request, export_format):
+    """Stream the QR codes of an event's or some orders' tickets as a ZIP of PNGs or a PDF print sheet (admin only)"""
+    if not request.user.is_admin:
+        return Response(
+            {'error': 'Admin access required'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    if export_format not in QR_EXPORT_FORMATS:
+        return Response(
+            {'error': f'Format must be one of: {", ".join(QR_EXPORT_FORMATS)}'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    order_ids = [order_id for order_id in request.query_params.get('orders', '').split(',') if order_id]
+    if not request.query_params.get('event') and not order_ids:
+        return Response(
+            {'error': 'Give an event or a comma-separated list of orders'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    # Only tickets that admit someone, unless another order status is asked for
+    params = request.query_params.copy()
+    params.setdefault('status', 'approved')
+    try:
+        tickets = [
+            filter_export_queryset(
+                model.objects.all(), params, event_field='order__event_id', status_field='order__status'
+            )
+            for model in (ArchivedTicket, Ticket)
+        ]
+    except ExportFilterError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    if order_ids:
+        tickets = [qs.filter(order__order_id__in=order_ids) for qs in tickets]
+    if request.query_params.get('is_used') in ('true', 'false'):
+        tickets = [qs.filter(is_used=request.query_params['is_used'] == 'true') for qs in tickets]
+    if not any(qs.exists() for qs in tickets):
+        return Response(
+            {'error': 'No tickets match'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    filename = f"tickets-event-{params['event']}" if params.get('event') else 'tickets'
+    return stream_qr_codes(tickets, export_format, f'{filename}-qr-codes')
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def event_check_in_stats(request, event_id):
+    """Check-ins per minute for the last ?hours= hours (default 1), in total and per gate (admin only)"""
+    if not request.user.is_admin:
+        return Response(
+            {'error': 'Admin access required'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    try:
+        hours = int(request.query_params.get('hours', 1))
+    except ValueError:
+        hours = 0
+    if not 1 <= hours <= MAX_HOURS:
+        return Response(
+            {'error': f'hours must be between 1 and {MAX_HOURS}'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    return Response(event_check_ins(event_id, hours=hours))
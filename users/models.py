@@ -6,4 +6,12 @@ class User(AbstractUser):
     is_admin = models.BooleanField(default=False)
 
     def __str__(self):
-        return self.email
\ No newline at end of file
+        return self.email
+
+class RevokedToken(models.Model):
+    """A rotated or logged-out refresh token, kept until it would have expired anyway"""
+    jti = models.CharField(max_length=64, unique=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.jti
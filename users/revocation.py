@@ -0,0 +1,167 @@
+"""
+Refresh-token revocation store.
+
+Rotated and logged-out refresh tokens are recorded by jti in RevokedToken
+until they would have expired anyway, so the table holds at most one refresh
+lifetime of tokens; ``purge_revoked_tokens`` deletes the rest.
+
+Each worker keeps a Bloom filter of the revoked jtis in front of the table.
+A jti the filter has never seen is certainly not revoked and is answered
+without a query; only filter hits (revoked tokens and the rare false
+positive) are confirmed against the table. Workers learn about each other's
+revocations through the shared default cache: every revocation takes a
+sequence number with ``cache.incr`` and stores its jti under it, and a worker
+catches up by reading the numbers it has not seen with ``get_many``. If the
+cache lost any of them the worker reads the new rows from the table instead,
+which it also does at least every REVOCATION_SYNC_SECONDS. The filter is
+rebuilt from the table every REVOCATION_REBUILD_HOURS to drop expired jtis.
+
+Revoking is an insert on the unique jti, so of two concurrent refreshes with
+the same token only one succeeds, whatever the filters said.
+"""
+import hashlib
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from users.models import RevokedToken
+
+SEQUENCE_KEY = 'revoked-token-seq'
+MAX_CATCH_UP = 1000
+
+
+def _jti_key(number):
+    return f'revoked-token:{number}'
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate):
+        self.size = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class RevocationStore:
+    """Per-worker Bloom filter of revoked jtis, kept in step with the table and the other workers"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._bloom = None
+        self._sequence = 0
+        self._last_id = 0
+        self._synced_at = 0
+        self._built_at = 0
+
+    def _rebuild(self):
+        now = timezone.now()
+        live = RevokedToken.objects.filter(expires_at__gt=now)
+        bloom = BloomFilter(
+            max(settings.REVOCATION_BLOOM_CAPACITY, 2 * live.count()), settings.REVOCATION_BLOOM_ERROR_RATE
+        )
+        # Read the high-water marks first: anything revoked while loading is picked up by the next sync
+        sequence = cache.get(SEQUENCE_KEY, 0)
+        last_id = RevokedToken.objects.aggregate(last=Max('id'))['last'] or 0
+        for jti in live.filter(id__lte=last_id).values_list('jti', flat=True).iterator(chunk_size=10000):
+            bloom.add(jti)
+        self._bloom, self._sequence, self._last_id = bloom, sequence, last_id
+        self._built_at = self._synced_at = time.monotonic()
+
+    def _sync_from_table(self):
+        sequence = cache.get(SEQUENCE_KEY, 0)
+        for row_id, jti in RevokedToken.objects.filter(id__gt=self._last_id).values_list('id', 'jti'):
+            self._bloom.add(jti)
+            self._last_id = max(self._last_id, row_id)
+        self._sequence = sequence
+        self._synced_at = time.monotonic()
+
+    def _catch_up(self):
+        now = time.monotonic()
+        if self._bloom is None or now - self._built_at > settings.REVOCATION_REBUILD_HOURS * 3600:
+            return self._rebuild()
+        if now - self._synced_at > settings.REVOCATION_SYNC_SECONDS:
+            return self._sync_from_table()
+        sequence = cache.get(SEQUENCE_KEY)
+        if sequence == self._sequence:
+            return
+        if sequence is None or sequence < self._sequence or sequence - self._sequence > MAX_CATCH_UP:
+            # The cache was cleared or we are far behind
+            return self._sync_from_table()
+        found = cache.get_many([_jti_key(n) for n in range(self._sequence + 1, sequence + 1)])
+        if len(found) < sequence - self._sequence:
+            return self._sync_from_table()
+        for jti in found.values():
+            self._bloom.add(jti)
+        self._sequence = sequence
+
+    def might_be_revoked(self, jti):
+        with self._lock:
+            self._catch_up()
+            return jti in self._bloom
+
+    def add(self, jti):
+        with self._lock:
+            if self._bloom is not None:
+                self._bloom.add(jti)
+
+
+_store = RevocationStore()
+
+
+def _publish(jti):
+    cache.add(SEQUENCE_KEY, 0, timeout=None)
+    try:
+        number = cache.incr(SEQUENCE_KEY)
+    except ValueError:
+        # Evicted between add and incr; workers fall back to the table
+        return
+    cache.set(_jti_key(number), jti, timeout=max(60, 2 * settings.REVOCATION_SYNC_SECONDS))
+
+
+def is_revoked(jti):
+    """Whether the refresh token was revoked; queries the table only on a Bloom filter hit"""
+    if not _store.might_be_revoked(jti):
+        return False
+    return RevokedToken.objects.filter(jti=jti).exists()
+
+
+def revoke(jti, expires_at):
+    """Record the jti as revoked, returning False if it already was"""
+    try:
+        with transaction.atomic():
+            RevokedToken.objects.create(jti=jti, expires_at=expires_at)
+    except IntegrityError:
+        return False
+    _store.add(jti)
+    transaction.on_commit(lambda: _publish(jti))
+    return True
+
+
+def purge_expired_tokens(batch_size=1000):
+    """Delete revoked tokens past their expiry in bounded batches, returning how many were removed"""
+    removed = 0
+    while True:
+        ids = list(
+            RevokedToken.objects.filter(expires_at__lte=timezone.now())
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return removed
+        removed += RevokedToken.objects.filter(id__in=ids).delete()[0]
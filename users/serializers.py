@@ -1,8 +1,15 @@
+from datetime import datetime, timezone as dt_timezone
+
 from rest_framework import serializers
 from django.contrib.auth import authenticate
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from eticketing_backend.fieldsets import SparseFieldsMixin
 from .models import User
+from . import revocation
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ('id', 'username', 'email', 'first_name', 'last_name', 'phone', 'is_admin')
@@ -50,4 +57,27 @@ class LoginSerializer(serializers.Serializer):
         else:
             raise serializers.ValidationError('Must include email and password.')
 
-        return data
\ No newline at end of file
+        return data
+
+
+def revoke_refresh_token(refresh):
+    """Revoke a validated RefreshToken, returning False if it already was"""
+    expires_at = datetime.fromtimestamp(refresh['exp'], tz=dt_timezone.utc)
+    return revocation.revoke(refresh[api_settings.JTI_CLAIM], expires_at)
+
+
+class RevocableTokenRefreshSerializer(TokenRefreshSerializer):
+    """Refuses revoked refresh tokens and revokes the old token when rotating"""
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        jti = refresh[api_settings.JTI_CLAIM]
+        if revocation.is_revoked(jti):
+            raise InvalidToken('Token has been revoked')
+        if api_settings.ROTATE_REFRESH_TOKENS and not revoke_refresh_token(refresh):
+            raise InvalidToken('Token has been revoked')
+        return super().validate(attrs)
+
+
+class LogoutSerializer(serializers.Serializer):
+    refresh = serializers.CharField()
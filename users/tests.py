@@ -1,3 +1,160 @@
-from django.test import TestCase
+import threading
+import time
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from eticketing_backend import throttling
+from eticketing_backend.throttling import AuthThrottle, OrderCreateThrottle
+from users import revocation
+from users.models import RevokedToken, User
+
+
+class TokenBucketThrottleTests(TestCase):
+    """Buckets allow bursts up to capacity, refill over time, and hold under concurrent requests"""
+
+    def setUp(self):
+        caches['throttle'].clear()
+        self.now = 1000.0
+        self.request = SimpleNamespace(user=SimpleNamespace(is_authenticated=True, pk=7))
+
+    def _throttle(self, capacity=3, per_second=1.0):
+        throttle = OrderCreateThrottle()
+        throttle.capacity, throttle.refill_rate = capacity, per_second
+        throttle.timer = lambda: self.now
+        return throttle
+
+    def test_burst_beyond_capacity_is_rejected(self):
+        throttle = self._throttle()
+
+        self.assertEqual([throttle.allow_request(self.request, None) for _ in range(4)], [True] * 3 + [False])
+        self.assertEqual(throttle.wait(), 1)
+
+    def test_tokens_refill_at_the_rate(self):
+        throttle = self._throttle()
+        for _ in range(3):
+            throttle.allow_request(self.request, None)
+
+        self.now += 0.5
+        self.assertFalse(throttle.allow_request(self.request, None))
+        self.now += 0.5
+        self.assertTrue(throttle.allow_request(self.request, None))
+        self.assertFalse(throttle.allow_request(self.request, None))
+
+        # Refill stops at capacity
+        self.now += 60
+        self.assertEqual([throttle.allow_request(self.request, None) for _ in range(4)], [True] * 3 + [False])
+
+    def _burst(self, threads=12):
+        real_get = LocMemCache.get
+
+        def slow_get(cache, *args, **kwargs):
+            # Widen the window between reading the bucket and writing it back
+            value = real_get(cache, *args, **kwargs)
+            time.sleep(0.005)
+            return value
+
+        barrier = threading.Barrier(threads)
+        allowed = []
+
+        def worker():
+            throttle = self._throttle()
+            barrier.wait()
+            allowed.append(throttle.allow_request(self.request, None))
+
+        # Patched on the class: each thread has its own cache object
+        with mock.patch.object(LocMemCache, 'get', slow_get), mock.patch.object(throttling, 'LOCK_WAIT', 1):
+            workers = [threading.Thread(target=worker) for _ in range(threads)]
+            for thread in workers:
+                thread.start()
+            for thread in workers:
+                thread.join()
+        return allowed
+
+    def test_concurrent_burst_takes_each_token_once(self):
+        self.assertEqual(self._burst().count(True), 3)
+
+    def test_concurrent_burst_on_a_shared_cache_takes_each_token_once(self):
+        # Any backend but locmem goes through the per-bucket add lock
+        with mock.patch.object(throttling, 'LocMemCache', type('SharedCache', (), {})):
+            self.assertEqual(self._burst().count(True), 3)
+        self.assertFalse(caches['throttle'].has_key('throttle:order_create:user:7:lock'))
+
+    def test_login_is_throttled_with_retry_after(self):
+        client = APIClient()
+        capacity = AuthThrottle().capacity
+        # Frozen clock: password hashing is slow enough for a token to refill mid-test
+        with mock.patch.object(AuthThrottle, 'timer', mock.Mock(return_value=self.now)):
+            responses = [
+                client.post('/api/auth/login/', {'email': 'nobody@example.com', 'password': 'x'}, format='json')
+                for _ in range(capacity + 1)
+            ]
+
+        self.assertNotIn(429, [response.status_code for response in responses[:-1]])
+        self.assertEqual(responses[-1].status_code, 429)
+        self.assertIn('Retry-After', responses[-1])
+
+
+class RefreshTokenRevocationTests(TestCase):
+    """Rotated and logged-out refresh tokens stop working, on this worker and on the others"""
+
+    def setUp(self):
+        caches['default'].clear()
+        caches['throttle'].clear()
+        self.user = User.objects.create_user(
+            username='buyer@example.com', email='buyer@example.com', password='secret', phone='0200000000'
+        )
+        self.client = APIClient()
+
+    def _refresh(self, token):
+        return self.client.post('/api/auth/token/refresh/', {'refresh': str(token)}, format='json')
+
+    def test_rotated_token_cannot_be_reused(self):
+        refresh = RefreshToken.for_user(self.user)
+
+        rotated = self._refresh(refresh)
+        self.assertEqual(rotated.status_code, 200)
+        self.assertEqual(self._refresh(refresh).status_code, 401)
+        self.assertEqual(self._refresh(rotated.data['refresh']).status_code, 200)
+
+    def test_logout_revokes_the_token(self):
+        refresh = RefreshToken.for_user(self.user)
+
+        response = self.client.post('/api/auth/logout/', {'refresh': str(refresh)}, format='json')
+        self.assertEqual(response.status_code, 205)
+        self.assertEqual(self._refresh(refresh).status_code, 401)
+        self.assertTrue(RevokedToken.objects.filter(jti=refresh['jti']).exists())
+
+    def test_other_workers_learn_of_revocations(self):
+        other_worker = revocation.RevocationStore()
+        self.assertFalse(other_worker.might_be_revoked('first'))
+        expires_at = timezone.now() + timedelta(days=1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(revocation.revoke('first', expires_at))
+        self.assertFalse(revocation.revoke('first', expires_at))
+        # Announced through the shared cache
+        self.assertTrue(other_worker.might_be_revoked('first'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            revocation.revoke('second', expires_at)
+        caches['default'].clear()
+        # The announcement was lost, so the worker rereads the table
+        self.assertTrue(other_worker.might_be_revoked('second'))
+        self.assertFalse(revocation.is_revoked('never-revoked'))
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        bloom = revocation.BloomFilter(1000, 0.01)
+        for n in range(1000):
+            bloom.add(f'jti-{n}')
+
+        self.assertTrue(all(f'jti-{n}' in bloom for n in range(1000)))
+        false_positives = sum(f'other-{n}' in bloom for n in range(10000))
+        self.assertLess(false_positives, 300)
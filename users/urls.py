@@ -4,4 +4,5 @@ from . import views
 urlpatterns = [
     path('register/', views.register),
     path('login/', views.login),
+    path('logout/', views.logout),
 ]
\ No newline at end of file